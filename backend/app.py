@@ -1,15 +1,29 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 import os
+import sqlite3
 from datetime import datetime
+from json_provider import FastJSONProvider
+from compression import init_compression
+from uploads import init_uploads
+from sql_profiler import init_sql_profiling
+from request_profiler import init_request_profiler
+from read_replica import RoutingSession, REPLICA_BIND, init_read_replica, replica_bind_config
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
+init_compression(app)
+init_uploads(app)
+init_sql_profiling(app)
+init_request_profiler(app)
 
 # Configuração do banco de dados
 # Suporte a MySQL via variáveis de ambiente, com fallback para SQLite
@@ -23,10 +37,56 @@ if DB_ENGINE == 'mysql':
     app.config['SQLALCHEMY_DATABASE_URI'] = (
         f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
+    # Pool de conexões (por processo/worker)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        'connect_args': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+            'read_timeout': int(os.getenv('DB_READ_TIMEOUT', '60')),
+            'write_timeout': int(os.getenv('DB_WRITE_TIMEOUT', '60')),
+        },
+    }
 else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///nota_fiscal.db'
+    # Caminho relativo é resolvido dentro da pasta instance/
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'nota_fiscal.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{SQLITE_PATH}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000,
+        },
+    }
+
+# Réplica de leitura opcional (DB_REPLICA_URL, DB_REPLICA_HOST ou SQLITE_REPLICA_PATH):
+# os GETs leem dela, ver read_replica.py
+REPLICA_CONFIG = replica_bind_config(DB_ENGINE, app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+if REPLICA_CONFIG:
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: REPLICA_CONFIG}
+
+# Ajustes de concorrência do SQLite, aplicados a cada nova conexão:
+# WAL permite leituras simultâneas a uma escrita e busy_timeout faz os
+# escritores aguardarem o lock em vez de falharem com "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'),
+    'cache_size': os.getenv('SQLITE_CACHE_SIZE', '-20000'),  # negativo = KiB
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-db = SQLAlchemy(app)
\ No newline at end of file
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_read_replica(app)
\ No newline at end of file
@@ -0,0 +1,248 @@
+"""
+Arquivamento (hot/cold) de registros antigos inativos ou quitados.
+
+Contas a pagar/receber inativas, ou com todas as parcelas quitadas, sem
+alterações há mais de ARCHIVE_AFTER_DAYS dias são movidas, junto com parcelas
+e classificações, para tabelas `<tabela>_arquivo` (mesmas colunas + arquivado_em,
+sem FKs nem índices únicos). Fornecedores e clientes inativos sem nenhuma conta
+nas tabelas quentes também são arquivados. Cada lote é uma transação.
+
+A reativação pelos endpoints de CRUD restaura o registro automaticamente
+(`restaurar`), e as exportações aceitam `incluir_arquivados=true`.
+
+Uso:
+    python archive.py              # arquiva
+    python archive.py --dry-run    # apenas conta o que seria arquivado
+    python archive.py --dias 180 --lote 500
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, Table, and_, delete, exists, func, insert, literal, or_, select
+from app import app, db
+from models import (
+    Fornecedor, Cliente, ContaPagar, ContaReceber, ParcelaPagar, ParcelaReceber,
+    ClassificacaoDespesa, ClassificacaoReceita,
+)
+import http_cache
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+
+# Contas e seus dependentes: (modelo, [(modelo filho, FK)], parcela, coluna de baixa, (modelo da parte, FK))
+CONTAS = [
+    (ContaPagar, [(ParcelaPagar, 'conta_pagar_id'), (ClassificacaoDespesa, 'conta_pagar_id')],
+     ParcelaPagar, 'data_pagamento', (Fornecedor, 'fornecedor_id')),
+    (ContaReceber, [(ParcelaReceber, 'conta_receber_id'), (ClassificacaoReceita, 'conta_receber_id')],
+     ParcelaReceber, 'data_recebimento', (Cliente, 'cliente_id')),
+]
+
+# Partes (cadastros) arquivadas quando inativas e sem contas nas tabelas quentes
+PARTES = [(Fornecedor, ContaPagar, 'fornecedor_id'), (Cliente, ContaReceber, 'cliente_id')]
+
+
+class ArchiveConflict(ValueError):
+    """O registro arquivado não pode voltar porque um dado único já está em uso"""
+
+
+def _archive_table(model):
+    source = model.__table__
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable,
+               index=c.name.endswith(('_id', '_key')))
+        for c in source.columns
+    ]
+    columns.append(Column('arquivado_em', DateTime, nullable=False, index=True))
+    return Table(f"{source.name}_arquivo", db.metadata, *columns)
+
+
+ARQUIVO = {
+    model.__tablename__: _archive_table(model)
+    for model in (ContaPagar, ParcelaPagar, ClassificacaoDespesa, ContaReceber, ParcelaReceber,
+                  ClassificacaoReceita, Fornecedor, Cliente)
+}
+
+
+def arquivo(model):
+    return ARQUIVO[model.__tablename__]
+
+
+def _move(source, target, where, now=None):
+    """Copia as linhas de `source` para `target` e as remove de `source` (sem commit)"""
+    names = [c.name for c in source.columns if c.name in target.c]
+    columns = [source.c[n] for n in names]
+    if 'arquivado_em' in target.c:
+        names.append('arquivado_em')
+        columns.append(literal(now, DateTime()))
+    db.session.execute(insert(target).from_select(names, select(*columns).where(where)))
+    return db.session.execute(delete(source).where(where)).rowcount
+
+
+def _max_id(table):
+    return db.session.execute(select(func.max(table.c.id))).scalar() or 0
+
+
+# ==================== ARQUIVAMENTO ====================
+
+def _contas_candidatas(model, filhos, parcela_model, coluna_baixa, corte, depois_de, limite):
+    conta = model.__table__
+    parcela = parcela_model.__table__
+    fk = parcela.c[filhos[0][1]]
+
+    pendente_ou_recente = exists().where(
+        fk == conta.c.id, parcela.c.is_active == True,
+        or_(parcela.c[coluna_baixa].is_(None), parcela.c[coluna_baixa] >= corte.date())
+    )
+    tem_parcela = exists().where(fk == conta.c.id, parcela.c.is_active == True)
+    inativa = conta.c.is_active == False
+    quitada = and_(conta.c.is_active == True, tem_parcela, ~pendente_ou_recente)
+
+    # O maior id de cada tabela fica sempre na tabela quente: sem isso o SQLite
+    # (e o MySQL após reiniciar) reutilizariam ids que estão no arquivo.
+    protegidos = [_max_id(conta)]
+    for filho_model, filho_fk in filhos:
+        filho = filho_model.__table__
+        dono = db.session.execute(select(filho.c[filho_fk]).where(filho.c.id == _max_id(filho))).scalar()
+        if dono:
+            protegidos.append(dono)
+
+    query = (
+        select(conta.c.id)
+        .where(or_(inativa, quitada), conta.c.updated_at < corte,
+               conta.c.id > depois_de, conta.c.id.notin_(protegidos))
+        .order_by(conta.c.id)
+        .limit(limite)
+    )
+    return db.session.execute(query).scalars().all()
+
+
+def _partes_candidatas(model, conta_model, fk, corte, depois_de, limite):
+    parte = model.__table__
+    conta = conta_model.__table__
+    query = (
+        select(parte.c.id)
+        .where(parte.c.is_active == False, parte.c.updated_at < corte,
+               ~exists().where(conta.c[fk] == parte.c.id),
+               parte.c.id > depois_de, parte.c.id != _max_id(parte))
+        .order_by(parte.c.id)
+        .limit(limite)
+    )
+    return db.session.execute(query).scalars().all()
+
+
+def archive(dias: int = ARCHIVE_AFTER_DAYS, lote: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> dict:
+    """
+    Move os registros elegíveis para as tabelas de arquivo, um lote por
+    transação. Retorna a quantidade de linhas (a arquivar, no dry-run) por tabela.
+    """
+    corte = datetime.utcnow() - timedelta(days=dias)
+    totais = {}
+
+    def somar(tabela, n):
+        totais[tabela] = totais.get(tabela, 0) + n
+
+    for model, filhos, parcela_model, coluna_baixa, _ in CONTAS:
+        conta = model.__table__
+        depois_de = 0
+        while True:
+            ids = _contas_candidatas(model, filhos, parcela_model, coluna_baixa, corte, depois_de, lote)
+            if not ids:
+                break
+            depois_de = ids[-1]
+            now = datetime.utcnow()
+            for filho_model, fk in filhos:
+                filho = filho_model.__table__
+                where = filho.c[fk].in_(ids)
+                if dry_run:
+                    somar(filho.name, db.session.execute(select(func.count()).where(where)).scalar())
+                else:
+                    somar(filho.name, _move(filho, arquivo(filho_model), where, now))
+            somar(conta.name, len(ids) if dry_run else _move(conta, arquivo(model), conta.c.id.in_(ids), now))
+            if not dry_run:
+                db.session.commit()
+
+    for model, conta_model, fk in PARTES:
+        parte = model.__table__
+        depois_de = 0
+        while True:
+            ids = _partes_candidatas(model, conta_model, fk, corte, depois_de, lote)
+            if not ids:
+                break
+            depois_de = ids[-1]
+            somar(parte.name, len(ids) if dry_run else _move(parte, arquivo(model), parte.c.id.in_(ids), datetime.utcnow()))
+            if not dry_run:
+                db.session.commit()
+
+    db.session.rollback()
+    if not dry_run and totais:
+        http_cache.invalidate(*totais)
+    return totais
+
+
+# ==================== RESTAURAÇÃO ====================
+
+def _checar_unicos(model, registro_id):
+    """Garante que os valores únicos do registro arquivado não foram reutilizados"""
+    tabela = model.__table__
+    row = db.session.execute(select(arquivo(model)).where(arquivo(model).c.id == registro_id)).first()
+    if row is None:
+        return False
+    if db.session.execute(select(tabela.c.id).where(tabela.c.id == registro_id)).first():
+        raise ArchiveConflict(f"{tabela.name} {registro_id} existe na tabela ativa e no arquivo")
+    for column in tabela.columns:
+        valor = getattr(row, column.name)
+        if column.unique and valor is not None:
+            if db.session.execute(select(tabela.c.id).where(column == valor)).first():
+                raise ArchiveConflict(
+                    f"Não é possível restaurar: já existe outro registro ativo com {column.name} = {valor}"
+                )
+    return True
+
+
+def restaurar(model, registro_id) -> bool:
+    """
+    Traz um registro (e dependentes) de volta do arquivo para a tabela quente,
+    na transação da sessão atual (o commit fica com o chamador).
+    Retorna False se o registro não está arquivado.
+    """
+    conta = next((c for c in CONTAS if c[0] is model), None)
+    if conta is None:
+        if not _checar_unicos(model, registro_id):
+            return False
+        _move(arquivo(model), model.__table__, arquivo(model).c.id == registro_id)
+        return True
+
+    _, filhos, _, _, (parte_model, parte_fk) = conta
+    row = db.session.execute(select(arquivo(model)).where(arquivo(model).c.id == registro_id)).first()
+    if row is None:
+        return False
+    # A parte (fornecedor/cliente) pode ter sido arquivada junto
+    restaurar(parte_model, getattr(row, parte_fk))
+    _checar_unicos(model, registro_id)
+    _move(arquivo(model), model.__table__, arquivo(model).c.id == registro_id)
+    for filho_model, fk in filhos:
+        _move(arquivo(filho_model), filho_model.__table__, arquivo(filho_model).c[fk] == registro_id)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dias', type=int, default=ARCHIVE_AFTER_DAYS, help='idade mínima (última alteração)')
+    parser.add_argument('--lote', type=int, default=ARCHIVE_BATCH_SIZE, help='contas por transação')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    with app.app_context():
+        from db_setup import init_db
+        init_db()
+        totais = archive(args.dias, args.lote, args.dry_run)
+
+    acao = 'seriam arquivadas' if args.dry_run else 'arquivadas'
+    if not totais:
+        print('Nada a arquivar.')
+    for tabela, n in totais.items():
+        print(f"{tabela}: {n} linha(s) {acao}")
+
+
+if __name__ == '__main__':
+    main()
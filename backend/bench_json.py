@@ -0,0 +1,93 @@
+"""
+Microbenchmark de serialização JSON de listagens de contas.
+
+Compara o caminho atual (float()/isoformat() por linha + json da stdlib via
+provedor padrão do Flask) com o FastJSONProvider (Decimal/date nativos), e
+mede o custo/ganho da compressão gzip/brotli do payload:
+
+    python bench_json.py --rows 50000
+"""
+import argparse
+import gzip
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from json_provider import dumps_bytes, orjson
+from compression import brotli, COMPRESS_LEVEL, COMPRESS_BROTLI_QUALITY
+
+
+def make_rows(n):
+    """Linhas no formato de /api/contas-pagar, com os tipos que vêm do ORM"""
+    base = date(2024, 1, 1)
+    created = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    return [
+        {
+            'id': i,
+            'numero_nota_fiscal': f'NF-{i:06d}',
+            'data_emissao': base + timedelta(days=i % 365),
+            'descricao_produtos': 'Óleo diesel S10, filtros de ar e correias',
+            'valor_total': Decimal(f'{(i * 37) % 100000}.{i % 100:02d}'),
+            'created_at': created + timedelta(seconds=i),
+            'fornecedor': {'razao_social': f'Fornecedor {i % 500} LTDA', 'cnpj': '12.345.678/0001-90'},
+            'faturado': {'nome_completo': 'Beltrano da Silva', 'cpf': '999.999.999-99'},
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_format(rows):
+    """Conversão feita hoje nas rotas antes do jsonify"""
+    return [
+        dict(
+            row,
+            data_emissao=row['data_emissao'].isoformat(),
+            valor_total=float(row['valor_total']),
+            created_at=row['created_at'].isoformat(),
+        )
+        for row in rows
+    ]
+
+
+def best_of(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask('bench_json')
+    legacy_provider = DefaultJSONProvider(app)
+    rows = make_rows(args.rows)
+
+    legacy_time, legacy_body = best_of(
+        lambda: legacy_provider.dumps(legacy_format(rows)).encode('utf-8'), args.repeat)
+    fast_time, fast_body = best_of(lambda: dumps_bytes(rows), args.repeat)
+
+    print(f"{args.rows} linhas (melhor de {args.repeat}); orjson {'ativo' if orjson else 'ausente (stdlib)'}")
+    print(f"  atual (float/isoformat + json padrão): {legacy_time * 1000:8.1f} ms  {len(legacy_body) / 1e6:6.2f} MB")
+    print(f"  FastJSONProvider:                      {fast_time * 1000:8.1f} ms  {len(fast_body) / 1e6:6.2f} MB"
+          f"  ({legacy_time / fast_time:.1f}x)")
+
+    gzip_time, gzipped = best_of(lambda: gzip.compress(fast_body, compresslevel=COMPRESS_LEVEL), args.repeat)
+    print(f"  gzip nível {COMPRESS_LEVEL}:                          {gzip_time * 1000:8.1f} ms  "
+          f"{len(gzipped) / 1e6:6.2f} MB")
+    if brotli is not None:
+        br_time, compressed = best_of(
+            lambda: brotli.compress(fast_body, quality=COMPRESS_BROTLI_QUALITY), args.repeat)
+        print(f"  brotli qualidade {COMPRESS_BROTLI_QUALITY}:                     {br_time * 1000:8.1f} ms  "
+              f"{len(compressed) / 1e6:6.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
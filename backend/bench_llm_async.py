@@ -0,0 +1,39 @@
+"""
+Benchmark do gateway assíncrono de LLM com um provedor local falso.
+
+Mede a vazão (chamadas/s) à medida que o limite de concorrência aumenta,
+sem rede e sem threads extras por chamada:
+
+    python bench_llm_async.py --calls 256 --latency 0.2
+"""
+import argparse
+import time
+from llm_gateway import LLMGateway, FakeProvider
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=256, help='chamadas por rodada')
+    parser.add_argument('--latency', type=float, default=0.2, help='latência simulada do provedor (s)')
+    parser.add_argument('--levels', default='1,2,4,8,16,32,64,128', help='limites de concorrência testados')
+    args = parser.parse_args()
+
+    print(f"{args.calls} chamadas, latência simulada {args.latency * 1000:.0f} ms\n")
+    print(f"{'concorrência':>12}  {'tempo (s)':>9}  {'chamadas/s':>10}")
+    for level in [int(x) for x in args.levels.split(',')]:
+        gateway = LLMGateway(max_concurrency=level, timeout=60)
+        gateway.register('fake', lambda: FakeProvider(latency=args.latency, response='ADMINISTRATIVAS'))
+
+        async def call(i):
+            return await gateway.complete('fake', f'prompt {i}')
+
+        start = time.perf_counter()
+        results = gateway.map(call, range(args.calls))
+        elapsed = time.perf_counter() - start
+        errors = sum(1 for r in results if isinstance(r, Exception))
+        suffix = f"  ({errors} erros)" if errors else ''
+        print(f"{level:>12}  {elapsed:>9.2f}  {args.calls / elapsed:>10.1f}{suffix}")
+
+
+if __name__ == '__main__':
+    main()
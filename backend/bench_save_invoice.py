@@ -0,0 +1,146 @@
+"""
+Benchmark de concorrência de escrita em /api/save-invoice (SQLite).
+
+Cada configuração usa um banco novo, compartilhado por vários processos
+(como os workers do gunicorn), cada um disparando requisições de várias threads:
+
+    python bench_save_invoice.py --processes 2 --threads 8 --requests 50
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CONFIGS = [
+    ('rollback journal (padrão do SQLite)', {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_CACHE_SIZE': '-2000',
+        'SQLITE_TEMP_STORE': 'DEFAULT',
+    }),
+    ('WAL + synchronous=NORMAL + busy_timeout', {
+        'SQLITE_JOURNAL_MODE': 'WAL',
+        'SQLITE_SYNCHRONOUS': 'NORMAL',
+        'SQLITE_BUSY_TIMEOUT_MS': '5000',
+    }),
+]
+
+
+def _payload(thread_id, i):
+    return {
+        'fornecedor': {
+            'razao_social': f'Fornecedor {thread_id}',
+            'fantasia': None,
+            'cnpj': f'{thread_id:08d}000190',
+        },
+        'faturado': {'nome_completo': f'Faturado {thread_id}', 'cpf': f'{thread_id:011d}'},
+        'classificacao_despesa': 'MANUTENÇÃO E OPERAÇÃO',
+        'numero_nota_fiscal': f'{thread_id}-{i}',
+        'data_emissao': '2024-09-20',
+        'descricao_produtos': 'Óleo diesel, filtros e correias',
+        'valor_total': 1234.56,
+        'data_vencimento': '2024-10-20',
+    }
+
+
+def run_worker(worker_id, threads, requests_per_thread, start_at):
+    """Executa a carga no processo atual e imprime o resultado em JSON"""
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    import run  # noqa: F401  (registra as rotas)
+    from app import app
+    from db_setup import init_db
+
+    if worker_id < 0:
+        with app.app_context():
+            init_db()
+        return
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(thread_id):
+        client = app.test_client()
+        time.sleep(max(start_at - time.time(), 0))
+        for i in range(requests_per_thread):
+            start = time.perf_counter()
+            response = client.post('/api/save-invoice', json=_payload(worker_id * 1000 + thread_id, i))
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 201:
+                    errors.append(response.get_json().get('error', response.status_code))
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    print(json.dumps({
+        'latencies': latencies,
+        'errors': [str(e) for e in errors],
+        'finished_at': time.time(),
+    }))
+
+
+def run_config(env, args):
+    """Roda uma configuração com N processos simultâneos e agrega os resultados"""
+    def command(worker_id, start_at):
+        return [sys.executable, __file__, '--worker', str(worker_id), '--threads', str(args.threads),
+                '--requests', str(args.requests), '--start-at', str(start_at)]
+
+    subprocess.run(command(-1, 0), env=env, check=True, capture_output=True)
+
+    # Margem para todos os processos importarem a aplicação antes da largada
+    start_at = time.time() + 3
+    procs = [
+        subprocess.Popen(command(w, start_at), env=env, stdout=subprocess.PIPE, text=True)
+        for w in range(args.processes)
+    ]
+    results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+
+    latencies = sorted(l for r in results for l in r['latencies'])
+    errors = [e for r in results for e in r['errors']]
+    total = max(r['finished_at'] for r in results) - start_at
+    return {
+        'ok': len(latencies) - len(errors),
+        'errors': len(errors),
+        'sample_error': errors[0] if errors else None,
+        'throughput': (len(latencies) - len(errors)) / total,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8, help='threads por processo')
+    parser.add_argument('--requests', type=int, default=50, help='requisições por thread')
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args.worker, args.threads, args.requests, args.start_at)
+        return
+
+    print(f"save_invoice: {args.processes} processos x {args.threads} threads x {args.requests} requisições\n")
+    for name, env_overrides in CONFIGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_ENGINE='sqlite', SQLITE_PATH=os.path.join(tmp, 'bench.db'), **env_overrides)
+            result = run_config(env, args)
+        print(f"{name}")
+        print(f"  {result['throughput']:8.1f} notas/s   p50 {result['p50_ms']:7.1f} ms   "
+              f"p95 {result['p95_ms']:7.1f} ms   erros {result['errors']}")
+        if result['sample_error']:
+            print(f"  exemplo de erro: {result['sample_error']}")
+
+
+if __name__ == '__main__':
+    main()
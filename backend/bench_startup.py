@@ -0,0 +1,108 @@
+"""
+Benchmark de inicialização: tempo de importação do wsgi (aplicação + init_db)
+e RSS do processo logo após o boot, para o worker completo e o só de CRUD.
+
+Cada medição roda em um processo novo (imports frios de módulos Python, com o
+cache de disco do SO já quente) contra um SQLite temporário:
+
+    python bench_startup.py                       # mediana de 5 execuções por modo
+    python bench_startup.py --save-baseline startup.json
+    python bench_startup.py --baseline startup.json --tolerance 0.25
+
+Sai com código 1 se o modo crud carregar algum módulo de LLM/PDF, se passar de
+--max-import-ms/--max-rss-mb ou se piorar mais que --tolerance em relação à baseline.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ['openai', 'google.generativeai', 'PyPDF2', 'llm_routes', 'pdf_processor']
+
+CHILD = """
+import json, os, sys, time
+start = time.perf_counter()
+import wsgi
+import_ms = (time.perf_counter() - start) * 1000
+rss_kb = 0
+with open('/proc/self/status') as status:
+    for line in status:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+if not rss_kb:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'import_ms': import_ms,
+    'rss_mb': rss_kb / 1024,
+    'heavy': [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure(mode, repeat):
+    backend = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(repeat):
+            env = dict(os.environ, APP_MODE=mode, DB_ENGINE='sqlite',
+                       SQLITE_PATH=os.path.join(tmp, f'bench_{mode}_{i}.db'), PYTHONDONTWRITEBYTECODE='1')
+            env.setdefault('OPENAI_API_KEY', 'bench')
+            output = subprocess.run([sys.executable, '-c', CHILD], cwd=backend, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'import_ms': statistics.median(r['import_ms'] for r in runs),
+        'rss_mb': statistics.median(r['rss_mb'] for r in runs),
+        'heavy': sorted({m for r in runs for m in r['heavy']}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--modes', default='full,crud')
+    parser.add_argument('--max-import-ms', type=float, help='limite absoluto de importação (todos os modos)')
+    parser.add_argument('--max-rss-mb', type=float, help='limite absoluto de RSS após o boot')
+    parser.add_argument('--baseline', help='JSON gerado com --save-baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='piora máxima aceita sobre a baseline')
+    parser.add_argument('--save-baseline')
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args.repeat) for mode in args.modes.split(',')}
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = []
+    print(f"Inicialização (mediana de {args.repeat} processos)")
+    for mode, r in results.items():
+        print(f"  {mode:5s} importação {r['import_ms']:7.1f} ms   RSS {r['rss_mb']:6.1f} MB"
+              f"   módulos pesados: {', '.join(r['heavy']) or 'nenhum'}")
+        if mode == 'crud' and r['heavy']:
+            failures.append(f"crud carregou {', '.join(r['heavy'])}")
+        if args.max_import_ms and r['import_ms'] > args.max_import_ms:
+            failures.append(f"{mode}: importação {r['import_ms']:.0f} ms > {args.max_import_ms:.0f} ms")
+        if args.max_rss_mb and r['rss_mb'] > args.max_rss_mb:
+            failures.append(f"{mode}: RSS {r['rss_mb']:.1f} MB > {args.max_rss_mb:.1f} MB")
+        for metric in ('import_ms', 'rss_mb'):
+            base = baseline.get(mode, {}).get(metric)
+            if base and r[metric] > base * (1 + args.tolerance):
+                failures.append(f"{mode}: {metric} {r[metric]:.1f} > baseline {base:.1f} (+{args.tolerance:.0%})")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline gravada em {args.save_baseline}")
+
+    for failure in failures:
+        print(f"REGRESSÃO: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Inativação/reativação em massa de cadastros e contas.
+
+PATCH /api/<entidade>/inativar e /api/<entidade>/reativar recebem
+{"ids": [...]} ou {"filtro": {...}} e, opcionalmente, "dry_run": true.
+Os ids selecionados são percorridos em lotes de BULK_CHUNK_SIZE e cada lote
+é um único UPDATE (is_active e updated_at), tudo na mesma transação.
+A reativação também traz de volta registros arquivados (ver archive.py).
+
+Filtros aceitos: as colunas de FILTROS de cada entidade, por igualdade (valor)
+ou pertinência (lista); colunas de data aceitam <coluna>_inicio e <coluna>_fim
+(YYYY-MM-DD). CPF/CNPJ são comparados pela chave normalizada.
+"""
+import os
+from datetime import datetime
+from flask import request, jsonify
+from sqlalchemy import Date, DateTime, select, update
+from app import app, db
+from models import *
+from documentos import normalizar_documento
+from archive import ARQUIVO, ArchiveConflict, arquivo, restaurar
+import http_cache
+
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '500'))
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', '50000'))
+# Quantos ids são listados na resposta do dry-run
+BULK_PREVIEW_LIMIT = 100
+
+# entidade da URL -> (modelo, colunas filtráveis)
+FILTROS = {
+    'fornecedores': (Fornecedor, ['razao_social', 'cnpj', 'created_at']),
+    'clientes': (Cliente, ['nome_completo', 'cpf', 'cnpj', 'created_at']),
+    'tipos-despesa': (TipoDespesa, ['nome', 'created_at']),
+    'tipos-receita': (TipoReceita, ['nome', 'created_at']),
+    'contas-pagar': (ContaPagar, ['fornecedor_id', 'faturado_id', 'numero_nota_fiscal', 'data_emissao', 'created_at']),
+    'contas-receber': (ContaReceber, ['cliente_id', 'numero_documento', 'data_emissao', 'created_at']),
+}
+
+# Documentos são filtrados pela coluna com apenas dígitos
+DOCUMENTOS = {'cpf': 'cpf_key', 'cnpj': 'cnpj_key'}
+
+
+def _parse_date(nome, valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"{nome}: data inválida, use YYYY-MM-DD")
+
+
+def _where(table, colunas, filtro):
+    """Converte o filtro do corpo em condições sobre `table` (quente ou arquivo)"""
+    if not isinstance(filtro, dict) or not filtro:
+        raise ValueError('Informe "ids" ou um "filtro" não vazio')
+
+    conditions = []
+    for chave, valor in filtro.items():
+        nome, limite = chave, None
+        for sufixo in ('_inicio', '_fim'):
+            if chave.endswith(sufixo) and chave[:-len(sufixo)] in colunas:
+                nome, limite = chave[:-len(sufixo)], sufixo
+        if nome not in colunas:
+            raise ValueError(f"Filtro não suportado: {chave}. Use: {', '.join(colunas)}")
+
+        if nome in DOCUMENTOS:
+            column = table.c[DOCUMENTOS[nome]]
+            valor = [normalizar_documento(v) for v in valor] if isinstance(valor, list) else normalizar_documento(valor)
+        else:
+            column = table.c[nome]
+
+        if limite:
+            if not isinstance(column.type, (Date, DateTime)):
+                raise ValueError(f"{chave}: {nome} não é uma coluna de data")
+            data = _parse_date(chave, valor)
+            if isinstance(column.type, DateTime):
+                data = datetime.combine(data, datetime.min.time() if limite == '_inicio' else datetime.max.time())
+            conditions.append(column >= data if limite == '_inicio' else column <= data)
+        elif isinstance(valor, list):
+            conditions.append(column.in_(valor))
+        elif isinstance(column.type, Date) and not isinstance(column.type, DateTime):
+            conditions.append(column == _parse_date(chave, valor))
+        else:
+            conditions.append(column == valor)
+    return conditions
+
+
+def _parse_ids(ids):
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('"ids" deve ser uma lista não vazia')
+    if len(ids) > BULK_MAX_IDS:
+        raise ValueError(f"No máximo {BULK_MAX_IDS} ids por requisição")
+    try:
+        return sorted({int(i) for i in ids})
+    except (TypeError, ValueError):
+        raise ValueError('"ids" deve conter apenas números inteiros')
+
+
+def _chunks(ids):
+    for i in range(0, len(ids), BULK_CHUNK_SIZE):
+        yield ids[i:i + BULK_CHUNK_SIZE]
+
+
+def _selecionar(table, ids, conditions):
+    """Ids de `table` que atendem à seleção, lidos por keyset em lotes"""
+    if ids is not None:
+        found = []
+        for chunk in _chunks(ids):
+            found.extend(db.session.execute(select(table.c.id).where(table.c.id.in_(chunk))).scalars())
+        return found
+
+    found, last_id = [], 0
+    while True:
+        page = db.session.execute(
+            select(table.c.id).where(*conditions, table.c.id > last_id)
+            .order_by(table.c.id).limit(BULK_CHUNK_SIZE)
+        ).scalars().all()
+        if not page:
+            return found
+        found.extend(page)
+        last_id = page[-1]
+
+
+def _alterar_em_massa(entidade, ativo):
+    model, colunas = FILTROS[entidade]
+    table = model.__table__
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run'))
+
+    if data.get('ids') is not None:
+        ids, conditions = _parse_ids(data['ids']), None
+    else:
+        ids, conditions = None, _where(table, colunas, data.get('filtro'))
+
+    encontrados = _selecionar(table, ids, conditions)
+    pendentes = []
+    for chunk in _chunks(encontrados):
+        pendentes.extend(db.session.execute(
+            select(table.c.id).where(table.c.id.in_(chunk), table.c.is_active.is_not(ativo))
+        ).scalars())
+
+    # Na reativação, registros arquivados também são selecionados (e restaurados)
+    arquivados = []
+    if ativo and model.__tablename__ in ARQUIVO:
+        cold = arquivo(model)
+        cold_conditions = _where(cold, colunas, data.get('filtro')) if ids is None else None
+        arquivados = _selecionar(cold, ids, cold_conditions)
+
+    result = {
+        'encontrados': len(encontrados) + len(arquivados),
+        'alterados': len(pendentes) + len(arquivados),
+        'restaurados': len(arquivados),
+        'dry_run': dry_run,
+    }
+    if ids is not None:
+        result['nao_encontrados'] = sorted(set(ids) - set(encontrados) - set(arquivados))
+    if dry_run:
+        result['ids'] = sorted(pendentes + arquivados)[:BULK_PREVIEW_LIMIT]
+        return result
+
+    tabelas = {table.name}
+    for registro_id in arquivados:
+        restaurar(model, registro_id)
+    if arquivados:
+        # A restauração de uma conta traz também parcelas, classificações e a parte
+        tabelas.update(ARQUIVO)
+        pendentes = sorted(pendentes + arquivados)
+
+    now = datetime.utcnow()
+    for chunk in _chunks(pendentes):
+        db.session.execute(update(table).where(table.c.id.in_(chunk)).values(is_active=ativo, updated_at=now))
+    db.session.commit()
+    http_cache.invalidate(*tabelas)
+    return result
+
+
+def _bulk_endpoint(entidade, ativo):
+    acao = 'reativar' if ativo else 'inativar'
+
+    def view():
+        try:
+            return jsonify(_alterar_em_massa(entidade, ativo)), 200
+        except ArchiveConflict as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 409
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+
+    view.__name__ = f"bulk_{acao}_{entidade.replace('-', '_')}"
+    view.__doc__ = f"{acao.capitalize()} em massa ({entidade}) por ids ou filtro"
+    app.add_url_rule(f'/api/{entidade}/{acao}', view.__name__, view, methods=['PATCH'])
+
+
+for _entidade in FILTROS:
+    _bulk_endpoint(_entidade, False)
+    _bulk_endpoint(_entidade, True)
@@ -0,0 +1,319 @@
+"""
+Conciliação de extratos bancários com as parcelas em aberto.
+
+Débitos do extrato são comparados com parcelas a pagar e créditos com parcelas a
+receber (sem data_pagamento/data_recebimento, de contas ativas). Os candidatos de
+cada transação vêm de índices montados uma única vez por tipo:
+
+1. documento: CPF/CNPJ da parte e número da nota/documento (dict chave -> parcelas
+   ordenadas por vencimento), até CONCILIACAO_JANELA_DOCUMENTO_DIAS de diferença
+2. (valor em centavos, faixa de datas): dict com faixas de CONCILIACAO_JANELA_DIAS
+   dias; a transação consulta a própria faixa e as duas vizinhas
+3. tolerância, só quando 1 e 2 não encontram nada: por faixa de datas, parcelas
+   ordenadas por valor, e bisect localiza as que diferem até CONCILIACAO_TOLERANCIA
+   (relativa, mínimo de CONCILIACAO_TOLERANCIA_MINIMA reais)
+
+Montar os índices custa O(m log m) e cada consulta O(log m + k), então n transações
+contra m parcelas custam O((n + m) log m), sem laço aninhado. Cada par candidato
+recebe uma confiança (valor, proximidade da data e documento) e a atribuição é
+gulosa, do par mais confiável para o menos, usando cada parcela e cada transação
+uma única vez.
+"""
+import os
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import and_, bindparam, exists, select, update
+from app import db
+from parcelas_routes import PARCELAS
+from extrato_parser import chave_numero
+import http_cache
+
+CONCILIACAO_JANELA_DIAS = int(os.getenv('CONCILIACAO_JANELA_DIAS', '5'))
+CONCILIACAO_JANELA_DOCUMENTO_DIAS = int(os.getenv('CONCILIACAO_JANELA_DOCUMENTO_DIAS', '60'))
+CONCILIACAO_TOLERANCIA = float(os.getenv('CONCILIACAO_TOLERANCIA', '0.02'))
+CONCILIACAO_TOLERANCIA_MINIMA = Decimal(os.getenv('CONCILIACAO_TOLERANCIA_MINIMA', '1.00'))
+CONCILIACAO_CONFIANCA_MINIMA = float(os.getenv('CONCILIACAO_CONFIANCA_MINIMA', '0.4'))
+CONCILIACAO_LOTE = 500
+# Candidatos guardados por transação (sugestão + alternativas)
+CANDIDATOS_POR_TRANSACAO = 3
+
+# Peso de cada critério na confiança (somam 1)
+PESO_VALOR = 0.45
+PESO_DATA = 0.25
+PESO_DOCUMENTO = 0.30
+
+# Débitos baixam parcelas a pagar e créditos parcelas a receber
+TIPOS = {'pagar': PARCELAS['parcelas-pagar'], 'receber': PARCELAS['parcelas-receber']}
+
+
+def _centavos(valor):
+    return int((Decimal(valor) * 100).to_integral_value())
+
+
+def _tolerancia(centavos, tolerancia):
+    return max(int(centavos * tolerancia), _centavos(CONCILIACAO_TOLERANCIA_MINIMA))
+
+
+# ==================== PARCELAS EM ABERTO ====================
+
+def carregar_parcelas(tipo, inicio, fim):
+    """Parcelas em aberto de contas ativas com vencimento entre `inicio` e `fim`"""
+    cfg = TIPOS[tipo]
+    P, C, Parte = cfg['parcela'], cfg['conta'], cfg['parte']
+    chaves_parte = [getattr(Parte, f'{campo}_key') for campo in cfg['parte_campos'] if campo in ('cpf', 'cnpj')]
+    stmt = (
+        select(P.id, P.data_vencimento, P.valor, getattr(C, cfg['documento']).label('documento'),
+               getattr(P, cfg['conta_fk']).label('conta_id'), Parte.id.label('parte_id'),
+               getattr(Parte, cfg['parte_campos'][0]).label('parte'), *chaves_parte)
+        .join(C, getattr(P, cfg['conta_fk']) == C.id)
+        .join(Parte, getattr(C, cfg['parte_fk']) == Parte.id)
+        .where(getattr(P, cfg['baixa']).is_(None), P.is_active == True, C.is_active == True,
+               P.data_vencimento >= inicio, P.data_vencimento <= fim)
+    )
+    parcelas = []
+    for row in db.session.execute(stmt):
+        chaves = {chave_numero(row.documento)}
+        chaves.update(getattr(row, coluna.key) for coluna in chaves_parte)
+        chaves.discard(None)
+        parcelas.append({
+            'tipo': tipo,
+            'id': row.id,
+            'conta_id': row.conta_id,
+            'documento': row.documento,
+            'parte_id': row.parte_id,
+            'parte': row.parte,
+            'data_vencimento': row.data_vencimento,
+            'valor': row.valor,
+            'centavos': _centavos(row.valor),
+            'ordinal': row.data_vencimento.toordinal(),
+            'chaves': chaves,
+        })
+    return parcelas
+
+
+# ==================== ÍNDICES E CORRESPONDÊNCIA ====================
+
+class IndiceParcelas:
+    """Índices de um tipo de parcela (a pagar ou a receber)"""
+
+    def __init__(self, parcelas, janela):
+        self.faixa = max(janela, 1)
+        self.por_valor = defaultdict(list)         # (centavos, faixa) -> parcelas
+        por_documento = defaultdict(list)           # chave -> parcelas
+        por_faixa = defaultdict(list)               # faixa -> parcelas
+        for p in parcelas:
+            faixa = p['ordinal'] // self.faixa
+            self.por_valor[(p['centavos'], faixa)].append(p)
+            por_faixa[faixa].append(p)
+            for chave in p['chaves']:
+                por_documento[chave].append(p)
+
+        # Listas ordenadas + chaves paralelas para o bisect
+        self.por_documento = {}
+        for chave, lista in por_documento.items():
+            lista.sort(key=lambda p: p['ordinal'])
+            self.por_documento[chave] = ([p['ordinal'] for p in lista], lista)
+        self.por_faixa = {}
+        for faixa, lista in por_faixa.items():
+            lista.sort(key=lambda p: p['centavos'])
+            self.por_faixa[faixa] = ([p['centavos'] for p in lista], lista)
+
+    def candidatos(self, centavos, ordinal, chaves, janela, janela_documento, tolerancia):
+        """{id da parcela: (parcela, casou pelo documento)}"""
+        limite = _tolerancia(centavos, tolerancia)
+        encontrados = {}
+        for chave in chaves:
+            ordinais, lista = self.por_documento.get(chave, ((), ()))
+            inicio = bisect_left(ordinais, ordinal - janela_documento)
+            fim = bisect_right(ordinais, ordinal + janela_documento)
+            for p in lista[inicio:fim]:
+                if abs(p['centavos'] - centavos) <= limite:
+                    encontrados[p['id']] = (p, True)
+
+        faixa = ordinal // self.faixa
+        vizinhas = (faixa - 1, faixa, faixa + 1)
+        for f in vizinhas:
+            for p in self.por_valor.get((centavos, f), ()):
+                if abs(p['ordinal'] - ordinal) <= janela:
+                    encontrados.setdefault(p['id'], (p, False))
+
+        if not encontrados:
+            for f in vizinhas:
+                valores, lista = self.por_faixa.get(f, ((), ()))
+                inicio = bisect_left(valores, centavos - limite)
+                fim = bisect_right(valores, centavos + limite)
+                for p in lista[inicio:fim]:
+                    if abs(p['ordinal'] - ordinal) <= janela:
+                        encontrados.setdefault(p['id'], (p, False))
+        return encontrados
+
+
+def confianca(centavos, ordinal, parcela, por_documento, janela, janela_documento, tolerancia):
+    """Confiança (0 a 1) de que a transação quita a parcela, e os motivos"""
+    diferenca = abs(parcela['centavos'] - centavos)
+    motivos = []
+    if diferenca == 0:
+        nota_valor = 1.0
+        motivos.append('valor_exato')
+    else:
+        nota_valor = 0.8 * (1 - diferenca / (_tolerancia(centavos, tolerancia) + 1))
+        motivos.append('valor_aproximado')
+    dias = abs(parcela['ordinal'] - ordinal)
+    nota_data = max(0.0, 1 - dias / ((janela_documento if por_documento else janela) + 1))
+    if por_documento:
+        motivos.append('documento')
+    total = PESO_VALOR * nota_valor + PESO_DATA * nota_data + PESO_DOCUMENTO * por_documento
+    return round(total, 3), motivos
+
+
+def _sugestao(parcela, transacao, nota, motivos):
+    return {
+        'tipo': parcela['tipo'],
+        'parcela_id': parcela['id'],
+        'conta_id': parcela['conta_id'],
+        'documento': parcela['documento'],
+        'parte_id': parcela['parte_id'],
+        'parte': parcela['parte'],
+        'data_vencimento': parcela['data_vencimento'],
+        'valor': parcela['valor'],
+        'confianca': nota,
+        'motivos': motivos,
+        # Corpo pronto para POST /api/conciliacao/aplicar
+        'aplicar': {'tipo': parcela['tipo'], 'parcela_id': parcela['id'],
+                    'data': transacao['data'], 'valor': abs(transacao['valor'])},
+    }
+
+
+def conciliar(transacoes, janela=None, janela_documento=None, tolerancia=None, confianca_minima=None):
+    """
+    Sugere, para cada transação do extrato, a parcela em aberto que ela quita.
+    Retorna {'total', 'com_sugestao', 'sem_sugestao', 'transacoes': [...]}.
+    """
+    janela = CONCILIACAO_JANELA_DIAS if janela is None else janela
+    janela_documento = max(CONCILIACAO_JANELA_DOCUMENTO_DIAS if janela_documento is None else janela_documento, janela)
+    tolerancia = CONCILIACAO_TOLERANCIA if tolerancia is None else tolerancia
+    confianca_minima = CONCILIACAO_CONFIANCA_MINIMA if confianca_minima is None else confianca_minima
+
+    por_tipo = defaultdict(list)
+    for i, t in enumerate(transacoes):
+        if t['valor']:
+            por_tipo['pagar' if t['valor'] < 0 else 'receber'].append(i)
+
+    pares = []         # (confiança, dias, transação, parcela, motivos)
+    for tipo, posicoes in por_tipo.items():
+        datas = [transacoes[i]['data'] for i in posicoes]
+        parcelas = carregar_parcelas(tipo, min(datas) - timedelta(days=janela_documento),
+                                     max(datas) + timedelta(days=janela_documento))
+        indice = IndiceParcelas(parcelas, janela)
+        for i in posicoes:
+            t = transacoes[i]
+            centavos, ordinal = _centavos(abs(t['valor'])), t['data'].toordinal()
+            candidatos = []
+            for parcela, por_documento in indice.candidatos(centavos, ordinal, t['chaves'], janela,
+                                                            janela_documento, tolerancia).values():
+                nota, motivos = confianca(centavos, ordinal, parcela, por_documento, janela,
+                                          janela_documento, tolerancia)
+                if nota >= confianca_minima:
+                    candidatos.append((nota, abs(parcela['ordinal'] - ordinal), i, parcela, motivos))
+            candidatos.sort(key=lambda c: (-c[0], c[1], c[3]['id']))
+            pares.extend(candidatos[:CANDIDATOS_POR_TRANSACAO])
+
+    # Atribuição gulosa: o par mais confiável primeiro, cada parcela/transação uma vez
+    pares.sort(key=lambda c: (-c[0], c[1], c[2], c[3]['id']))
+    escolhida, usadas = {}, set()
+    for nota, dias, i, parcela, motivos in pares:
+        if i in escolhida or (parcela['tipo'], parcela['id']) in usadas:
+            continue
+        escolhida[i] = (nota, parcela, motivos)
+        usadas.add((parcela['tipo'], parcela['id']))
+
+    alternativas = defaultdict(list)
+    for nota, dias, i, parcela, motivos in pares:
+        if escolhida.get(i, (None, {}))[1] is not parcela:
+            alternativas[i].append(_sugestao(parcela, transacoes[i], nota, motivos))
+
+    resultado = []
+    for i, t in enumerate(transacoes):
+        sugestao = None
+        if i in escolhida:
+            nota, parcela, motivos = escolhida[i]
+            sugestao = _sugestao(parcela, t, nota, motivos)
+        resultado.append({'transacao': t, 'sugestao': sugestao, 'alternativas': alternativas.get(i, [])})
+    return {
+        'total': len(transacoes),
+        'com_sugestao': len(escolhida),
+        'sem_sugestao': len(transacoes) - len(escolhida),
+        'transacoes': resultado,
+    }
+
+
+# ==================== BAIXA EM MASSA ====================
+
+def aplicar(conciliacoes):
+    """
+    Baixa as parcelas aceitas: [{'tipo': 'pagar'|'receber', 'parcela_id', 'data', 'valor'}].
+    Um UPDATE (executemany) por lote de CONCILIACAO_LOTE, tudo na mesma transação.
+    Parcelas já baixadas ou inexistentes não são alteradas e voltam na resposta;
+    parcelas inativas ou de contas inativas contam como inexistentes.
+    """
+    if not isinstance(conciliacoes, list) or not conciliacoes:
+        raise ValueError('Informe "conciliacoes": [{"tipo", "parcela_id", "data", "valor"}]')
+
+    por_tipo = defaultdict(dict)
+    for item in conciliacoes:
+        try:
+            tipo, parcela_id = item['tipo'], int(item['parcela_id'])
+            data = datetime.strptime(str(item['data'])[:10], '%Y-%m-%d').date()
+            valor = Decimal(str(item['valor']))
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            raise ValueError(f"Conciliação inválida: {item}")
+        if tipo not in TIPOS:
+            raise ValueError(f"tipo deve ser {' ou '.join(TIPOS)}")
+        if valor <= 0:
+            raise ValueError(f"Parcela {parcela_id}: valor deve ser positivo")
+        if parcela_id in por_tipo[tipo]:
+            raise ValueError(f"Parcela {parcela_id} ({tipo}) informada mais de uma vez")
+        por_tipo[tipo][parcela_id] = (data, valor)
+
+    resultado = {'aplicadas': 0, 'ja_baixadas': [], 'nao_encontradas': []}
+    now = datetime.utcnow()
+    tabelas = set()
+    for tipo, baixas in por_tipo.items():
+        cfg = TIPOS[tipo]
+        table = cfg['parcela'].__table__
+        baixa, valor_baixa = table.c[cfg['baixa']], table.c[cfg['valor_baixa']]
+        conta = cfg['conta'].__table__
+        # EXISTS correlacionado: busca a conta pela chave primária em cada linha
+        ativas = and_(table.c.is_active == True,
+                      exists().where(conta.c.id == table.c[cfg['conta_fk']], conta.c.is_active == True))
+        ids = sorted(baixas)
+        abertas, existentes = set(), set()
+        for inicio in range(0, len(ids), CONCILIACAO_LOTE):
+            lote = ids[inicio:inicio + CONCILIACAO_LOTE]
+            for parcela_id, data_baixa in db.session.execute(
+                    select(table.c.id, baixa).where(table.c.id.in_(lote), ativas)):
+                existentes.add(parcela_id)
+                if data_baixa is None:
+                    abertas.add(parcela_id)
+        resultado['ja_baixadas'] += [{'tipo': tipo, 'parcela_id': i} for i in sorted(existentes - abertas)]
+        resultado['nao_encontradas'] += [{'tipo': tipo, 'parcela_id': i} for i in ids if i not in existentes]
+
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam('b_id'), baixa.is_(None), ativas)
+            .values({baixa: bindparam('b_data'), valor_baixa: bindparam('b_valor'), table.c.updated_at: now})
+        )
+        pendentes = sorted(abertas)
+        for inicio in range(0, len(pendentes), CONCILIACAO_LOTE):
+            # Conta as linhas que o UPDATE alterou: uma baixa concorrente entre o
+            # SELECT e o UPDATE não é contada como aplicada
+            resultado['aplicadas'] += db.session.execute(stmt, [
+                {'b_id': i, 'b_data': baixas[i][0], 'b_valor': baixas[i][1]}
+                for i in pendentes[inicio:inicio + CONCILIACAO_LOTE]
+            ]).rowcount
+        tabelas.add(table.name)
+    db.session.commit()
+    http_cache.invalidate(*tabelas)
+    return resultado
@@ -0,0 +1,63 @@
+from flask import request, jsonify
+from app import app, db
+from conciliacao import aplicar, conciliar
+from extrato_parser import ExtratoError, parse_extrato
+from werkzeug.exceptions import RequestEntityTooLarge
+
+EXTRATO_MIMETYPES = ('application/x-ofx', 'application/ofx', 'text/csv', 'text/plain')
+
+
+@app.route('/api/conciliacao/sugestoes', methods=['POST'])
+def sugestoes_conciliacao():
+    """
+    Lê um extrato (OFX ou CSV; multipart no campo `file` ou o arquivo direto no corpo)
+    e sugere a parcela em aberto que cada transação quita, com a confiança.
+    Parâmetros opcionais: janela_dias, janela_documento_dias, tolerancia (ex.: 0.02)
+    e confianca_minima. Nada é gravado: as sugestões aceitas vão para /api/conciliacao/aplicar.
+    """
+    try:
+        if request.mimetype in EXTRATO_MIMETYPES:
+            nome, conteudo = '', request.get_data()
+        else:
+            if 'file' not in request.files:
+                return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+            file = request.files['file']
+            nome = file.filename or ''
+            if not nome.lower().endswith(('.ofx', '.csv', '.txt')):
+                return jsonify({'error': 'Apenas extratos OFX ou CSV são aceitos'}), 400
+            conteudo = file.stream.read()
+
+        transacoes = parse_extrato(conteudo, nome)
+        return jsonify(conciliar(
+            transacoes,
+            janela=request.args.get('janela_dias', type=int),
+            janela_documento=request.args.get('janela_documento_dias', type=int),
+            tolerancia=request.args.get('tolerancia', type=float),
+            confianca_minima=request.args.get('confianca_minima', type=float),
+        )), 200
+
+    except ExtratoError as e:
+        return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Erro na conciliação: {str(e)}'}), 500
+
+
+@app.route('/api/conciliacao/aplicar', methods=['POST'])
+def aplicar_conciliacao():
+    """
+    Baixa em massa as parcelas conciliadas:
+    {"conciliacoes": [{"tipo": "pagar" | "receber", "parcela_id": int, "data": "YYYY-MM-DD", "valor": number}]}
+    (o campo `aplicar` de cada sugestão já vem nesse formato). Grava data_pagamento/valor_pago
+    ou data_recebimento/valor_recebido apenas nas parcelas ainda em aberto.
+    """
+    try:
+        data = request.get_json() or {}
+        return jsonify(aplicar(data.get('conciliacoes'))), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Erro ao aplicar conciliação: {str(e)}'}), 500
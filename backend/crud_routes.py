@@ -1,6 +1,10 @@
 from flask import request, jsonify
 from app import app, db
 from models import *
+from sqlalchemy.orm import joinedload
+from documentos import normalizar_documento
+from http_cache import conditional_cache
+from archive import restaurar, ArchiveConflict
 from datetime import datetime
 from decimal import Decimal
 
@@ -13,7 +17,8 @@ def create_fornecedor():
         data = request.get_json()
         
         # Verificar se CNPJ já existe
-        existing = Fornecedor.query.filter_by(cnpj=data.get('cnpj')).first()
+        cnpj_key = normalizar_documento(data.get('cnpj'))
+        existing = Fornecedor.query.filter_by(cnpj_key=cnpj_key).first() if cnpj_key else None
         if existing:
             return jsonify({'error': 'CNPJ já cadastrado'}), 400
         
@@ -43,8 +48,9 @@ def update_fornecedor(fornecedor_id):
         data = request.get_json()
         
         # Verificar se CNPJ já existe em outro fornecedor
-        if data.get('cnpj') != fornecedor.cnpj:
-            existing = Fornecedor.query.filter_by(cnpj=data.get('cnpj')).first()
+        cnpj_key = normalizar_documento(data.get('cnpj'))
+        if cnpj_key and cnpj_key != fornecedor.cnpj_key:
+            existing = Fornecedor.query.filter_by(cnpj_key=cnpj_key).first()
             if existing:
                 return jsonify({'error': 'CNPJ já cadastrado'}), 400
         
@@ -79,6 +85,8 @@ def inactivate_fornecedor(fornecedor_id):
 def reactivate_fornecedor(fornecedor_id):
     """Reativar fornecedor"""
     try:
+        # Registros arquivados voltam para a tabela ativa
+        restaurar(Fornecedor, fornecedor_id)
         fornecedor = Fornecedor.query.get_or_404(fornecedor_id)
         fornecedor.is_active = True
         
@@ -86,6 +94,9 @@ def reactivate_fornecedor(fornecedor_id):
         
         return jsonify({'message': 'Fornecedor reativado com sucesso'}), 200
         
+    except ArchiveConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -93,6 +104,7 @@ def reactivate_fornecedor(fornecedor_id):
 # ==================== CLIENTES ====================
 
 @app.route('/api/clientes', methods=['GET'])
+@conditional_cache(Cliente)
 def get_clientes():
     """Listar clientes ativos"""
     try:
@@ -105,7 +117,7 @@ def get_clientes():
                 'nome_completo': cliente.nome_completo,
                 'cpf': cliente.cpf,
                 'cnpj': cliente.cnpj,
-                'created_at': cliente.created_at.isoformat()
+                'created_at': cliente.created_at
             })
         
         return jsonify(result), 200
@@ -119,13 +131,15 @@ def create_cliente():
         data = request.get_json()
         
         # Verificar se CPF ou CNPJ já existe
-        if data.get('cpf'):
-            existing = Cliente.query.filter_by(cpf=data.get('cpf')).first()
+        cpf_key = normalizar_documento(data.get('cpf'))
+        cnpj_key = normalizar_documento(data.get('cnpj'))
+        if cpf_key:
+            existing = Cliente.query.filter_by(cpf_key=cpf_key).first()
             if existing:
                 return jsonify({'error': 'CPF já cadastrado'}), 400
         
-        if data.get('cnpj'):
-            existing = Cliente.query.filter_by(cnpj=data.get('cnpj')).first()
+        if cnpj_key:
+            existing = Cliente.query.filter_by(cnpj_key=cnpj_key).first()
             if existing:
                 return jsonify({'error': 'CNPJ já cadastrado'}), 400
         
@@ -166,10 +180,15 @@ def inactivate_cliente(cliente_id):
 def reactivate_cliente(cliente_id):
     """Reativar cliente"""
     try:
+        # Registros arquivados voltam para a tabela ativa
+        restaurar(Cliente, cliente_id)
         cliente = Cliente.query.get_or_404(cliente_id)
         cliente.is_active = True
         db.session.commit()
         return jsonify({'message': 'Cliente reativado com sucesso'}), 200
+    except ArchiveConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -181,13 +200,15 @@ def update_cliente(cliente_id):
         cliente = Cliente.query.get_or_404(cliente_id)
         data = request.get_json()
         # Verificar CPF único
-        if data.get('cpf') and data.get('cpf') != cliente.cpf:
-            existing = Cliente.query.filter_by(cpf=data.get('cpf')).first()
+        cpf_key = normalizar_documento(data.get('cpf'))
+        cnpj_key = normalizar_documento(data.get('cnpj'))
+        if cpf_key and cpf_key != cliente.cpf_key:
+            existing = Cliente.query.filter_by(cpf_key=cpf_key).first()
             if existing:
                 return jsonify({'error': 'CPF já cadastrado'}), 400
         # Verificar CNPJ único
-        if data.get('cnpj') and data.get('cnpj') != cliente.cnpj:
-            existing = Cliente.query.filter_by(cnpj=data.get('cnpj')).first()
+        if cnpj_key and cnpj_key != cliente.cnpj_key:
+            existing = Cliente.query.filter_by(cnpj_key=cnpj_key).first()
             if existing:
                 return jsonify({'error': 'CNPJ já cadastrado'}), 400
         cliente.nome_completo = data.get('nome_completo', cliente.nome_completo)
@@ -202,6 +223,7 @@ def update_cliente(cliente_id):
 # ==================== TIPOS DE DESPESA ====================
 
 @app.route('/api/tipos-despesa', methods=['GET'])
+@conditional_cache(TipoDespesa)
 def get_tipos_despesa():
     """Listar tipos de despesa ativos"""
     try:
@@ -213,7 +235,7 @@ def get_tipos_despesa():
                 'id': tipo.id,
                 'nome': tipo.nome,
                 'descricao': tipo.descricao,
-                'created_at': tipo.created_at.isoformat()
+                'created_at': tipo.created_at
             })
         
         return jsonify(result), 200
@@ -278,6 +300,7 @@ def reactivate_tipo_despesa(tipo_id):
 # ==================== TIPOS DE RECEITA ====================
 
 @app.route('/api/tipos-receita', methods=['GET'])
+@conditional_cache(TipoReceita)
 def get_tipos_receita():
     """Listar tipos de receita ativos"""
     try:
@@ -289,7 +312,7 @@ def get_tipos_receita():
                 'id': tipo.id,
                 'nome': tipo.nome,
                 'descricao': tipo.descricao,
-                'created_at': tipo.created_at.isoformat()
+                'created_at': tipo.created_at
             })
         
         return jsonify(result), 200
@@ -330,15 +353,15 @@ def create_tipo_receita():
 def get_contas_receber():
     """Listar contas a receber ativas"""
     try:
-        contas = ContaReceber.query.filter_by(is_active=True).all()
+        contas = ContaReceber.query.options(joinedload(ContaReceber.cliente)).filter_by(is_active=True).all()
         result = []
         
         for conta in contas:
             result.append({
                 'id': conta.id,
                 'numero_documento': conta.numero_documento,
-                'data_emissao': conta.data_emissao.isoformat(),
-                'valor_total': float(conta.valor_total),
+                'data_emissao': conta.data_emissao,
+                'valor_total': conta.valor_total,
                 'cliente': {
                     'nome_completo': conta.cliente.nome_completo,
                     'cpf': conta.cliente.cpf,
@@ -394,10 +417,15 @@ def inactivate_conta_pagar(conta_id):
 @app.route('/api/contas-pagar/<int:conta_id>/reativar', methods=['PATCH'])
 def reactivate_conta_pagar(conta_id):
     try:
+        # Registros arquivados voltam para a tabela ativa
+        restaurar(ContaPagar, conta_id)
         conta = ContaPagar.query.get_or_404(conta_id)
         conta.is_active = True
         db.session.commit()
         return jsonify({'message': 'Conta a pagar reativada com sucesso'}), 200
+    except ArchiveConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -420,10 +448,15 @@ def inactivate_conta_receber(conta_id):
 @app.route('/api/contas-receber/<int:conta_id>/reativar', methods=['PATCH'])
 def reactivate_conta_receber(conta_id):
     try:
+        # Registros arquivados voltam para a tabela ativa
+        restaurar(ContaReceber, conta_id)
         conta = ContaReceber.query.get_or_404(conta_id)
         conta.is_active = True
         db.session.commit()
         return jsonify({'message': 'Conta a receber reativada com sucesso'}), 200
+    except ArchiveConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,71 @@
+"""
+Separação de PDFs com várias DANFEs (uma nota por conjunto de páginas).
+
+Cada DANFE repete a chave de acesso (44 dígitos, com dígito verificador) no
+cabeçalho de todas as folhas; uma chave diferente da anterior abre uma nova nota.
+Páginas sem chave legível continuam a nota anterior, a menos que sejam a folha 1
+de outra DANFE ("FOLHA 1/N" com o cabeçalho DANFE); uma nota cuja primeira folha
+não tinha chave legível adota a chave da folha seguinte.
+"""
+import re
+from typing import List, Optional
+
+# 44 dígitos, separados ou não por espaço/ponto a cada grupo
+_CHAVE = re.compile(r'(?<!\d)\d(?:[ .]?\d){43}(?!\d)')
+_FOLHA = re.compile(r'FOLHA\s*:?\s*(\d+)\s*/\s*(\d+)', re.I)
+# Modelos de documento com DANFE: NF-e (55) e NFC-e (65)
+MODELOS = ('55', '65')
+
+
+def _digito_verificador(chave43: str) -> int:
+    # Módulo 11 com pesos 2..9 da direita para a esquerda
+    soma = sum(int(d) * (2 + i % 8) for i, d in enumerate(reversed(chave43)))
+    resto = soma % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+def chave_acesso(texto: str) -> Optional[str]:
+    """Primeira chave de acesso válida no texto (apenas dígitos) ou None"""
+    for match in _CHAVE.finditer(texto or ''):
+        chave = re.sub(r'\D', '', match.group())
+        if chave[20:22] in MODELOS and int(chave[43]) == _digito_verificador(chave[:43]):
+            return chave
+    return None
+
+
+def _primeira_folha(texto: str) -> bool:
+    folha = _FOLHA.search(texto or '')
+    return bool(folha) and folha.group(1) == '1' and 'DANFE' in texto.upper()
+
+
+def split_invoices(pages: List[str]) -> List[dict]:
+    """
+    Agrupa o texto das páginas por nota. Retorna uma lista de
+    {'paginas': [primeira, última] (a partir de 1), 'chave_acesso', 'texto'}.
+    PDFs de uma nota só (ou sem DANFE reconhecível) resultam em um único segmento.
+    """
+    segmentos = []
+    atual = None
+    for numero, texto in enumerate(pages, start=1):
+        chave = chave_acesso(texto)
+        primeira = _primeira_folha(texto)
+        if atual is None:
+            nova = True
+        elif chave and atual['chave_acesso'] is not None:
+            nova = chave != atual['chave_acesso']
+        else:
+            # Segmento ainda sem chave (capa, boleto ou folha com a chave ilegível):
+            # adota a chave da página, salvo se ela for a folha 1 de outra DANFE
+            nova = primeira and atual['danfe']
+        if nova:
+            atual = {'paginas': [numero, numero], 'chave_acesso': chave, 'danfe': False, 'textos': []}
+            segmentos.append(atual)
+        atual['paginas'][1] = numero
+        atual['chave_acesso'] = atual['chave_acesso'] or chave
+        atual['danfe'] = atual['danfe'] or primeira or chave is not None
+        atual['textos'].append(texto)
+
+    return [
+        {'paginas': s['paginas'], 'chave_acesso': s['chave_acesso'], 'texto': "\n".join(s['textos']).strip()}
+        for s in segmentos
+    ]
@@ -0,0 +1,27 @@
+from app import db
+from search_index import init_search_index
+from normalize_documents import sync_document_keys
+from idempotency import purge_expired
+import archive  # noqa: F401  (registra as tabelas de arquivo no metadata)
+
+def init_db():
+    """
+    Cria as tabelas e as estruturas auxiliares do banco (chaves de CPF/CNPJ e índice de busca textual)
+    e remove as chaves de idempotência expiradas.
+    Deve ser chamado dentro de um app context.
+    """
+    db.create_all()
+    sync_document_keys()
+    create_missing_indexes()
+    init_search_index()
+    purge_expired()
+
+
+def create_missing_indexes():
+    """
+    Cria índices declarados nos modelos que ainda não existem no banco
+    (db.create_all() não altera tabelas já existentes).
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
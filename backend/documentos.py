@@ -0,0 +1,26 @@
+import re
+
+_NAO_DIGITOS = re.compile(r'\D')
+
+def normalizar_documento(valor):
+    """
+    Normaliza CPF/CNPJ para a chave usada nas buscas: apenas dígitos.
+    "12.345.678/0001-90" e "12345678000190" resultam na mesma chave.
+    Retorna None quando não há nenhum dígito.
+    """
+    if valor is None:
+        return None
+    digitos = _NAO_DIGITOS.sub('', str(valor))
+    return digitos or None
+
+def formatar_documento(valor):
+    """
+    Formata CPF (XXX.XXX.XXX-XX) ou CNPJ (XX.XXX.XXX/XXXX-XX) a partir dos dígitos.
+    Valores com outra quantidade de dígitos são devolvidos apenas normalizados.
+    """
+    digitos = normalizar_documento(valor)
+    if digitos and len(digitos) == 11:
+        return f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+    if digitos and len(digitos) == 14:
+        return f"{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}"
+    return digitos
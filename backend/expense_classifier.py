@@ -1,20 +1,74 @@
-import openai
-from openai import OpenAI
-import google.generativeai as genai
 import json
 import os
 from typing import List, Dict
+from llm_gateway import get_gateway
+
+# Categorias de despesa (também usadas pelo seed e por /api/expense-categories,
+# que não precisam carregar o SDK do Gemini)
+CATEGORIAS = {
+    "INSUMOS AGRÍCOLAS": [
+        "Sementes", "Fertilizantes", "Defensivos Agrícolas", "Corretivos"
+    ],
+    "MANUTENÇÃO E OPERAÇÃO": [
+        "Combustíveis e Lubrificantes",
+        "Peças, Parafusos, Componentes Mecânicos",
+        "Manutenção de Máquinas e Equipamentos",
+        "Pneus, Filtros, Correias",
+        "Ferramentas e Utensílios"
+    ],
+    "RECURSOS HUMANOS": [
+        "Mão de Obra Temporária",
+        "Salários e Encargos"
+    ],
+    "SERVIÇOS OPERACIONAIS": [
+        "Frete e Transporte",
+        "Colheita Terceirizada",
+        "Secagem e Armazenagem",
+        "Pulverização e Aplicação"
+    ],
+    "INFRAESTRUTURA E UTILIDADES": [
+        "Energia Elétrica",
+        "Arrendamento de Terras",
+        "Construções e Reformas",
+        "Materiais de Construção"
+    ],
+    "ADMINISTRATIVAS": [
+        "Honorários (Contábeis, Advocatícios, Agronômicos)",
+        "Despesas Bancárias e Financeiras"
+    ],
+    "SEGUROS E PROTEÇÃO": [
+        "Seguro Agrícola",
+        "Seguro de Ativos (Máquinas/Veículos)",
+        "Seguro Prestamista"
+    ],
+    "IMPOSTOS E TAXAS": [
+        "ITR, IPTU, IPVA, INCRA-CCIR"
+    ],
+    "INVESTIMENTOS": [
+        "Aquisição de Máquinas e Implementos",
+        "Aquisição de Veículos",
+        "Aquisição de Imóveis",
+        "Infraestrutura Rural"
+    ]
+}
+
 
 class ExpenseClassifier:
     def __init__(self):
         """
-        Inicializa o classificador com cliente OpenAI e Gemini
+        Inicializa o classificador. As chamadas ao OpenAI e ao Gemini passam
+        pelo gateway assíncrono de LLM (ver llm_gateway.py); antes delas, o
+        histórico de classificações é consultado (ver expense_history.py).
         """
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        from expense_history import get_expense_history
+        self.llm = get_gateway()
+        self.history = get_expense_history()
         
         # Configurar Gemini como fallback
         gemini_key = os.getenv('GEMINI_API_KEY')
+        self.gemini_model = None
         if gemini_key:
+            import google.generativeai as genai
             genai.configure(api_key=gemini_key)
             # Seleciona dinamicamente um modelo Gemini disponível que suporte generateContent
             model_name = os.getenv('GEMINI_MODEL_NAME')
@@ -45,66 +99,17 @@ class ExpenseClassifier:
                 except Exception:
                     # Fallback para um nome estável
                     model_name = "gemini-1.5-pro"
-            self.gemini_model = genai.GenerativeModel(model_name)
-        else:
-            self.gemini_model = None
-        self.categories = {
-            "INSUMOS AGRÍCOLAS": [
-                "Sementes", "Fertilizantes", "Defensivos Agrícolas", "Corretivos"
-            ],
-            "MANUTENÇÃO E OPERAÇÃO": [
-                "Combustíveis e Lubrificantes",
-                "Peças, Parafusos, Componentes Mecânicos",
-                "Manutenção de Máquinas e Equipamentos",
-                "Pneus, Filtros, Correias",
-                "Ferramentas e Utensílios"
-            ],
-            "RECURSOS HUMANOS": [
-                "Mão de Obra Temporária",
-                "Salários e Encargos"
-            ],
-            "SERVIÇOS OPERACIONAIS": [
-                "Frete e Transporte",
-                "Colheita Terceirizada",
-                "Secagem e Armazenagem",
-                "Pulverização e Aplicação"
-            ],
-            "INFRAESTRUTURA E UTILIDADES": [
-                "Energia Elétrica",
-                "Arrendamento de Terras",
-                "Construções e Reformas",
-                "Materiais de Construção"
-            ],
-            "ADMINISTRATIVAS": [
-                "Honorários (Contábeis, Advocatícios, Agronômicos)",
-                "Despesas Bancárias e Financeiras"
-            ],
-            "SEGUROS E PROTEÇÃO": [
-                "Seguro Agrícola",
-                "Seguro de Ativos (Máquinas/Veículos)",
-                "Seguro Prestamista"
-            ],
-            "IMPOSTOS E TAXAS": [
-                "ITR, IPTU, IPVA, INCRA-CCIR"
-            ],
-            "INVESTIMENTOS": [
-                "Aquisição de Máquinas e Implementos",
-                "Aquisição de Veículos",
-                "Aquisição de Imóveis",
-                "Infraestrutura Rural"
-            ]
-        }
+            # Nome do modelo usado nas chamadas via gateway
+            self.gemini_model = model_name
+        self.categories = CATEGORIAS
 
-    def classify_expense(self, product_description: str) -> str:
-        """
-        Classifica uma despesa baseada na descrição dos produtos usando OpenAI GPT
-        """
+    def _build_prompt(self, product_description: str) -> str:
         categories_text = "\n".join([
             f"{category}: {', '.join(items)}"
             for category, items in self.categories.items()
         ])
         
-        prompt = f"""
+        return f"""
         Você é um especialista em classificação de despesas agrícolas. 
         
         Baseado na descrição dos produtos abaixo, classifique a despesa em UMA das seguintes categorias:
@@ -120,28 +125,69 @@ class ExpenseClassifier:
         - "Material Hidráulico" → "INFRAESTRUTURA E UTILIDADES"
         - "Sementes de Soja" → "INSUMOS AGRÍCOLAS"
         """
+    
+    def _match_category(self, classification: str) -> str:
+        """
+        Converte a resposta do modelo em uma categoria válida
+        """
+        # Verificar se a classificação está nas categorias válidas
+        if classification in self.categories:
+            return classification
+        
+        # Tentar encontrar uma categoria similar
+        for category in self.categories.keys():
+            if category.lower() in classification.lower() or classification.lower() in category.lower():
+                return category
+        
+        # Se não encontrar, retornar uma categoria padrão
+        return "ADMINISTRATIVAS"
+    
+    def refresh_history(self):
+        """
+        Traz para o índice do histórico as classificações gravadas desde a última
+        consulta. Chamado nos pontos de entrada síncronos (com app context)
+        """
+        self.history.refresh()
+    
+    def classify_expense(self, product_description: str) -> str:
+        """
+        Classifica uma despesa baseada na descrição dos produtos: pelo histórico,
+        se houver nota parecida já classificada, senão usando OpenAI GPT
+        """
+        self.refresh_history()
+        return self.llm.run(self.aclassify_expense(product_description))
+    
+    def classify_many(self, product_descriptions: List[str]) -> List[str]:
+        """
+        Classifica várias despesas de uma vez (lotes/backfill). O histórico
+        responde todas em um único produto de matrizes; só as restantes vão ao
+        LLM, com as chamadas disparadas em paralelo no gateway
+        """
+        self.refresh_history()
+        results = [hit and hit[0] for hit in self.history.classify_many(product_descriptions)]
+        pendentes = [i for i, r in enumerate(results) if r is None]
+        if pendentes:
+            respostas = self.llm.map(self._aclassify_with_llm, [product_descriptions[i] for i in pendentes])
+            for i, r in zip(pendentes, respostas):
+                results[i] = r
+        return [r if isinstance(r, str) else "ADMINISTRATIVAS" for r in results]
+    
+    async def aclassify_expense(self, product_description: str) -> str:
+        """
+        Versão assíncrona de classify_expense (usa o índice do histórico como
+        está; quem chama de fora do event loop deve chamar refresh_history antes)
+        """
+        hit = self.history.classify(product_description)
+        if hit:
+            return hit[0]
+        return await self._aclassify_with_llm(product_description)
+    
+    async def _aclassify_with_llm(self, product_description: str) -> str:
+        prompt = self._build_prompt(product_description)
         
         try:
-            response = self.client.completions.create(
-                model="gpt-3.5-turbo-instruct",
-                prompt=prompt,
-                max_tokens=100,
-                temperature=0.1
-            )
-            
-            classification = response.choices[0].text.strip()
-            
-            # Verificar se a classificação está nas categorias válidas
-            if classification in self.categories:
-                return classification
-            else:
-                # Tentar encontrar uma categoria similar
-                for category in self.categories.keys():
-                    if category.lower() in classification.lower() or classification.lower() in category.lower():
-                        return category
-                
-                # Se não encontrar, retornar uma categoria padrão
-                return "ADMINISTRATIVAS"
+            classification = await self.llm.complete('openai', prompt, max_tokens=100, temperature=0.1)
+            return self._match_category(classification)
                 
         except Exception as e:
             error_message = str(e)
@@ -150,19 +196,16 @@ class ExpenseClassifier:
             # Tratamento específico para erros de quota da OpenAI - tentar Gemini
             if "quota" in error_message.lower() or "exceeded" in error_message.lower():
                 print("OpenAI quota exceeded, trying Gemini fallback...")
-                return self._classify_with_gemini(prompt)
             elif "rate limit" in error_message.lower():
                 print("OpenAI rate limit reached, trying Gemini fallback...")
-                return self._classify_with_gemini(prompt)
             elif "authentication" in error_message.lower() or "api key" in error_message.lower():
                 print("OpenAI authentication error, trying Gemini fallback...")
-                return self._classify_with_gemini(prompt)
             else:
                 # Para outros erros, tentar Gemini como fallback
                 print("OpenAI error, trying Gemini fallback...")
-                return self._classify_with_gemini(prompt)
+            return await self._classify_with_gemini(prompt)
     
-    def _classify_with_gemini(self, prompt: str) -> str:
+    async def _classify_with_gemini(self, prompt: str) -> str:
         """
         Classifica despesa usando Google Gemini como fallback
         """
@@ -171,20 +214,8 @@ class ExpenseClassifier:
             return "ADMINISTRATIVAS"
         
         try:
-            response = self.gemini_model.generate_content(prompt)
-            classification = response.text.strip()
-            
-            # Verificar se a classificação está nas categorias válidas
-            if classification in self.categories:
-                return classification
-            else:
-                # Tentar encontrar uma categoria similar
-                for category in self.categories.keys():
-                    if category.lower() in classification.lower() or classification.lower() in category.lower():
-                        return category
-                
-                # Se não encontrar, retornar uma categoria padrão
-                return "ADMINISTRATIVAS"
+            classification = await self.llm.complete('gemini', prompt, max_tokens=100, model=self.gemini_model)
+            return self._match_category(classification)
                 
         except Exception as gemini_error:
             print(f"Gemini classification error: {str(gemini_error)}")
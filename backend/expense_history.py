@@ -0,0 +1,317 @@
+"""
+Classificação de despesas pelo histórico (vizinho mais próximo).
+
+Cada ClassificacaoDespesa ativa é um exemplo rotulado: descricao_produtos da
+conta -> nome do TipoDespesa. As descrições viram vetores esparsos por feature
+hashing (palavras e trigramas de caracteres, sem acento, normalizados em L2)
+guardados em uma matriz float32 densa; a busca é um único produto matriz-vetor
+no NumPy. Descrições repetidas com o mesmo tipo ocupam uma linha só (com peso).
+
+- KNN_ENABLED: usa o histórico antes do LLM (default true; sem NumPy fica desligado)
+- KNN_DIMENSOES: tamanho dos vetores (default 1024)
+- KNN_MAX_EXEMPLOS: linhas mantidas na matriz, as mais recentes (default 20000)
+- KNN_VIZINHOS: vizinhos mais próximos considerados (default 5)
+- KNN_SIMILARIDADE_MINIMA: similaridade de cosseno mínima para um vizinho votar
+  no tipo (default 0.75); sem nenhum, a despesa vai para o LLM
+- KNN_CONCORDANCIA_MINIMA: fração mínima dos votos do tipo vencedor (default 0.6)
+- KNN_ATUALIZACAO_SEGUNDOS: intervalo para buscar classificações gravadas por
+  outros workers (default 30); as gravadas neste worker entram no próximo uso
+- KNN_RECONSTRUCAO_SEGUNDOS: reconstrução completa, que descarta classificações
+  inativadas/removidas (default 3600)
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from functools import lru_cache
+from flask import has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
+from models import ClassificacaoDespesa, ContaPagar, TipoDespesa
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+KNN_ENABLED = os.getenv('KNN_ENABLED', 'true').lower() == 'true'
+KNN_DIMENSOES = int(os.getenv('KNN_DIMENSOES', '1024'))
+KNN_MAX_EXEMPLOS = int(os.getenv('KNN_MAX_EXEMPLOS', '20000'))
+KNN_VIZINHOS = int(os.getenv('KNN_VIZINHOS', '5'))
+KNN_SIMILARIDADE_MINIMA = float(os.getenv('KNN_SIMILARIDADE_MINIMA', '0.75'))
+KNN_CONCORDANCIA_MINIMA = float(os.getenv('KNN_CONCORDANCIA_MINIMA', '0.6'))
+KNN_ATUALIZACAO_SEGUNDOS = float(os.getenv('KNN_ATUALIZACAO_SEGUNDOS', '30'))
+KNN_RECONSTRUCAO_SEGUNDOS = float(os.getenv('KNN_RECONSTRUCAO_SEGUNDOS', '3600'))
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+# Palavras e unidades comuns nas descrições de nota que não distinguem o tipo
+STOPWORDS = {
+    'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'com', 'para', 'p', 'a', 'o', 'as', 'os',
+    'un', 'und', 'unid', 'pc', 'pcs', 'kg', 'g', 'lt', 'l', 'ml', 'cx', 'mt', 'm', 'sc', 'ref', 'cod',
+}
+
+
+def normalizar_texto(texto: str) -> str:
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode().lower()
+    # Números soltos (quantidades, códigos) não ajudam a comparar descrições
+    return ' '.join(t for t in _TOKEN.findall(texto) if t not in STOPWORDS and not t.isdigit())
+
+
+@lru_cache(maxsize=65536)
+def _token_features(token: str, dimensoes: int):
+    """Posições e pesos com sinal do token e dos seus trigramas (cacheado: as descrições repetem palavras)"""
+    marcado = f'#{token}#'
+    features = [(token, 1.0)] + [(marcado[i:i + 3], 0.5) for i in range(len(marcado) - 2)]
+    posicoes, pesos = [], []
+    for feature, peso in features:
+        h = zlib.crc32(feature.encode())
+        posicoes.append(h % dimensoes)
+        # Sinal pelo bit alto do hash: colisões tendem a se cancelar
+        pesos.append(peso if h & 0x80000000 else -peso)
+    return posicoes, pesos
+
+
+def vetorizar(texto_normalizado: str, dimensoes: int = None):
+    """Vetor hash (float32, norma 1; zerado se o texto não tem features)"""
+    dimensoes = dimensoes or KNN_DIMENSOES
+    posicoes, pesos = [], []
+    for token in texto_normalizado.split():
+        p, w = _token_features(token, dimensoes)
+        posicoes += p
+        pesos += w
+    vetor = np.bincount(posicoes, weights=pesos, minlength=dimensoes).astype(np.float32) if posicoes \
+        else np.zeros(dimensoes, dtype=np.float32)
+    norma = float(np.linalg.norm(vetor))
+    if norma:
+        vetor /= norma
+    return vetor
+
+
+class ExpenseHistoryIndex:
+    """Índice em memória (por processo) das classificações confirmadas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._n, self._tipos, self._ultimo_id = 0, [], 0
+        if np is not None:
+            self._vazio()
+        self._pendente = False
+        self._verificado_em = 0.0
+        self._construido_em = 0.0
+
+    def _vazio(self):
+        self._matriz = np.zeros((0, KNN_DIMENSOES), dtype=np.float32)
+        self._rotulos = np.zeros(0, dtype=np.int32)
+        self._pesos = np.zeros(0, dtype=np.float32)
+        self._n = 0
+        self._linhas = {}      # (texto normalizado, rótulo) -> linha
+        self._tipos = []       # rótulo -> nome do TipoDespesa
+        self._tipo_ids = {}
+        self._ultimo_id = 0
+
+    @property
+    def ativo(self) -> bool:
+        return KNN_ENABLED and np is not None
+
+    def __len__(self):
+        return self._n
+
+    # ==================== CARGA ====================
+
+    def marcar_pendente(self):
+        self._pendente = True
+
+    def refresh(self, force: bool = False):
+        """
+        Carrega as classificações novas (id maior que o último visto). Precisa de
+        um app context; chamado pelos pontos de entrada síncronos do classificador,
+        nunca no event loop do gateway de LLM.
+        """
+        if not self.ativo or not has_app_context():
+            return
+        # Outra thread já está atualizando: segue com o índice atual
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            agora = time.monotonic()
+            if force or not self._construido_em or agora - self._construido_em >= KNN_RECONSTRUCAO_SEGUNDOS:
+                self._construir(agora)
+            elif self._pendente or agora - self._verificado_em >= KNN_ATUALIZACAO_SEGUNDOS:
+                self._pendente = False
+                self._verificado_em = agora
+                self._adicionar(self._carregar(self._ultimo_id))
+        finally:
+            self._refresh_lock.release()
+
+    def _carregar(self, apos_id, limite=None):
+        stmt = (
+            select(ClassificacaoDespesa.id, ContaPagar.descricao_produtos, TipoDespesa.nome)
+            .join(ContaPagar, ContaPagar.id == ClassificacaoDespesa.conta_pagar_id)
+            .join(TipoDespesa, TipoDespesa.id == ClassificacaoDespesa.tipo_despesa_id)
+            .where(ClassificacaoDespesa.id > apos_id,
+                   ClassificacaoDespesa.is_active == True, ContaPagar.is_active == True)
+        )
+        if limite:
+            # Carga completa: apenas as mais recentes, devolvidas em ordem crescente
+            rows = db.session.execute(stmt.order_by(ClassificacaoDespesa.id.desc()).limit(limite)).all()
+            return rows[::-1]
+        return db.session.execute(stmt.order_by(ClassificacaoDespesa.id)).all()
+
+    def _construir(self, agora):
+        # Monta um índice novo fora do lock e troca o estado de uma vez: as
+        # consultas seguem usando o anterior durante a reconstrução
+        novo = ExpenseHistoryIndex()
+        novo._adicionar_sem_lock(self._carregar(0, KNN_MAX_EXEMPLOS))
+        with self._lock:
+            for campo in ('_matriz', '_rotulos', '_pesos', '_n', '_linhas', '_tipos', '_tipo_ids', '_ultimo_id'):
+                setattr(self, campo, getattr(novo, campo))
+            self._pendente = False
+            self._verificado_em = self._construido_em = agora
+
+    def _adicionar(self, rows):
+        if rows:
+            with self._lock:
+                self._adicionar_sem_lock(rows)
+
+    def _adicionar_sem_lock(self, rows):
+        novos_vetores, novos_rotulos = [], []
+        novas = {}
+        for row in rows:
+            self._ultimo_id = max(self._ultimo_id, row.id)
+            texto = normalizar_texto(row.descricao_produtos)
+            if not texto:
+                continue
+            rotulo = self._tipo_ids.get(row.nome)
+            if rotulo is None:
+                rotulo = self._tipo_ids[row.nome] = len(self._tipos)
+                self._tipos.append(row.nome)
+            chave = (texto, rotulo)
+            linha = self._linhas.get(chave)
+            if linha is not None:
+                self._pesos[linha] += 1
+            elif chave in novas:
+                novas[chave][1] += 1
+            else:
+                novas[chave] = [len(novos_vetores), 1]
+                novos_vetores.append(vetorizar(texto))
+                novos_rotulos.append(rotulo)
+        if not novos_vetores:
+            return
+
+        total = self._n + len(novos_vetores)
+        descartar = max(0, total - KNN_MAX_EXEMPLOS)
+        if descartar >= self._n:
+            # Só os exemplos novos cabem
+            inicio = len(novos_vetores) - min(len(novos_vetores), KNN_MAX_EXEMPLOS)
+            self._n = 0
+            self._linhas = {}
+            novas = {k: [i - inicio, p] for k, (i, p) in novas.items() if i >= inicio}
+            novos_vetores, novos_rotulos = novos_vetores[inicio:], novos_rotulos[inicio:]
+        elif descartar:
+            # Remove os mais antigos (início da matriz)
+            self._matriz[:self._n - descartar] = self._matriz[descartar:self._n]
+            self._rotulos[:self._n - descartar] = self._rotulos[descartar:self._n]
+            self._pesos[:self._n - descartar] = self._pesos[descartar:self._n]
+            self._n -= descartar
+            self._linhas = {k: i - descartar for k, i in self._linhas.items() if i >= descartar}
+
+        total = self._n + len(novos_vetores)
+        if total > len(self._matriz):
+            # Capacidade dobra a cada crescimento, até KNN_MAX_EXEMPLOS
+            capacidade = min(max(total, 2 * len(self._matriz), 256), KNN_MAX_EXEMPLOS)
+            for nome, dtype, forma in (('_matriz', np.float32, (capacidade, KNN_DIMENSOES)),
+                                       ('_rotulos', np.int32, capacidade), ('_pesos', np.float32, capacidade)):
+                novo = np.zeros(forma, dtype=dtype)
+                novo[:self._n] = getattr(self, nome)[:self._n]
+                setattr(self, nome, novo)
+
+        self._matriz[self._n:total] = np.stack(novos_vetores)
+        self._rotulos[self._n:total] = novos_rotulos
+        for chave, (i, peso) in novas.items():
+            self._pesos[self._n + i] = peso
+            self._linhas[chave] = self._n + i
+        self._n = total
+
+    # ==================== BUSCA ====================
+
+    def _decidir(self, similaridades):
+        k = min(KNN_VIZINHOS, self._n)
+        vizinhos = np.argpartition(-similaridades, k - 1)[:k]
+        # Só votam os vizinhos parecidos o bastante; o voto é a similaridade
+        # x (1 + log do número de notas com a mesma descrição e tipo)
+        vizinhos = vizinhos[similaridades[vizinhos] >= KNN_SIMILARIDADE_MINIMA]
+        if not len(vizinhos):
+            return None
+        votos = np.bincount(self._rotulos[vizinhos],
+                            weights=similaridades[vizinhos] * (1 + np.log(self._pesos[vizinhos])),
+                            minlength=len(self._tipos))
+        rotulo = int(votos.argmax())
+        if votos[rotulo] / votos.sum() < KNN_CONCORDANCIA_MINIMA:
+            return None
+        melhor = float(similaridades[vizinhos][self._rotulos[vizinhos] == rotulo].max())
+        return self._tipos[rotulo], melhor
+
+    def classify(self, product_description: str):
+        """(nome do tipo, similaridade) do histórico, ou None se não houver vizinho confiável"""
+        return self.classify_many([product_description])[0]
+
+    def classify_many(self, product_descriptions):
+        """Como classify, com todas as descrições comparadas em um único produto de matrizes"""
+        resultados = [None] * len(product_descriptions)
+        if not self.ativo or not self._n:
+            return resultados
+        consultas = [(i, normalizar_texto(d)) for i, d in enumerate(product_descriptions)]
+        consultas = [(i, texto) for i, texto in consultas if texto]
+        if not consultas:
+            return resultados
+        vetores = np.stack([vetorizar(texto) for _, texto in consultas])
+        with self._lock:
+            similaridades = vetores @ self._matriz[:self._n].T
+            for (i, _), linha in zip(consultas, similaridades):
+                resultados[i] = self._decidir(linha)
+        return resultados
+
+    def stats(self) -> dict:
+        return {
+            'ativo': self.ativo,
+            'exemplos': self._n,
+            'tipos': len(self._tipos) if self.ativo else 0,
+            'ultimo_id': self._ultimo_id if self.ativo else 0,
+        }
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_expense_history() -> ExpenseHistoryIndex:
+    """Índice do processo (um por worker do gunicorn)"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = ExpenseHistoryIndex()
+    return _history
+
+
+# ==================== ATUALIZAÇÃO INCREMENTAL ====================
+
+@event.listens_for(Session, 'after_flush')
+def _track_new_classifications(session, flush_context):
+    if any(isinstance(obj, ClassificacaoDespesa) for obj in session.new):
+        session.info['expense_history_pendente'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_history_pending(session):
+    if session.info.pop('expense_history_pendente', False) and _history is not None:
+        _history.marcar_pendente()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_history_pending(session):
+    session.info.pop('expense_history_pendente', None)
@@ -0,0 +1,398 @@
+"""
+Exportação em streaming (NDJSON ou CSV) de contas a pagar e a receber.
+
+As linhas são lidas em lotes (yield_per com cursor no servidor) e escritas
+na resposta à medida que chegam, então a memória não cresce com o total de
+registros. Filtros de período e de status são aplicados no SQL. Com
+incluir_arquivados=true as contas arquivadas (ver archive.py) vêm em seguida,
+marcadas com "arquivado": true.
+"""
+import csv
+import io
+import itertools
+import os
+from collections import defaultdict
+from datetime import datetime
+from flask import request, jsonify, Response, stream_with_context
+from sqlalchemy import and_, exists, select
+from sqlalchemy.orm import joinedload, selectinload
+from app import app, db
+from models import *
+from json_provider import dumps_bytes
+from archive import ARQUIVO, arquivo
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+FLUSH_BYTES = 64 * 1024
+
+CSV_COLUMNS_PAGAR = [
+    'conta_id', 'numero_nota_fiscal', 'data_emissao', 'descricao_produtos', 'valor_total',
+    'fornecedor_razao_social', 'fornecedor_cnpj', 'faturado_nome_completo', 'faturado_cpf',
+    'classificacoes', 'numero_parcela', 'data_vencimento', 'valor_parcela', 'data_pagamento', 'valor_pago',
+]
+
+CSV_COLUMNS_RECEBER = [
+    'conta_id', 'numero_documento', 'data_emissao', 'descricao', 'valor_total',
+    'cliente_nome_completo', 'cliente_cpf', 'cliente_cnpj',
+    'classificacoes', 'numero_parcela', 'data_vencimento', 'valor_parcela', 'data_recebimento', 'valor_recebido',
+]
+
+
+def _parse_filters():
+    """Lê formato, período (data_emissao), status e incluir_arquivados da query string"""
+    formato = request.args.get('formato', 'ndjson').lower()
+    if formato not in ('ndjson', 'csv'):
+        raise ValueError('Formato inválido. Use ndjson ou csv')
+
+    status = request.args.get('status', 'todos').lower()
+    if status not in ('todos', 'aberto', 'pago'):
+        raise ValueError('Status inválido. Use todos, aberto ou pago')
+
+    datas = {}
+    for nome in ('data_inicio', 'data_fim'):
+        valor = request.args.get(nome)
+        datas[nome] = datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+    incluir_arquivados = request.args.get('incluir_arquivados', 'false').lower() in ('1', 'true', 'sim')
+    return formato, status, datas['data_inicio'], datas['data_fim'], incluir_arquivados
+
+
+def _filtered_query(model, parcela_model, fk_column, settled_column, status, data_inicio, data_fim):
+    query = model.query.filter(model.is_active == True)
+    if data_inicio:
+        query = query.filter(model.data_emissao >= data_inicio)
+    if data_fim:
+        query = query.filter(model.data_emissao <= data_fim)
+
+    # Conta em aberto = possui ao menos uma parcela ativa sem baixa
+    em_aberto = exists().where(and_(
+        getattr(parcela_model, fk_column) == model.id,
+        parcela_model.is_active == True,
+        getattr(parcela_model, settled_column).is_(None),
+    ))
+    if status == 'aberto':
+        query = query.filter(em_aberto)
+    elif status == 'pago':
+        query = query.filter(~em_aberto)
+
+    return query.order_by(model.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def _stream(records, formato, columns, to_csv_rows):
+    """Gera os bytes da resposta, agrupando a escrita em blocos de ~64KB"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    chunks, size = [], 0
+
+    if formato == 'csv':
+        writer.writerow(columns)
+        chunks.append(buffer.getvalue().encode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate()
+
+    for record in records:
+        if formato == 'ndjson':
+            chunk = dumps_bytes(record) + b'\n'
+        else:
+            writer.writerows(to_csv_rows(record))
+            chunk = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= FLUSH_BYTES:
+            yield b''.join(chunks)
+            chunks, size = [], 0
+
+    if chunks:
+        yield b''.join(chunks)
+
+
+def _archived_batches(model, parcela_model, classificacao_model, fk_column, settled_column,
+                      tipo_model, tipo_fk, status, data_inicio, data_fim):
+    """
+    Lê as contas arquivadas (ativas) em lotes, por keyset no id, com parcelas e
+    nomes das classificações. Gera (contas, parcelas por conta, classificações por conta).
+    """
+    conta, parcela, classificacao = arquivo(model), arquivo(parcela_model), arquivo(classificacao_model)
+    tipo = tipo_model.__table__
+
+    filters = [conta.c.is_active == True]
+    if data_inicio:
+        filters.append(conta.c.data_emissao >= data_inicio)
+    if data_fim:
+        filters.append(conta.c.data_emissao <= data_fim)
+    em_aberto = exists().where(and_(
+        parcela.c[fk_column] == conta.c.id,
+        parcela.c.is_active == True,
+        parcela.c[settled_column].is_(None),
+    ))
+    if status == 'aberto':
+        filters.append(em_aberto)
+    elif status == 'pago':
+        filters.append(~em_aberto)
+
+    last_id = 0
+    while True:
+        contas = db.session.execute(
+            select(conta).where(*filters, conta.c.id > last_id).order_by(conta.c.id).limit(EXPORT_BATCH_SIZE)
+        ).all()
+        if not contas:
+            return
+        ids = [c.id for c in contas]
+        last_id = ids[-1]
+
+        parcelas = defaultdict(list)
+        for p in db.session.execute(
+            select(parcela).where(parcela.c[fk_column].in_(ids), parcela.c.is_active == True)
+            .order_by(parcela.c.numero_parcela)
+        ):
+            parcelas[getattr(p, fk_column)].append(p)
+
+        classificacoes = defaultdict(list)
+        for conta_id, nome in db.session.execute(
+            select(classificacao.c[fk_column], tipo.c.nome)
+            .join(tipo, tipo.c.id == classificacao.c[tipo_fk])
+            .where(classificacao.c[fk_column].in_(ids), classificacao.c.is_active == True)
+        ):
+            classificacoes[conta_id].append(nome)
+
+        yield contas, parcelas, classificacoes
+
+
+def _parties(model, ids):
+    """Cadastros por id, procurando na tabela ativa e, se preciso, no arquivo"""
+    ids = set(ids)
+    found = {row.id: row for row in db.session.execute(select(model.__table__).where(model.__table__.c.id.in_(ids)))}
+    missing = ids - found.keys()
+    if missing and model.__tablename__ in ARQUIVO:
+        table = arquivo(model)
+        found.update({row.id: row for row in db.session.execute(select(table).where(table.c.id.in_(missing)))})
+    return found
+
+
+def _response(generator, formato, nome):
+    mimetype = 'application/x-ndjson' if formato == 'ndjson' else 'text/csv'
+    extensao = 'ndjson' if formato == 'ndjson' else 'csv'
+    filename = f"{nome}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{extensao}"
+    return Response(
+        stream_with_context(generator),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+# ==================== CONTAS A PAGAR ====================
+
+def _conta_pagar_record(conta):
+    return {
+        'id': conta.id,
+        'numero_nota_fiscal': conta.numero_nota_fiscal,
+        'data_emissao': conta.data_emissao,
+        'descricao_produtos': conta.descricao_produtos,
+        'valor_total': conta.valor_total,
+        'fornecedor': {
+            'id': conta.fornecedor_id,
+            'razao_social': conta.fornecedor.razao_social,
+            'cnpj': conta.fornecedor.cnpj
+        },
+        'faturado': {
+            'id': conta.faturado_id,
+            'nome_completo': conta.faturado.nome_completo,
+            'cpf': conta.faturado.cpf
+        },
+        'classificacoes': [c.tipo_despesa.nome for c in conta.classificacoes if c.is_active],
+        'parcelas': [
+            {
+                'numero_parcela': p.numero_parcela,
+                'data_vencimento': p.data_vencimento,
+                'valor': p.valor,
+                'data_pagamento': p.data_pagamento,
+                'valor_pago': p.valor_pago
+            }
+            for p in conta.parcelas if p.is_active
+        ]
+    }
+
+
+def _archived_contas_pagar(status, data_inicio, data_fim):
+    batches = _archived_batches(ContaPagar, ParcelaPagar, ClassificacaoDespesa, 'conta_pagar_id', 'data_pagamento',
+                                TipoDespesa, 'tipo_despesa_id', status, data_inicio, data_fim)
+    for contas, parcelas, classificacoes in batches:
+        fornecedores = _parties(Fornecedor, [c.fornecedor_id for c in contas])
+        faturados = _parties(Faturado, [c.faturado_id for c in contas])
+        for conta in contas:
+            fornecedor, faturado = fornecedores.get(conta.fornecedor_id), faturados.get(conta.faturado_id)
+            yield {
+                'id': conta.id,
+                'numero_nota_fiscal': conta.numero_nota_fiscal,
+                'data_emissao': conta.data_emissao,
+                'descricao_produtos': conta.descricao_produtos,
+                'valor_total': conta.valor_total,
+                'fornecedor': {
+                    'id': conta.fornecedor_id,
+                    'razao_social': getattr(fornecedor, 'razao_social', None),
+                    'cnpj': getattr(fornecedor, 'cnpj', None)
+                },
+                'faturado': {
+                    'id': conta.faturado_id,
+                    'nome_completo': getattr(faturado, 'nome_completo', None),
+                    'cpf': getattr(faturado, 'cpf', None)
+                },
+                'classificacoes': classificacoes[conta.id],
+                'parcelas': [
+                    {
+                        'numero_parcela': p.numero_parcela,
+                        'data_vencimento': p.data_vencimento,
+                        'valor': p.valor,
+                        'data_pagamento': p.data_pagamento,
+                        'valor_pago': p.valor_pago
+                    }
+                    for p in parcelas[conta.id]
+                ],
+                'arquivado': True
+            }
+
+
+def _conta_pagar_csv_rows(record):
+    base = [
+        record['id'], record['numero_nota_fiscal'], record['data_emissao'], record['descricao_produtos'],
+        record['valor_total'], record['fornecedor']['razao_social'], record['fornecedor']['cnpj'],
+        record['faturado']['nome_completo'], record['faturado']['cpf'], '; '.join(record['classificacoes']),
+    ]
+    # Uma linha por parcela (ou uma linha sem parcela)
+    parcelas = record['parcelas'] or [{}]
+    return [
+        base + [p.get('numero_parcela'), p.get('data_vencimento'), p.get('valor'),
+                p.get('data_pagamento'), p.get('valor_pago')]
+        for p in parcelas
+    ]
+
+
+@app.route('/api/contas-pagar/export', methods=['GET'])
+def export_contas_pagar():
+    """
+    Exporta contas a pagar com parcelas e classificações.
+    Parâmetros: formato (ndjson|csv), data_inicio, data_fim (data de emissão, YYYY-MM-DD),
+    status (todos|aberto|pago) e incluir_arquivados (true|false).
+    """
+    try:
+        formato, status, data_inicio, data_fim, incluir_arquivados = _parse_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = _filtered_query(
+        ContaPagar, ParcelaPagar, 'conta_pagar_id', 'data_pagamento', status, data_inicio, data_fim
+    ).options(
+        joinedload(ContaPagar.fornecedor),
+        joinedload(ContaPagar.faturado),
+        selectinload(ContaPagar.parcelas),
+        selectinload(ContaPagar.classificacoes).joinedload(ClassificacaoDespesa.tipo_despesa),
+    )
+    records = (_conta_pagar_record(conta) for conta in query)
+    if incluir_arquivados:
+        records = itertools.chain(records, _archived_contas_pagar(status, data_inicio, data_fim))
+    generator = _stream(records, formato, CSV_COLUMNS_PAGAR, _conta_pagar_csv_rows)
+    return _response(generator, formato, 'contas_pagar')
+
+
+# ==================== CONTAS A RECEBER ====================
+
+def _conta_receber_record(conta):
+    return {
+        'id': conta.id,
+        'numero_documento': conta.numero_documento,
+        'data_emissao': conta.data_emissao,
+        'descricao': conta.descricao,
+        'valor_total': conta.valor_total,
+        'cliente': {
+            'id': conta.cliente_id,
+            'nome_completo': conta.cliente.nome_completo,
+            'cpf': conta.cliente.cpf,
+            'cnpj': conta.cliente.cnpj
+        },
+        'classificacoes': [c.tipo_receita.nome for c in conta.classificacoes if c.is_active],
+        'parcelas': [
+            {
+                'numero_parcela': p.numero_parcela,
+                'data_vencimento': p.data_vencimento,
+                'valor': p.valor,
+                'data_recebimento': p.data_recebimento,
+                'valor_recebido': p.valor_recebido
+            }
+            for p in conta.parcelas if p.is_active
+        ]
+    }
+
+
+def _archived_contas_receber(status, data_inicio, data_fim):
+    batches = _archived_batches(ContaReceber, ParcelaReceber, ClassificacaoReceita, 'conta_receber_id',
+                                'data_recebimento', TipoReceita, 'tipo_receita_id', status, data_inicio, data_fim)
+    for contas, parcelas, classificacoes in batches:
+        clientes = _parties(Cliente, [c.cliente_id for c in contas])
+        for conta in contas:
+            cliente = clientes.get(conta.cliente_id)
+            yield {
+                'id': conta.id,
+                'numero_documento': conta.numero_documento,
+                'data_emissao': conta.data_emissao,
+                'descricao': conta.descricao,
+                'valor_total': conta.valor_total,
+                'cliente': {
+                    'id': conta.cliente_id,
+                    'nome_completo': getattr(cliente, 'nome_completo', None),
+                    'cpf': getattr(cliente, 'cpf', None),
+                    'cnpj': getattr(cliente, 'cnpj', None)
+                },
+                'classificacoes': classificacoes[conta.id],
+                'parcelas': [
+                    {
+                        'numero_parcela': p.numero_parcela,
+                        'data_vencimento': p.data_vencimento,
+                        'valor': p.valor,
+                        'data_recebimento': p.data_recebimento,
+                        'valor_recebido': p.valor_recebido
+                    }
+                    for p in parcelas[conta.id]
+                ],
+                'arquivado': True
+            }
+
+
+def _conta_receber_csv_rows(record):
+    base = [
+        record['id'], record['numero_documento'], record['data_emissao'], record['descricao'], record['valor_total'],
+        record['cliente']['nome_completo'], record['cliente']['cpf'], record['cliente']['cnpj'],
+        '; '.join(record['classificacoes']),
+    ]
+    parcelas = record['parcelas'] or [{}]
+    return [
+        base + [p.get('numero_parcela'), p.get('data_vencimento'), p.get('valor'),
+                p.get('data_recebimento'), p.get('valor_recebido')]
+        for p in parcelas
+    ]
+
+
+@app.route('/api/contas-receber/export', methods=['GET'])
+def export_contas_receber():
+    """
+    Exporta contas a receber com parcelas e classificações.
+    Parâmetros: formato (ndjson|csv), data_inicio, data_fim (data de emissão, YYYY-MM-DD),
+    status (todos|aberto|pago) e incluir_arquivados (true|false).
+    """
+    try:
+        formato, status, data_inicio, data_fim, incluir_arquivados = _parse_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = _filtered_query(
+        ContaReceber, ParcelaReceber, 'conta_receber_id', 'data_recebimento', status, data_inicio, data_fim
+    ).options(
+        joinedload(ContaReceber.cliente),
+        selectinload(ContaReceber.parcelas),
+        selectinload(ContaReceber.classificacoes).joinedload(ClassificacaoReceita.tipo_receita),
+    )
+    records = (_conta_receber_record(conta) for conta in query)
+    if incluir_arquivados:
+        records = itertools.chain(records, _archived_contas_receber(status, data_inicio, data_fim))
+    generator = _stream(records, formato, CSV_COLUMNS_RECEBER, _conta_receber_csv_rows)
+    return _response(generator, formato, 'contas_receber')
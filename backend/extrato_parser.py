@@ -0,0 +1,188 @@
+"""
+Leitura de extratos bancários (OFX 1.x/SGML, OFX 2.x/XML e CSV) para a conciliação.
+
+Cada transação vira um dict:
+    {'id': FITID (ou a linha do CSV), 'data': date, 'valor': Decimal com sinal
+     (negativo = débito/pagamento, positivo = crédito/recebimento),
+     'descricao': str, 'chaves': [documentos citados, apenas dígitos]}
+
+`chaves` reúne CHECKNUM/REFNUM do OFX (ou a coluna documento do CSV) e os CPF/CNPJ
+escritos no histórico; números de documento perdem os zeros à esquerda e, se
+tiverem o tamanho de CPF/CNPJ, entram também com eles.
+
+CSV: cabeçalho na primeira linha, separador ; , ou tab detectado; colunas data,
+descricao/historico, valor (com sinal) ou debito/credito e, opcional, documento.
+Datas DD/MM/AAAA ou AAAA-MM-DD; valores 1.234,56 ou 1234.56.
+"""
+import csv
+import io
+import os
+import re
+import unicodedata
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from documentos import normalizar_documento
+
+EXTRATO_MAX_TRANSACOES = int(os.getenv('EXTRATO_MAX_TRANSACOES', '100000'))
+
+_OFX_TRANSACAO = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.S | re.I)
+_OFX_CAMPO = re.compile(r'<(\w+)>([^<\r\n]*)')
+# CNPJ ou CPF, com ou sem pontuação
+_DOCUMENTO = re.compile(r'(?<!\d)(?:\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}|\d{3}\.?\d{3}\.?\d{3}-?\d{2})(?!\d)')
+
+# coluna do CSV -> nomes aceitos no cabeçalho (sem acento, minúsculos)
+COLUNAS_CSV = {
+    'id': ('id', 'fitid', 'identificador'),
+    'data': ('data', 'data_lancamento', 'data_movimento', 'dt_lancamento', 'date'),
+    'descricao': ('descricao', 'historico', 'memo', 'lancamento', 'description'),
+    'valor': ('valor', 'valor_r$', 'amount'),
+    'debito': ('debito', 'saida', 'valor_debito'),
+    'credito': ('credito', 'entrada', 'valor_credito'),
+    'documento': ('documento', 'doc', 'numero_documento', 'num_documento', 'cpf_cnpj'),
+}
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y', '%Y%m%d')
+
+
+class ExtratoError(ValueError):
+    pass
+
+
+def chave_numero(valor):
+    """Número de documento para comparação: apenas dígitos, sem zeros à esquerda"""
+    digitos = normalizar_documento(valor)
+    if not digitos:
+        return None
+    return digitos.lstrip('0') or None
+
+
+def _chaves(descricao, *numeros):
+    chaves = {normalizar_documento(m) for m in _DOCUMENTO.findall(descricao or '')}
+    for numero in numeros:
+        chaves.add(chave_numero(numero))
+        digitos = normalizar_documento(numero)
+        if digitos and len(digitos) in (11, 14):
+            # Pode ser CPF/CNPJ (ex.: coluna cpf_cnpj): mantém também a chave com
+            # os zeros à esquerda, que é a usada por cpf_key/cnpj_key
+            chaves.add(digitos)
+    chaves.discard(None)
+    return sorted(chaves)
+
+
+def _decode(conteudo: bytes) -> str:
+    try:
+        return conteudo.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return conteudo.decode('cp1252', errors='replace')
+
+
+def parse_valor(texto):
+    texto = (texto or '').strip().replace('R$', '').replace(' ', '')
+    if not texto:
+        return None
+    sinal = 1
+    if texto[-1] in 'DdCc' and len(texto) > 1:
+        sinal = -1 if texto[-1] in 'Dd' else 1
+        texto = texto[:-1]
+    if ',' in texto and '.' in texto:
+        texto = texto.replace('.', '').replace(',', '.') if texto.rfind(',') > texto.rfind('.') else texto.replace(',', '')
+    else:
+        texto = texto.replace(',', '.')
+    try:
+        return sinal * Decimal(texto)
+    except InvalidOperation:
+        raise ExtratoError(f"valor inválido: {texto}")
+
+
+def parse_data(texto):
+    texto = (texto or '').strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ExtratoError(f"data inválida: {texto}")
+
+
+def _limite(transacoes):
+    if len(transacoes) > EXTRATO_MAX_TRANSACOES:
+        raise ExtratoError(f"O extrato tem mais de {EXTRATO_MAX_TRANSACOES} transações")
+
+
+def parse_ofx(texto: str) -> list:
+    transacoes = []
+    for bloco in _OFX_TRANSACAO.findall(texto):
+        campos = {tag.upper(): valor.strip() for tag, valor in _OFX_CAMPO.findall(bloco)}
+        if 'TRNAMT' not in campos or 'DTPOSTED' not in campos:
+            raise ExtratoError('Transação OFX sem TRNAMT/DTPOSTED')
+        descricao = ' '.join(v for v in (campos.get('NAME'), campos.get('MEMO')) if v)
+        transacoes.append({
+            'id': campos.get('FITID') or str(len(transacoes) + 1),
+            # DTPOSTED: AAAAMMDD[HHMMSS[.XXX]][[-3:BRT]]
+            'data': parse_data(campos['DTPOSTED'][:8]),
+            'valor': parse_valor(campos['TRNAMT']),
+            'descricao': descricao,
+            'chaves': _chaves(descricao, campos.get('CHECKNUM'), campos.get('REFNUM')),
+        })
+        _limite(transacoes)
+    if not transacoes and '<OFX>' not in texto.upper():
+        raise ExtratoError('Arquivo OFX inválido')
+    return transacoes
+
+
+def _cabecalho(nome):
+    nome = unicodedata.normalize('NFKD', nome or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'\s+', '_', nome.strip().lower())
+
+
+def parse_csv(texto: str) -> list:
+    try:
+        dialect = csv.Sniffer().sniff(texto[:4096], delimiters=';,\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(texto), dialect)
+    cabecalho = [_cabecalho(h) for h in next(reader, [])]
+    indices = {}
+    for coluna, nomes in COLUNAS_CSV.items():
+        for i, nome in enumerate(cabecalho):
+            if nome in nomes:
+                indices.setdefault(coluna, i)
+    if 'data' not in indices or not ('valor' in indices or 'debito' in indices or 'credito' in indices):
+        raise ExtratoError('O CSV precisa das colunas data e valor (ou debito/credito)')
+
+    transacoes = []
+    for linha, row in enumerate(reader, start=2):
+        def campo(coluna):
+            i = indices.get(coluna)
+            return row[i] if i is not None and i < len(row) else ''
+
+        if not any(c.strip() for c in row):
+            continue
+        try:
+            if 'valor' in indices and campo('valor').strip():
+                valor = parse_valor(campo('valor'))
+            else:
+                debito, credito = parse_valor(campo('debito')), parse_valor(campo('credito'))
+                if debito is None and credito is None:
+                    continue  # linhas de saldo
+                valor = (credito or 0) - abs(debito or 0)
+            data = parse_data(campo('data'))
+        except ExtratoError as e:
+            raise ExtratoError(f"linha {linha}: {e}")
+        descricao = campo('descricao').strip()
+        transacoes.append({
+            'id': campo('id').strip() or str(linha),
+            'data': data,
+            'valor': valor,
+            'descricao': descricao,
+            'chaves': _chaves(descricao, campo('documento')),
+        })
+        _limite(transacoes)
+    return transacoes
+
+
+def parse_extrato(conteudo: bytes, nome: str = '') -> list:
+    """Detecta o formato (OFX pelo conteúdo ou extensão; senão CSV) e lê as transações"""
+    texto = _decode(conteudo)
+    if nome.lower().endswith('.ofx') or '<OFX>' in texto[:8192].upper():
+        return parse_ofx(texto)
+    return parse_csv(texto)
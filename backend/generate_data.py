@@ -0,0 +1,275 @@
+"""
+Gerador de dados sintéticos em volume de produção.
+
+Preenche o banco configurado (DB_ENGINE/SQLITE_PATH) com fornecedores,
+faturados, clientes, contas a pagar/receber, parcelas e classificações, com
+CPF/CNPJ válidos (dígitos verificadores) e distribuições plausíveis: emissões
+nos últimos 3 anos, 1 a 6 parcelas mensais, parcelas vencidas em geral quitadas
+e ~2% de registros inativos. As linhas são inseridas em lote (INSERT com
+executemany), com ids atribuídos aqui, uma transação por lote.
+
+    python generate_data.py                                 # 100k fornecedores, 1M contas a pagar
+    python generate_data.py --fornecedores 1000 --contas-pagar 10000 --seed 7
+
+Os registros são acrescentados aos existentes (CPF/CNPJ derivados dos ids novos).
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import func, insert, select, text
+from app import app, db
+from models import (
+    Fornecedor, Faturado, Cliente, TipoDespesa, TipoReceita, ContaPagar, ContaReceber,
+    ParcelaPagar, ParcelaReceber, ClassificacaoDespesa, ClassificacaoReceita,
+)
+from expense_classifier import CATEGORIAS
+from documentos import formatar_documento, normalizar_documento
+
+GENERATE_BATCH_SIZE = int(os.getenv('GENERATE_BATCH_SIZE', '10000'))
+
+# Faixas de numeração dos documentos sintéticos (raiz do CNPJ / CPF sem DV),
+# separadas por cadastro para não colidirem entre si
+CNPJ_FORNECEDOR = 10_000_000
+CNPJ_CLIENTE = 40_000_000
+CNPJ_LOAD_TEST = 70_000_000
+CPF_FATURADO = 100_000_000
+CPF_CLIENTE = 300_000_000
+
+TIPOS_RECEITA = ['VENDA DE GRÃOS', 'VENDA DE GADO', 'ARRENDAMENTO RECEBIDO', 'PRESTAÇÃO DE SERVIÇOS']
+
+NOMES = ['Agro', 'Campo', 'Terra', 'Safra', 'Rural', 'Verde', 'Sol', 'Vale', 'Serra', 'Rio',
+         'Nova', 'Boa Vista', 'Santa Rita', 'São José', 'Paraíba', 'Nordeste', 'Cerrado', 'Sertão']
+RAMOS = ['Insumos', 'Máquinas', 'Combustíveis', 'Peças', 'Transportes', 'Sementes', 'Fertilizantes',
+         'Construções', 'Serviços Agrícolas', 'Comércio', 'Distribuidora', 'Representações']
+SUFIXOS = ['LTDA', 'ME', 'EIRELI', 'S.A.', 'LTDA EPP']
+PRENOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela',
+            'João', 'Karina', 'Lucas', 'Mariana', 'Pedro', 'Rafaela', 'Sérgio', 'Tatiane', 'Vinícius']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Costa',
+              'Rodrigues', 'Almeida', 'Nascimento', 'Araújo', 'Melo', 'Barbosa', 'Cavalcanti']
+
+
+def _dv(digitos, pesos):
+    resto = sum(d * p for d, p in zip(digitos, pesos)) % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+def cnpj_sintetico(numero: int) -> str:
+    """CNPJ válido (matriz 0001) com a raiz derivada de `numero`"""
+    digitos = [int(c) for c in f"{numero % 100_000_000:08d}0001"]
+    digitos.append(_dv(digitos, [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+    digitos.append(_dv(digitos, [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+    return formatar_documento(''.join(map(str, digitos)))
+
+
+def cpf_sintetico(numero: int) -> str:
+    """CPF válido com os 9 primeiros dígitos derivados de `numero`"""
+    digitos = [int(c) for c in f"{numero % 1_000_000_000:09d}"]
+    digitos.append(_dv(digitos, range(10, 1, -1)))
+    digitos.append(_dv(digitos, range(11, 1, -1)))
+    return formatar_documento(''.join(map(str, digitos)))
+
+
+def _razao_social(rng):
+    return f"{rng.choice(NOMES)} {rng.choice(RAMOS)} {rng.choice(SUFIXOS)}"
+
+
+def _nome_pessoa(rng):
+    return f"{rng.choice(PRENOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+
+
+def _valor(rng):
+    # Log-normal: muitas notas pequenas, algumas grandes (mediana ~R$ 2.000)
+    return Decimal(min(rng.lognormvariate(7.6, 1.2), 9_000_000)).quantize(Decimal('0.01'))
+
+
+def _indice_concentrado(rng, n):
+    """Metade das notas se concentra em poucos fornecedores (Pareto); o resto é uniforme"""
+    if rng.random() < 0.5:
+        return min(int(rng.paretovariate(1.2)) - 1, n - 1)
+    return rng.randrange(n)
+
+
+def _next_id(model):
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _ensure_tipos(model, nomes):
+    """Garante os tipos de despesa/receita e retorna seus ids"""
+    existentes = dict(db.session.execute(select(model.nome, model.id).where(model.nome.in_(nomes))).all())
+    for nome in nomes:
+        if nome not in existentes:
+            db.session.add(model(nome=nome, descricao=f"Categoria: {nome}"))
+    db.session.commit()
+    return [i for (i,) in db.session.execute(select(model.id).where(model.nome.in_(nomes))).all()]
+
+
+class _Writer:
+    """Acumula linhas por tabela e grava em lote (uma transação por flush)"""
+
+    def __init__(self, lote):
+        self.lote = lote
+        self.rows = {}
+        self.totais = {}
+
+    def add(self, model, row):
+        rows = self.rows.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.lote:
+            self.flush()
+
+    def flush(self):
+        # Pais antes dos filhos (tabelas em ordem de dependência das FKs)
+        for table in db.metadata.sorted_tables:
+            for model in [m for m in self.rows if m.__table__ is table]:
+                rows = self.rows.pop(model)
+                if rows:
+                    db.session.execute(insert(table), rows)
+                    self.totais[table.name] = self.totais.get(table.name, 0) + len(rows)
+        db.session.commit()
+
+
+def _parcelas(rng, valor_total, emissao, hoje):
+    n = rng.choices([1, 2, 3, 4, 6], weights=[50, 20, 15, 10, 5])[0]
+    base = (valor_total / n).quantize(Decimal('0.01'))
+    for i in range(1, n + 1):
+        valor = base if i < n else valor_total - base * (n - 1)
+        vencimento = emissao + timedelta(days=30 * i)
+        quitada = vencimento < hoje and rng.random() < 0.9
+        baixa = vencimento + timedelta(days=rng.randint(-5, 10)) if quitada else None
+        yield i, vencimento, valor, (min(baixa, hoje) if baixa else None)
+
+
+def generate(fornecedores=100_000, faturados=5_000, clientes=20_000, contas_pagar=1_000_000,
+             contas_receber=100_000, seed=42, lote=GENERATE_BATCH_SIZE, log=print):
+    rng = random.Random(seed)
+    hoje = date.today()
+    now = datetime.utcnow()
+    writer = _Writer(lote)
+
+    def base(i, inativo=0.02):
+        return {'id': i, 'created_at': now, 'updated_at': now, 'is_active': rng.random() >= inativo}
+
+    tipos_despesa = _ensure_tipos(TipoDespesa, list(CATEGORIAS))
+    tipos_receita = _ensure_tipos(TipoReceita, TIPOS_RECEITA)
+    produtos = [p for itens in CATEGORIAS.values() for p in itens]
+
+    # ---- Cadastros ----
+    inicio = _next_id(Fornecedor)
+    fornecedor_ids = range(inicio, inicio + fornecedores)
+    for i in fornecedor_ids:
+        cnpj = cnpj_sintetico(CNPJ_FORNECEDOR + i)
+        razao = _razao_social(rng)
+        writer.add(Fornecedor, dict(base(i), razao_social=razao, fantasia=razao.rsplit(' ', 1)[0],
+                                    cnpj=cnpj, cnpj_key=normalizar_documento(cnpj)))
+
+    inicio = _next_id(Faturado)
+    faturado_ids = range(inicio, inicio + faturados)
+    for i in faturado_ids:
+        cpf = cpf_sintetico(CPF_FATURADO + i)
+        writer.add(Faturado, dict(base(i, 0), nome_completo=_nome_pessoa(rng), cpf=cpf,
+                                  cpf_key=normalizar_documento(cpf)))
+
+    inicio = _next_id(Cliente)
+    cliente_ids = range(inicio, inicio + clientes)
+    for i in cliente_ids:
+        row = dict(base(i), cpf=None, cpf_key=None, cnpj=None, cnpj_key=None)
+        if rng.random() < 0.5:
+            row['cpf'] = cpf_sintetico(CPF_CLIENTE + i)
+            row['cpf_key'] = normalizar_documento(row['cpf'])
+            row['nome_completo'] = _nome_pessoa(rng)
+        else:
+            row['cnpj'] = cnpj_sintetico(CNPJ_CLIENTE + i)
+            row['cnpj_key'] = normalizar_documento(row['cnpj'])
+            row['nome_completo'] = _razao_social(rng)
+        writer.add(Cliente, row)
+    writer.flush()
+    log(f"cadastros: {fornecedores} fornecedores, {faturados} faturados, {clientes} clientes")
+
+    # ---- Contas a pagar ----
+    conta_id, parcela_id, classificacao_id = _next_id(ContaPagar), _next_id(ParcelaPagar), _next_id(ClassificacaoDespesa)
+    start = time.perf_counter()
+    for n in range(contas_pagar):
+        emissao = hoje - timedelta(days=rng.randint(0, 3 * 365))
+        valor_total = _valor(rng)
+        writer.add(ContaPagar, dict(
+            base(conta_id), numero_nota_fiscal=str(rng.randint(1, 999_999)), data_emissao=emissao,
+            descricao_produtos='; '.join(rng.sample(produtos, rng.randint(1, 3))), valor_total=valor_total,
+            fornecedor_id=fornecedor_ids[_indice_concentrado(rng, fornecedores)],
+            faturado_id=rng.choice(faturado_ids),
+        ))
+        for numero, vencimento, valor, pagamento in _parcelas(rng, valor_total, emissao, hoje):
+            writer.add(ParcelaPagar, dict(
+                base(parcela_id, 0), numero_parcela=numero, data_vencimento=vencimento, valor=valor,
+                data_pagamento=pagamento, valor_pago=valor if pagamento else None, conta_pagar_id=conta_id,
+            ))
+            parcela_id += 1
+        for tipo_id in rng.sample(tipos_despesa, 1 if rng.random() < 0.9 else 2):
+            writer.add(ClassificacaoDespesa, dict(base(classificacao_id, 0), conta_pagar_id=conta_id,
+                                                  tipo_despesa_id=tipo_id))
+            classificacao_id += 1
+        conta_id += 1
+        if (n + 1) % 100_000 == 0:
+            log(f"contas a pagar: {n + 1} ({(n + 1) / (time.perf_counter() - start):.0f}/s)")
+    writer.flush()
+
+    # ---- Contas a receber ----
+    conta_id, parcela_id, classificacao_id = _next_id(ContaReceber), _next_id(ParcelaReceber), _next_id(ClassificacaoReceita)
+    for n in range(contas_receber):
+        emissao = hoje - timedelta(days=rng.randint(0, 3 * 365))
+        valor_total = _valor(rng)
+        writer.add(ContaReceber, dict(
+            base(conta_id), numero_documento=f"DOC-{conta_id:08d}", data_emissao=emissao,
+            descricao=rng.choice(TIPOS_RECEITA).capitalize(), valor_total=valor_total,
+            cliente_id=rng.choice(cliente_ids),
+        ))
+        for numero, vencimento, valor, recebimento in _parcelas(rng, valor_total, emissao, hoje):
+            writer.add(ParcelaReceber, dict(
+                base(parcela_id, 0), numero_parcela=numero, data_vencimento=vencimento, valor=valor,
+                data_recebimento=recebimento, valor_recebido=valor if recebimento else None,
+                conta_receber_id=conta_id,
+            ))
+            parcela_id += 1
+        writer.add(ClassificacaoReceita, dict(base(classificacao_id, 0), conta_receber_id=conta_id,
+                                              tipo_receita_id=rng.choice(tipos_receita)))
+        classificacao_id += 1
+        conta_id += 1
+    writer.flush()
+
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+    return writer.totais
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fornecedores', type=int, default=100_000)
+    parser.add_argument('--faturados', type=int, default=5_000)
+    parser.add_argument('--clientes', type=int, default=20_000)
+    parser.add_argument('--contas-pagar', type=int, default=1_000_000)
+    parser.add_argument('--contas-receber', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--lote', type=int, default=GENERATE_BATCH_SIZE, help='linhas por INSERT/transação')
+    args = parser.parse_args()
+
+    if min(args.fornecedores, args.faturados, args.clientes) < 1:
+        parser.error('--fornecedores, --faturados e --clientes devem ser maiores que zero')
+
+    with app.app_context():
+        from db_setup import init_db
+        init_db()
+        start = time.perf_counter()
+        totais = generate(args.fornecedores, args.faturados, args.clientes, args.contas_pagar,
+                          args.contas_receber, args.seed, args.lote)
+        elapsed = time.perf_counter() - start
+
+    for tabela, n in totais.items():
+        print(f"{tabela}: {n} linha(s)")
+    print(f"Concluído em {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
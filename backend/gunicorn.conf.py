@@ -0,0 +1,60 @@
+"""
+Configuração do gunicorn (servidor de produção).
+
+Todas as opções podem ser ajustadas por variáveis de ambiente; veja a seção
+"Produção" do README para o dimensionamento de workers e threads.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Processos: paralelismo real para CPU (PyPDF2, serialização JSON)
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2, 8)))
+
+# Threads por processo: cobrem a espera de I/O das chamadas de LLM.
+# Com GUNICORN_WORKER_CLASS=gevent (requer o pacote gevent) usa green threads.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+
+# Uploads aguardam o LLM, então o timeout precisa ser maior que o padrão (30s)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Reciclar workers periodicamente limita crescimento de memória
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Carregar a aplicação (e criar o banco) uma única vez no master, antes do fork
+preload_app = True
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """
+    Após o fork, cada worker descarta as conexões herdadas do master e
+    recria os clientes de LLM (os clientes HTTP não são seguros entre processos).
+    """
+    import sys
+    from app import app, db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # Worker só de CRUD (APP_MODE=crud) não tem rotas nem clientes de LLM
+    llm_routes = sys.modules.get('llm_routes')
+    if llm_routes:
+        llm_routes.init_llm_clients()
+    server.log.info(f"Worker {worker.pid} pronto")
+
+
+def worker_exit(server, worker):
+    """Fecha as conexões do pool ao encerrar o worker"""
+    from app import app, db
+
+    with app.app_context():
+        db.engine.dispose()
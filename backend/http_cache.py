@@ -0,0 +1,161 @@
+"""
+Cache HTTP condicional (ETag/Last-Modified) para endpoints de listagem.
+
+A versão de cada tabela é (COUNT(*), MAX(updated_at)), obtida em uma consulta
+barata e igual em todos os workers. Se o ETag enviado pelo cliente ainda é
+válido respondemos 304 sem executar a consulta principal. As respostas
+serializadas ficam em memória e são descartadas quando a tabela é alterada.
+
+Obs.: no MySQL updated_at tem resolução de segundos; duas alterações no mesmo
+segundo que não mudam a contagem de linhas resultam na mesma versão.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+from flask import request, make_response
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app import db
+
+MAX_ENTRIES = 256
+
+_cache = OrderedDict()  # chave -> dict(version, etag, body, mimetype, tables)
+_lock = threading.Lock()
+
+
+def _table_version(model):
+    count, last = db.session.query(func.count(model.id), func.max(model.updated_at)).one()
+    return count, last
+
+
+def _current_version(models):
+    parts, last_modified = [], None
+    for model in models:
+        count, last = _table_version(model)
+        table = model.__tablename__
+        parts.append(f"{table}:{count}:{last.isoformat() if last else '-'}")
+        if last and (last_modified is None or last > last_modified):
+            last_modified = last
+    return '|'.join(parts), last_modified
+
+
+def _not_modified(etag, last_modified):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+
+def _finish(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # O cliente pode guardar a resposta, mas deve revalidar a cada uso
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _store(key, entry):
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def invalidate(*tables):
+    """Descarta as respostas em cache que dependem das tabelas informadas"""
+    tables = set(tables)
+    with _lock:
+        for key in [k for k, v in _cache.items() if v['tables'] & tables]:
+            del _cache[key]
+
+
+def conditional_cache(*models):
+    """
+    Decorator para GETs de listagem que dependem apenas das tabelas informadas.
+    Sem modelos, a resposta é tratada como estática (ETag = hash do corpo).
+    """
+    tables = {m.__tablename__ for m in models}
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = f"{view.__name__}:{request.full_path}"
+
+            if models:
+                version, last_modified = _current_version(models)
+                if last_modified:
+                    last_modified = last_modified.replace(tzinfo=timezone.utc)
+                etag = hashlib.sha1(f"{key}|{version}".encode()).hexdigest()
+                # Só o ETag cobre a versão inteira (contagem e MAX(updated_at)): uma
+                # exclusão física não muda a data, então If-Modified-Since sozinho
+                # não basta para responder 304
+                if request.if_none_match.contains_weak(etag):
+                    return _not_modified(etag, last_modified)
+            else:
+                version, last_modified, etag = 'static', None, None
+
+            with _lock:
+                entry = _cache.get(key)
+            if entry and entry['version'] == version:
+                if request.if_none_match.contains_weak(entry['etag']):
+                    return _not_modified(entry['etag'], last_modified)
+                response = make_response(entry['body'])
+                response.mimetype = entry['mimetype']
+                return _finish(response, entry['etag'], last_modified)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            body = response.get_data()
+            if etag is None:
+                etag = hashlib.sha1(body).hexdigest()
+            _store(key, {
+                'version': version,
+                'etag': etag,
+                'body': body,
+                'mimetype': response.mimetype,
+                'tables': tables,
+            })
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(etag, last_modified)
+            return _finish(response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
+
+
+# ==================== INVALIDAÇÃO EM ESCRITAS ====================
+
+@event.listens_for(Session, 'after_flush')
+def _track_flushed_tables(session, flush_context):
+    changed = session.info.setdefault('http_cache_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            changed.add(table)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_statements(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper:
+        table = orm_execute_state.bind_mapper.local_table.name
+        orm_execute_state.session.info.setdefault('http_cache_tables', set()).add(table)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    changed = session.info.pop('http_cache_tables', None)
+    if changed:
+        invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('http_cache_tables', None)
@@ -0,0 +1,188 @@
+"""
+Idempotência dos endpoints de gravação de notas.
+
+A chave vem do header Idempotency-Key ou, na falta dele, da impressão digital
+da nota: (CNPJ normalizado, número, valor, data de emissão). Antes de executar
+a rota a chave é reservada em requisicoes_idempotentes (índice único), em uma
+transação própria. A primeira resposta de sucesso fica gravada e as repetições
+a recebem de volta sem passar pela gravação. Enquanto a primeira ainda está em
+andamento as repetições recebem 409. Sem o header a impressão digital vale
+para os dois endpoints de gravação; se a nota já foi salva pelo outro, a
+resposta é 409 com o conta_pagar_id existente (nunca o corpo do outro endpoint).
+
+- IDEMPOTENCY_TTL_HOURS: validade das chaves (default 24)
+- IDEMPOTENCY_LOCK_SECONDS: após esse tempo uma reserva sem resposta é
+  considerada abandonada (worker caiu) e pode ser retomada (default 120)
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+from flask import request, jsonify, make_response, Response
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import RequisicaoIdempotente
+from documentos import normalizar_documento
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '120'))
+
+PROCESSANDO = 'processando'
+CONCLUIDA = 'concluida'
+
+_table = RequisicaoIdempotente.__table__
+
+
+def fingerprint_nota(data):
+    """Impressão digital da nota: (CNPJ, número, valor, emissão) ou None se faltar algum campo"""
+    cnpj_key = normalizar_documento((data.get('fornecedor') or {}).get('cnpj'))
+    numero = str(data.get('numero_nota_fiscal') or '').strip()
+    data_emissao = data.get('data_emissao')
+    try:
+        valor = Decimal(str(data.get('valor_total'))).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+    if not (cnpj_key and numero and data_emissao):
+        return None
+    return f"nota:{cnpj_key}:{numero}:{valor}:{data_emissao}"
+
+
+def _sha256(value) -> str:
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return hashlib.sha256(value).hexdigest()
+
+
+def _replay(row):
+    response = Response(row.resposta, status=row.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _salva_em_outro_endpoint(row):
+    try:
+        corpo = json.loads(row.resposta or '{}')
+    except ValueError:
+        corpo = {}
+    conta_pagar_id = corpo.get('conta_pagar_id') or (corpo.get('ids') or {}).get('conta_pagar_id')
+    return jsonify({
+        'error': 'Esta nota já foi salva por outro endpoint',
+        'conta_pagar_id': conta_pagar_id,
+    }), 409
+
+
+def _claim(chave, corpo_hash):
+    """
+    Reserva a chave. Retorna None se a reserva é nossa ou a resposta a ser
+    devolvida (resposta gravada, 409 em andamento ou 422 payload diferente).
+    """
+    now = datetime.utcnow()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(_table).values(
+                chave=chave, endpoint=request.endpoint, corpo_hash=corpo_hash,
+                status=PROCESSANDO, created_at=now, updated_at=now, is_active=True,
+            ))
+        return None
+    except IntegrityError:
+        pass
+
+    with db.engine.begin() as conn:
+        row = conn.execute(select(_table).where(_table.c.chave == chave)).first()
+        if row is None:
+            # Removida entre o INSERT e o SELECT (falha da primeira tentativa)
+            return _claim(chave, corpo_hash)
+
+        expirada = row.created_at < now - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        abandonada = row.status == PROCESSANDO and row.updated_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+        if expirada or abandonada:
+            # Retomada com compare-and-set: só um dos concorrentes vence
+            result = conn.execute(
+                update(_table)
+                .where(_table.c.id == row.id, _table.c.updated_at == row.updated_at)
+                .values(status=PROCESSANDO, corpo_hash=corpo_hash, status_code=None, resposta=None,
+                        endpoint=request.endpoint, created_at=now, updated_at=now)
+            )
+            if result.rowcount == 1:
+                return None
+
+        elif row.corpo_hash and corpo_hash and row.corpo_hash != corpo_hash:
+            return jsonify({'error': 'Idempotency-Key já usada com outro conteúdo'}), 422
+
+        elif row.status == CONCLUIDA and row.endpoint != request.endpoint:
+            # Mesma nota já salva pelo outro endpoint: bloqueia a duplicata, mas
+            # não devolve o corpo dele (o formato da resposta é outro)
+            return _salva_em_outro_endpoint(row)
+
+        elif row.status == CONCLUIDA:
+            return _replay(row)
+
+    response = jsonify({'error': 'Esta nota já está sendo salva. Aguarde e tente novamente.'})
+    response.status_code = 409
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def _finish(chave, response):
+    with db.engine.begin() as conn:
+        if 200 <= response.status_code < 300:
+            conn.execute(
+                update(_table).where(_table.c.chave == chave)
+                .values(status=CONCLUIDA, status_code=response.status_code,
+                        resposta=response.get_data(as_text=True), updated_at=datetime.utcnow())
+            )
+        else:
+            # Erros não são memorizados: o usuário pode corrigir e tentar de novo
+            conn.execute(delete(_table).where(_table.c.chave == chave))
+
+
+def idempotent(fingerprint):
+    """
+    Decorator para POSTs de gravação. `fingerprint(json)` retorna a impressão
+    digital usada quando não há header Idempotency-Key (None desativa).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get('Idempotency-Key', '').strip()
+            if header:
+                chave = _sha256(f"{request.endpoint}:key:{header}")
+                corpo_hash = _sha256(request.get_data())
+            else:
+                digital = fingerprint(request.get_json(silent=True) or {})
+                if digital is None:
+                    return view(*args, **kwargs)
+                # A mesma nota é a mesma gravação em qualquer endpoint (save-invoice
+                # ou analyze-and-save): a chave não inclui a rota
+                chave = _sha256(f"nota:{digital}")
+                corpo_hash = None
+
+            early = _claim(chave, corpo_hash)
+            if early is not None:
+                return early
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                db.session.close()
+                _finish(chave, make_response('', 500))
+                raise
+            # Libera a conexão da sessão antes de gravar a resposta em outra
+            # (no SQLite sem WAL uma leitura aberta bloquearia a escrita)
+            db.session.close()
+            _finish(chave, response)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def purge_expired():
+    """Remove chaves expiradas (chamado na inicialização do banco)"""
+    limite = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    with db.engine.begin() as conn:
+        conn.execute(delete(_table).where(_table.c.created_at < limite))
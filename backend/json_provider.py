@@ -0,0 +1,54 @@
+"""
+Provedor JSON da aplicação.
+
+Usa orjson quando instalado (com fallback para o json da stdlib) e serializa
+Decimal, date e datetime nativamente, sem conversão linha a linha nas rotas.
+
+JSON_DECIMAL_MODE:
+- 'float' (padrão): valores monetários como número, compatível com a API atual;
+- 'string': valores exatos como string (ex.: "1234.50").
+"""
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+DECIMAL_AS_STRING = os.getenv('JSON_DECIMAL_MODE', 'float').lower() == 'string'
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj) if DECIMAL_AS_STRING else float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Objeto do tipo {type(obj).__name__} não é serializável em JSON")
+
+
+def dumps_bytes(obj) -> bytes:
+    """Serializa para bytes UTF-8 (caminho rápido usado nas respostas)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return dumps_bytes(obj).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype='application/json')
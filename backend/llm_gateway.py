@@ -0,0 +1,258 @@
+"""
+Camada assíncrona de acesso aos provedores de LLM (OpenAI e Gemini).
+
+Cada processo mantém um único event loop em uma thread de fundo. Todas as
+chamadas passam por ele e compartilham:
+- um limite global de chamadas simultâneas (LLM_MAX_CONCURRENCY, default 16);
+- clientes HTTP reutilizados entre chamadas (conexões keep-alive);
+- timeout por chamada (LLM_TIMEOUT, em segundos, default 60);
+- orçamento de RPM/TPM por provedor (ver llm_scheduler), com fila curta
+  quando o limite é atingido e prioridade para chamadas interativas;
+- opcionalmente, hedge das chamadas interativas lentas para o provedor
+  secundário (ver llm_hedge).
+
+As rotas Flask usam os wrappers síncronos (`run`, `complete_sync`); rotinas
+em lote disparam muitas chamadas de uma vez com `asyncio.gather` dentro do
+mesmo loop, sem criar threads.
+"""
+import asyncio
+import os
+import threading
+import time
+from llm_hedge import HedgeTracker, LLM_HEDGE_ENABLED
+from llm_scheduler import (
+    LLMScheduler, MAX_QUEUE_WAIT, PRIORITY_BATCH, PRIORITY_INTERACTIVE, current_priority, estimate_tokens,
+    rate_limit_retry_after,
+)
+
+
+class LLMProvider:
+    """Interface dos provedores. As instâncias vivem dentro do event loop."""
+    name = None
+
+    async def complete(self, prompt: str, max_tokens: int = 1000, temperature: float = 0.1,
+                       model: str = None) -> str:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIProvider(LLMProvider):
+    name = 'openai'
+    default_model = 'gpt-3.5-turbo-instruct'
+
+    def __init__(self):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY') or 'missing')
+
+    async def complete(self, prompt, max_tokens=1000, temperature=0.1, model=None):
+        if not os.getenv('OPENAI_API_KEY'):
+            raise Exception("OpenAI authentication error: api key não configurada (OPENAI_API_KEY)")
+        response = await self.client.completions.create(
+            model=model or self.default_model,
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return response.choices[0].text.strip()
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class GeminiProvider(LLMProvider):
+    name = 'gemini'
+    default_model = 'gemini-1.5-flash'
+
+    def __init__(self):
+        import google.generativeai as genai
+        self.genai = genai
+        self.api_key = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+        self._models = {}
+
+    async def complete(self, prompt, max_tokens=1000, temperature=0.1, model=None):
+        if not self.api_key:
+            raise Exception("Gemini não configurado (GOOGLE_API_KEY/GEMINI_API_KEY)")
+        name = model or os.getenv('GEMINI_MODEL_NAME') or self.default_model
+        if name not in self._models:
+            self._models[name] = self.genai.GenerativeModel(name)
+        response = await self._models[name].generate_content_async(prompt)
+        return response.text.strip()
+
+
+class FakeProvider(LLMProvider):
+    """Provedor local para benchmarks e testes: responde após `latency` segundos."""
+    name = 'fake'
+
+    def __init__(self, latency: float = 0.2, response: str = '{}'):
+        self.latency = latency
+        self.response = response
+
+    async def complete(self, prompt, max_tokens=1000, temperature=0.1, model=None):
+        await asyncio.sleep(self.latency)
+        return self.response(prompt) if callable(self.response) else self.response
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency: int = None, timeout: float = None):
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+        self.timeout = timeout or float(os.getenv('LLM_TIMEOUT', '60'))
+        self._factories = {}
+        self._providers = {}
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._semaphore = None
+        self._scheduler = None
+        self._hedge = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory):
+        """Registra um provedor; `factory` é chamada dentro do loop no primeiro uso."""
+        self._factories[name] = factory
+        self._providers.pop(name, None)
+
+    # ---------- event loop ----------
+
+    def _ensure_loop(self):
+        # Após um fork (workers do gunicorn) a thread do loop não existe no filho:
+        # recriamos loop, semáforo e clientes no novo processo.
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='llm-gateway', daemon=True)
+                thread.start()
+                self._providers = {}
+                self._semaphore = None
+                self._scheduler = None
+                self._hedge = None
+                self._in_flight = 0
+                self._loop, self._thread, self._pid = loop, thread, os.getpid()
+        return self._loop
+
+    def run(self, coro):
+        """Executa uma corrotina no loop do gateway e aguarda o resultado (uso síncrono)."""
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("LLMGateway.run() não pode ser chamado de dentro do loop do gateway")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def _provider(self, name):
+        if name not in self._providers:
+            if name not in self._factories:
+                raise ValueError(f"Provedor de LLM desconhecido: {name}")
+            self._providers[name] = self._factories[name]()
+        return self._providers[name]
+
+    # ---------- chamadas ----------
+
+    async def complete(self, provider: str, prompt: str, max_tokens: int = 1000,
+                       temperature: float = 0.1, model: str = None, timeout: float = None,
+                       priority: int = None, max_wait: float = None) -> str:
+        """
+        Chamada assíncrona respeitando o orçamento do provedor, o limite global
+        de concorrência e o timeout. Se o provedor responder 429 com um
+        Retry-After que caiba em `max_wait`, espera e tenta de novo; senão a
+        exceção sobe e o chamador pode usar o fallback.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._scheduler is None:
+            self._scheduler = LLMScheduler()
+        priority = current_priority.get() if priority is None else priority
+        max_wait = MAX_QUEUE_WAIT[priority] if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        tokens = estimate_tokens(prompt, max_tokens)
+
+        while True:
+            await self._scheduler.acquire(provider, tokens, priority, max(deadline - time.monotonic(), 0.0))
+            try:
+                async with self._semaphore:
+                    self._in_flight += 1
+                    try:
+                        return await asyncio.wait_for(
+                            self._provider(provider).complete(prompt, max_tokens=max_tokens,
+                                                              temperature=temperature, model=model),
+                            timeout or self.timeout
+                        )
+                    finally:
+                        self._in_flight -= 1
+            except Exception as e:
+                retry_after = rate_limit_retry_after(e)
+                if retry_after is None:
+                    raise
+                self._scheduler.penalize(provider, retry_after)
+                if time.monotonic() + retry_after > deadline:
+                    raise
+
+    def hedging(self) -> bool:
+        """Se a chamada atual deve usar hedge (LLM_HEDGE_ENABLED e prioridade interativa)"""
+        return LLM_HEDGE_ENABLED and current_priority.get() == PRIORITY_INTERACTIVE
+
+    async def hedge(self, primary: str, primary_call, secondary: str, secondary_call):
+        """
+        Executa `primary_call()` e, se demorar mais que o percentil configurado
+        da latência do primário, também `secondary_call()`; a primeira que
+        terminar sem exceção vence e a outra é cancelada (ver llm_hedge.py).
+        """
+        if self._hedge is None:
+            self._hedge = HedgeTracker()
+        return await self._hedge.run(primary, primary_call, secondary, secondary_call)
+
+    def complete_sync(self, provider: str, prompt: str, **kwargs) -> str:
+        return self.run(self.complete(provider, prompt, **kwargs))
+
+    def map(self, coroutine_fn, items):
+        """
+        Executa `coroutine_fn(item)` para todos os itens de uma vez no loop e
+        devolve os resultados na mesma ordem (exceções são retornadas, não lançadas).
+        """
+        async def _batch(item):
+            # Chamadas em lote cedem a vez às interativas na fila do provedor
+            current_priority.set(PRIORITY_BATCH)
+            return await coroutine_fn(item)
+
+        async def _all():
+            return await asyncio.gather(*(_batch(item) for item in items), return_exceptions=True)
+        return self.run(_all())
+
+    def stats(self) -> dict:
+        """Profundidade das filas, esperas e orçamento restante de cada provedor"""
+        async def _collect():
+            # Lido dentro do loop para não concorrer com as chamadas em andamento
+            return {
+                'pid': os.getpid(),
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'providers': self._scheduler.stats() if self._scheduler else {},
+                'hedge': self._hedge.stats() if self._hedge else {},
+            }
+        return self.run(_collect())
+
+    async def aclose(self):
+        for provider in list(self._providers.values()):
+            await provider.aclose()
+        self._providers = {}
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Gateway compartilhado do processo, com OpenAI e Gemini registrados."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                gateway = LLMGateway()
+                gateway.register('openai', OpenAIProvider)
+                gateway.register('gemini', GeminiProvider)
+                _gateway = gateway
+    return _gateway
@@ -0,0 +1,131 @@
+"""
+Requisições "hedged" entre provedores de LLM.
+
+Se o provedor primário não responder dentro de um atraso calculado a partir do
+percentil LLM_HEDGE_PERCENTILE das suas latências recentes, o mesmo prompt é
+enviado ao secundário. A primeira resposta válida vence e a outra chamada é
+cancelada; se uma falhar, a outra continua valendo. Só chamadas interativas
+(uploads) são duplicadas; rotinas em lote seguem o fallback normal.
+
+Variáveis de ambiente:
+- LLM_HEDGE_ENABLED: liga o modo (default false)
+- LLM_HEDGE_PERCENTILE: percentil da latência do primário usado como atraso (default 95)
+- LLM_HEDGE_MIN_DELAY / LLM_HEDGE_MAX_DELAY: limites do atraso em segundos (default 1 / 20)
+- LLM_HEDGE_DEFAULT_DELAY: atraso enquanto há menos de LLM_HEDGE_MIN_SAMPLES
+  latências (default 8s e 20 amostras)
+- LLM_HEDGE_WINDOW: latências recentes guardadas por provedor (default 200)
+
+As estatísticas (taxa de hedge, vitórias por provedor, atraso atual e
+percentis da latência) aparecem em `hedge` no GET /api/llm/stats.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '95'))
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '1'))
+LLM_HEDGE_MAX_DELAY = float(os.getenv('LLM_HEDGE_MAX_DELAY', '20'))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv('LLM_HEDGE_DEFAULT_DELAY', '8'))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+LLM_HEDGE_WINDOW = int(os.getenv('LLM_HEDGE_WINDOW', '200'))
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * pct / 100.0)) - 1))]
+
+
+class HedgeTracker:
+    """Latências do primário e contadores de hedge por par (primário, secundário)"""
+
+    def __init__(self):
+        self._latencies = {}
+        self._stats = {}
+
+    def _pair(self, primary, secondary):
+        key = f'{primary}->{secondary}'
+        if key not in self._stats:
+            self._stats[key] = {
+                'requests': 0, 'hedged': 0, 'fallbacks': 0, 'failed': 0,
+                'wins': {primary: 0, secondary: 0},
+                'hedged_wins': {primary: 0, secondary: 0},
+            }
+        return self._stats[key]
+
+    def delay(self, provider) -> float:
+        """Atraso antes de disparar o secundário, pelo percentil das latências recentes"""
+        samples = self._latencies.get(provider)
+        if not samples or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return min(max(_percentile(samples, LLM_HEDGE_PERCENTILE), LLM_HEDGE_MIN_DELAY), LLM_HEDGE_MAX_DELAY)
+
+    def observe(self, provider, seconds):
+        self._latencies.setdefault(provider, deque(maxlen=LLM_HEDGE_WINDOW)).append(seconds)
+
+    async def run(self, primary, primary_call, secondary, secondary_call):
+        """
+        Executa `primary_call()` e, se não terminar em `delay(primary)`, também
+        `secondary_call()`. As chamadas devem levantar exceção para respostas
+        inválidas (ex.: JSON que não parseia), para que a outra possa vencer.
+        """
+        stats = self._pair(primary, secondary)
+        stats['requests'] += 1
+        start = time.monotonic()
+        tasks = {asyncio.ensure_future(primary_call()): primary}
+        pending = set(tasks)
+        hedged = False
+        errors = {}
+        try:
+            while pending:
+                waiting_secondary = secondary in tasks.values()
+                timeout = None if waiting_secondary else max(self.delay(primary) - (time.monotonic() - start), 0.0)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks[task]
+                    if task.exception() is None:
+                        if provider == primary:
+                            self.observe(primary, time.monotonic() - start)
+                        stats['wins'][provider] += 1
+                        if hedged:
+                            stats['hedged_wins'][provider] += 1
+                        return task.result()
+                    errors[provider] = task.exception()
+                if not waiting_secondary:
+                    if done:
+                        # Primário falhou antes do atraso: fallback imediato, como sem hedge
+                        stats['fallbacks'] += 1
+                    else:
+                        hedged = True
+                        stats['hedged'] += 1
+                    task = asyncio.ensure_future(secondary_call())
+                    tasks[task] = secondary
+                    pending.add(task)
+            stats['failed'] += 1
+            # O erro do secundário é o do último recurso (como no fallback sem hedge)
+            raise errors.get(secondary) or errors[primary]
+        finally:
+            for task in pending:
+                if tasks[task] == primary:
+                    # Amostra censurada: o primário levou pelo menos esse tempo
+                    self.observe(primary, time.monotonic() - start)
+                task.cancel()
+
+    def stats(self) -> dict:
+        result = {}
+        for key, stats in self._stats.items():
+            primary = key.split('->')[0]
+            samples = self._latencies.get(primary) or ()
+            result[key] = dict(
+                stats,
+                wins=dict(stats['wins']),
+                hedged_wins=dict(stats['hedged_wins']),
+                hedge_rate=round(stats['hedged'] / stats['requests'], 3) if stats['requests'] else 0.0,
+                delay_ms=round(self.delay(primary) * 1000, 1),
+                samples=len(samples),
+                p50_ms=round(_percentile(samples, 50) * 1000, 1) if samples else None,
+                p95_ms=round(_percentile(samples, 95) * 1000, 1) if samples else None,
+                p99_ms=round(_percentile(samples, 99) * 1000, 1) if samples else None,
+            )
+        return result
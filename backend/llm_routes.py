@@ -0,0 +1,88 @@
+"""
+Rotas que usam o LLM (upload e extração de PDF, estatísticas do gateway).
+
+Ficam fora de routes.py para que um worker só de CRUD (APP_MODE=crud, ver
+run.py) não as registre: os SDKs do OpenAI/Gemini e o PyPDF2 são importados
+apenas no primeiro uso, então esse worker nunca os carrega.
+"""
+from flask import request, jsonify
+from app import app
+from pdf_processor import PDFProcessor
+from llm_gateway import get_gateway
+from expense_history import get_expense_history
+from uploads import spool_request_body
+from werkzeug.exceptions import RequestEntityTooLarge
+
+pdf_processor = None
+
+def init_llm_clients():
+    """
+    Descarta os clientes de LLM; são recriados no primeiro uso. Chamado em
+    cada worker do gunicorn após o fork (ver gunicorn.conf.py).
+    """
+    global pdf_processor
+    pdf_processor = None
+
+def get_pdf_processor() -> PDFProcessor:
+    global pdf_processor
+    if pdf_processor is None:
+        pdf_processor = PDFProcessor()
+    return pdf_processor
+
+def preload_llm_stack():
+    """
+    Importa os SDKs de LLM e o PyPDF2 antes do fork (LLM_PRELOAD=true), para
+    que o primeiro upload de cada worker não pague a importação.
+    """
+    import openai  # noqa: F401
+    import google.generativeai  # noqa: F401
+    import PyPDF2  # noqa: F401
+
+@app.route('/api/upload-pdf', methods=['POST'])
+def upload_pdf():
+    """
+    Endpoint para upload e processamento de PDF. Aceita multipart (campo `file`)
+    ou o PDF direto no corpo com Content-Type application/pdf. O arquivo é
+    gravado em disco em blocos (ver uploads.py) e lido via mmap. PDFs com várias
+    DANFEs retornam {total, notas, erros}, uma entrada por nota.
+    """
+    try:
+        if request.mimetype == 'application/pdf':
+            upload = spool_request_body(request)
+        else:
+            if 'file' not in request.files:
+                return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+            
+            file = request.files['file']
+            
+            if file.filename == '':
+                return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+            
+            if not file.filename.lower().endswith('.pdf'):
+                return jsonify({'error': 'Apenas arquivos PDF são aceitos'}), 400
+            
+            upload = file.stream
+        
+        # Processar o PDF
+        with upload:
+            result = get_pdf_processor().process_pdf(upload)
+        
+        if not result['success']:
+            return jsonify({'error': result['error']}), 500
+        
+        result['data']['arquivo_sha256'] = upload.sha256
+        result['data']['arquivo_bytes'] = upload.size
+        return jsonify(result['data']), 200
+        
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    """
+    Filas e orçamento de rate limit dos provedores de LLM e tamanho do índice
+    do histórico de classificações (por processo/worker)
+    """
+    return jsonify(dict(get_gateway().stats(), historico=get_expense_history().stats())), 200
@@ -0,0 +1,244 @@
+"""
+Agendador de chamadas de LLM com orçamento por provedor (token buckets).
+
+Para cada provedor controlamos requisições por minuto (RPM) e tokens por
+minuto (TPM), e respeitamos o Retry-After devolvido em erros 429. Quando o
+orçamento está esgotado a chamada espera na fila, desde que a espera estimada
+caiba em `max_wait`; caso contrário falha na hora com RateLimitQueueTimeout,
+e o chamador usa o provedor de fallback.
+
+Uploads interativos têm prioridade sobre trabalho em lote na fila.
+
+Variáveis de ambiente (0 = sem limite):
+- LLM_<PROVEDOR>_RPM / LLM_<PROVEDOR>_TPM (ex.: LLM_OPENAI_RPM)
+- LLM_MAX_QUEUE_WAIT: espera máxima de chamadas interativas (default 2s)
+- LLM_BATCH_MAX_QUEUE_WAIT: espera máxima de chamadas em lote (default 60s)
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BATCH: 'batch'}
+
+# Prioridade das chamadas feitas no contexto atual (ver LLMGateway.map)
+current_priority = contextvars.ContextVar('llm_priority', default=PRIORITY_INTERACTIVE)
+
+DEFAULT_LIMITS = {
+    'openai': (3500, 90000),
+    'gemini': (1000, 1000000),
+}
+
+MAX_QUEUE_WAIT = {
+    PRIORITY_INTERACTIVE: float(os.getenv('LLM_MAX_QUEUE_WAIT', '2')),
+    PRIORITY_BATCH: float(os.getenv('LLM_BATCH_MAX_QUEUE_WAIT', '60')),
+}
+
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class RateLimitQueueTimeout(Exception):
+    """A espera estimada na fila do provedor excede o limite permitido."""
+
+    def __init__(self, provider, wait):
+        super().__init__(f"{provider} rate limit: espera estimada de {wait:.1f}s excede o limite da fila")
+        self.provider = provider
+        self.wait = wait
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.capacity <= 0
+
+    def refill(self, now):
+        if self.unlimited:
+            return
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Segundos até haver `amount` disponível (0 se já houver)"""
+        if self.unlimited:
+            return 0.0
+        self.refill(now)
+        # Pedidos maiores que a capacidade esperam o balde encher
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount, now):
+        if self.unlimited:
+            return
+        self.refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class _ProviderState:
+    def __init__(self, name):
+        rpm, tpm = DEFAULT_LIMITS.get(name, (0, 0))
+        prefix = f"LLM_{name.upper()}_"
+        self.requests = TokenBucket(float(os.getenv(prefix + 'RPM', rpm)))
+        self.tokens = TokenBucket(float(os.getenv(prefix + 'TPM', tpm)))
+        self.blocked_until = 0.0
+        self.queue = []  # heap de [prioridade, seq, tokens]
+        self.condition = asyncio.Condition()
+        self.stats = {
+            'acquired': 0,
+            'rejected': 0,
+            'rate_limited': 0,
+            'total_wait_s': 0.0,
+            'max_wait_s': 0.0,
+        }
+        self.recent_waits = deque(maxlen=500)
+
+    def wait_time(self, tokens, now, ahead_requests=0, ahead_tokens=0):
+        return max(
+            self.blocked_until - now,
+            self.requests.wait_time(ahead_requests + 1, now),
+            self.tokens.wait_time(ahead_tokens + tokens, now),
+            0.0,
+        )
+
+
+class LLMScheduler:
+    def __init__(self):
+        self._states = {}
+        self._seq = itertools.count()
+
+    def _state(self, provider):
+        if provider not in self._states:
+            self._states[provider] = _ProviderState(provider)
+        return self._states[provider]
+
+    async def acquire(self, provider: str, tokens: int, priority: int = None, max_wait: float = None) -> float:
+        """
+        Reserva orçamento para uma chamada. Retorna o tempo esperado na fila
+        ou lança RateLimitQueueTimeout se a espera estimada passar de max_wait.
+        """
+        state = self._state(provider)
+        priority = current_priority.get() if priority is None else priority
+        max_wait = MAX_QUEUE_WAIT[priority] if max_wait is None else max_wait
+        now = time.monotonic()
+
+        # Estimativa considerando quem está à frente na fila
+        ahead = [e for e in state.queue if e[0] <= priority]
+        estimate = state.wait_time(tokens, now, len(ahead), sum(e[2] for e in ahead))
+        if estimate > max_wait:
+            state.stats['rejected'] += 1
+            raise RateLimitQueueTimeout(provider, estimate)
+
+        entry = [priority, next(self._seq), tokens]
+        start = now
+        async with state.condition:
+            heapq.heappush(state.queue, entry)
+            state.condition.notify_all()
+            try:
+                while True:
+                    timeout = None
+                    if state.queue[0] is entry:
+                        now = time.monotonic()
+                        timeout = state.wait_time(tokens, now)
+                        if timeout <= 0:
+                            heapq.heappop(state.queue)
+                            state.requests.consume(1, now)
+                            state.tokens.consume(tokens, now)
+                            break
+                    try:
+                        await asyncio.wait_for(state.condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in state.queue:
+                    state.queue.remove(entry)
+                    heapq.heapify(state.queue)
+                raise
+            finally:
+                state.condition.notify_all()
+
+        waited = time.monotonic() - start
+        state.stats['acquired'] += 1
+        state.stats['total_wait_s'] += waited
+        state.stats['max_wait_s'] = max(state.stats['max_wait_s'], waited)
+        state.recent_waits.append(waited)
+        return waited
+
+    def penalize(self, provider: str, retry_after: float):
+        """Bloqueia o provedor por `retry_after` segundos (resposta 429)"""
+        state = self._state(provider)
+        state.blocked_until = max(state.blocked_until, time.monotonic() + retry_after)
+        state.stats['rate_limited'] += 1
+        # Esvaziar o balde evita rajadas logo após o fim do bloqueio
+        state.requests.level = 0.0
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        result = {}
+        for name, state in self._states.items():
+            waits = sorted(state.recent_waits)
+            depth = {label: 0 for label in PRIORITY_NAMES.values()}
+            for entry in state.queue:
+                depth[PRIORITY_NAMES[entry[0]]] += 1
+            acquired = state.stats['acquired']
+            result[name] = {
+                'queue_depth': depth,
+                'blocked_for_s': round(max(0.0, state.blocked_until - now), 3),
+                'budget': {
+                    'rpm': state.requests.capacity or None,
+                    'tpm': state.tokens.capacity or None,
+                    'requests_available': None if state.requests.unlimited else round(state.requests.level, 1),
+                    'tokens_available': None if state.tokens.unlimited else round(state.tokens.level),
+                },
+                'acquired': acquired,
+                'rejected': state.stats['rejected'],
+                'rate_limited': state.stats['rate_limited'],
+                'avg_wait_ms': round(state.stats['total_wait_s'] / acquired * 1000, 1) if acquired else 0.0,
+                'p95_wait_ms': round(waits[int(len(waits) * 0.95) - 1] * 1000, 1) if waits else 0.0,
+                'max_wait_ms': round(state.stats['max_wait_s'] * 1000, 1),
+            }
+        return result
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Estimativa barata de tokens (≈ 4 caracteres por token) + tokens de saída"""
+    return len(prompt) // 4 + max_tokens
+
+
+def rate_limit_retry_after(error):
+    """
+    Se o erro for de rate limit (HTTP 429), retorna os segundos a aguardar
+    (Retry-After / retry-after-ms); caso contrário retorna None.
+    """
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    message = str(error).lower()
+    if status != 429 and 'rate limit' not in message and 'resource_exhausted' not in message:
+        return None
+    # Cota esgotada (insufficient_quota) também vem como 429, mas esperar não resolve
+    if isinstance(error, RateLimitQueueTimeout) or 'quota' in message:
+        return None
+
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return DEFAULT_RETRY_AFTER
@@ -0,0 +1,323 @@
+"""
+Teste de carga dos endpoints de routes.py, crud_routes.py e search_routes.py.
+
+Vários processos (como os workers do gunicorn), cada um com várias threads,
+sorteiam requisições de CENARIOS conforme o peso, durante --duration segundos,
+e o resultado é agregado por endpoint (latência p50/p90/p99/máx e erros).
+Por padrão as requisições passam pelo cliente de teste do Flask contra o banco
+configurado (SQLite em SQLITE_PATH); com --url, vão por HTTP a um servidor já
+em execução. Popule o banco antes com generate_data.py. O teste grava no banco
+(notas, cadastros, inativações): use uma cópia.
+
+    python generate_data.py --fornecedores 10000 --contas-pagar 100000
+    python load_test.py --processes 2 --threads 8 --duration 30
+    python load_test.py --endpoints "GET /api/busca?tipo=fornecedor,POST /api/save-invoice"
+    python load_test.py --url http://localhost:5000 --threads 16
+
+Sai com código 1 se algum endpoint tiver erro (status >= 400).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import quote, urlsplit
+
+# nome -> peso. Peso 0: fora da mistura padrão (use --endpoints para incluir).
+# As listagens completas de contas, fornecedores e clientes retornam todas as
+# linhas e são proibitivas com o volume do generate_data.py (mediriam a
+# serialização de um único payload enorme); a leitura de cadastros na mistura
+# padrão é a busca paginada.
+PESOS = {
+    'GET /api/health': 1,
+    'GET /api/expense-categories': 3,
+    'GET /api/fornecedores': 0,
+    'GET /api/clientes': 0,
+    'GET /api/busca?tipo=fornecedor': 3,
+    'GET /api/busca?tipo=cliente': 3,
+    'GET /api/tipos-despesa': 3,
+    'GET /api/tipos-receita': 2,
+    'GET /api/contas-pagar': 0,
+    'GET /api/contas-receber': 0,
+    'POST /api/save-invoice': 10,
+    'POST /api/analyze-and-save': 5,
+    'POST /api/fornecedores': 2,
+    'PUT /api/fornecedores/<id>': 2,
+    'PATCH /api/fornecedores/<id>/inativar': 1,
+    'PATCH /api/fornecedores/<id>/reativar': 1,
+    'POST /api/clientes': 2,
+    'PUT /api/clientes/<id>': 2,
+    'POST /api/contas-receber': 4,
+    'PATCH /api/contas-pagar/<id>/inativar': 1,
+    'PATCH /api/contas-pagar/<id>/reativar': 1,
+    'POST /api/contas-pagar/<id>/parcelas': 3,
+    'POST /api/contas-pagar/<id>/classificacoes': 2,
+}
+
+
+class _Context:
+    """Faixas de ids existentes e geradores de documentos únicos da thread"""
+
+    def __init__(self, limites, rng):
+        self.limites = limites
+        self.rng = rng
+
+    def id(self, tabela):
+        return self.rng.randint(1, max(self.limites[tabela], 1))
+
+    def termo(self, *listas):
+        """Palavra das listas de nomes do generate_data.py, para as buscas"""
+        import generate_data
+        return quote(self.rng.choice(getattr(generate_data, self.rng.choice(listas))))
+
+    def cnpj_novo(self):
+        from generate_data import CNPJ_LOAD_TEST, cnpj_sintetico
+        return cnpj_sintetico(CNPJ_LOAD_TEST + self.rng.randrange(29_000_000))
+
+    def cpf_novo(self):
+        from generate_data import cpf_sintetico
+        return cpf_sintetico(700_000_000 + self.rng.randrange(299_000_000))
+
+    def cnpj_existente(self):
+        from generate_data import CNPJ_FORNECEDOR, cnpj_sintetico
+        return cnpj_sintetico(CNPJ_FORNECEDOR + self.id('fornecedores'))
+
+    def data(self, dias=0):
+        return (date.today() + timedelta(days=dias)).isoformat()
+
+
+def _nota(ctx):
+    rng = ctx.rng
+    valor = round(rng.uniform(50, 50_000), 2)
+    return {
+        'fornecedor': {
+            'razao_social': 'Fornecedor Carga LTDA',
+            'fantasia': None,
+            'cnpj': ctx.cnpj_existente() if rng.random() < 0.7 else ctx.cnpj_novo(),
+        },
+        'faturado': {'nome_completo': 'Faturado Carga', 'cpf': ctx.cpf_novo()},
+        'classificacao_despesa': rng.choice(['MANUTENÇÃO E OPERAÇÃO', 'INSUMOS AGRÍCOLAS', 'ADMINISTRATIVAS']),
+        'numero_nota_fiscal': str(rng.randrange(10 ** 9)),
+        'data_emissao': ctx.data(),
+        'descricao_produtos': 'Óleo diesel, filtros e correias',
+        'valor_total': valor,
+        'data_vencimento': ctx.data(30),
+    }
+
+
+# nome -> função(ctx) que retorna (método, caminho, corpo json ou None)
+CENARIOS = {
+    'GET /api/health': lambda ctx: ('GET', '/api/health', None),
+    'GET /api/expense-categories': lambda ctx: ('GET', '/api/expense-categories', None),
+    'GET /api/fornecedores': lambda ctx: ('GET', '/api/fornecedores', None),
+    'GET /api/clientes': lambda ctx: ('GET', '/api/clientes', None),
+    'GET /api/busca?tipo=fornecedor': lambda ctx: (
+        'GET', f"/api/busca?tipo=fornecedor&q={ctx.termo('NOMES', 'RAMOS')}&per_page=20", None),
+    'GET /api/busca?tipo=cliente': lambda ctx: (
+        'GET', f"/api/busca?tipo=cliente&q={ctx.termo('SOBRENOMES')}&per_page=20", None),
+    'GET /api/tipos-despesa': lambda ctx: ('GET', '/api/tipos-despesa', None),
+    'GET /api/tipos-receita': lambda ctx: ('GET', '/api/tipos-receita', None),
+    'GET /api/contas-pagar': lambda ctx: ('GET', '/api/contas-pagar', None),
+    'GET /api/contas-receber': lambda ctx: ('GET', '/api/contas-receber', None),
+    'POST /api/save-invoice': lambda ctx: ('POST', '/api/save-invoice', _nota(ctx)),
+    'POST /api/analyze-and-save': lambda ctx: ('POST', '/api/analyze-and-save', _nota(ctx)),
+    'POST /api/fornecedores': lambda ctx: ('POST', '/api/fornecedores', {
+        'razao_social': 'Novo Fornecedor LTDA', 'fantasia': 'Novo', 'cnpj': ctx.cnpj_novo()}),
+    'PUT /api/fornecedores/<id>': lambda ctx: (
+        'PUT', f"/api/fornecedores/{ctx.id('fornecedores')}", {'fantasia': f"Fantasia {ctx.rng.randrange(1000)}"}),
+    'PATCH /api/fornecedores/<id>/inativar': lambda ctx: (
+        'PATCH', f"/api/fornecedores/{ctx.id('fornecedores')}/inativar", None),
+    'PATCH /api/fornecedores/<id>/reativar': lambda ctx: (
+        'PATCH', f"/api/fornecedores/{ctx.id('fornecedores')}/reativar", None),
+    'POST /api/clientes': lambda ctx: ('POST', '/api/clientes', {
+        'nome_completo': 'Cliente Carga', 'cpf': ctx.cpf_novo()}),
+    'PUT /api/clientes/<id>': lambda ctx: (
+        'PUT', f"/api/clientes/{ctx.id('clientes')}", {'nome_completo': f"Cliente {ctx.rng.randrange(1000)}"}),
+    'POST /api/contas-receber': lambda ctx: ('POST', '/api/contas-receber', {
+        'numero_documento': f"LT-{ctx.rng.randrange(10 ** 9)}", 'data_emissao': ctx.data(),
+        'descricao': 'Venda de grãos', 'valor_total': round(ctx.rng.uniform(100, 90_000), 2),
+        'cliente_id': ctx.id('clientes')}),
+    'PATCH /api/contas-pagar/<id>/inativar': lambda ctx: (
+        'PATCH', f"/api/contas-pagar/{ctx.id('contas_pagar')}/inativar", None),
+    'PATCH /api/contas-pagar/<id>/reativar': lambda ctx: (
+        'PATCH', f"/api/contas-pagar/{ctx.id('contas_pagar')}/reativar", None),
+    'POST /api/contas-pagar/<id>/parcelas': lambda ctx: (
+        'POST', f"/api/contas-pagar/{ctx.id('contas_pagar')}/parcelas", {
+            'numero_parcela': ctx.rng.randint(2, 12), 'data_vencimento': ctx.data(60), 'valor': 100.0}),
+    'POST /api/contas-pagar/<id>/classificacoes': lambda ctx: (
+        'POST', f"/api/contas-pagar/{ctx.id('contas_pagar')}/classificacoes", {'tipos': ['ADMINISTRATIVAS']}),
+}
+
+
+class _HttpClient:
+    """Cliente HTTP mínimo com keep-alive (uma conexão por thread)"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+
+    def request(self, method, path, body):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except Exception:
+            # Conexão descartada; a próxima requisição reconecta
+            self.conn.close()
+            self.conn = None
+            raise
+
+
+class _FlaskClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+def _limites(app):
+    from sqlalchemy import text
+    from app import db
+    with app.app_context():
+        return {
+            tabela: db.session.execute(text(f"SELECT coalesce(max(id), 0) FROM {tabela}")).scalar()
+            for tabela in ('fornecedores', 'clientes', 'contas_pagar')
+        }
+
+
+def run_worker(worker_id, args):
+    """Executa a carga no processo atual e imprime o resultado em JSON"""
+    if args.url:
+        make_client = lambda: _HttpClient(args.url)
+        limites = json.loads(args.limites)
+    else:
+        os.environ.setdefault('OPENAI_API_KEY', 'load-test')
+        import run  # noqa: F401  (registra as rotas)
+        from app import app
+        make_client = lambda: _FlaskClient(app)
+        limites = _limites(app)
+
+    nomes = args.endpoints.split(',')
+    pesos = [PESOS[n] or 1 for n in nomes]
+    resultados = {n: {'latencias': [], 'status': {}, 'exemplo_erro': None} for n in nomes}
+    lock = threading.Lock()
+
+    def worker(thread_id):
+        ctx = _Context(limites, random.Random(args.seed * 1_000_003 + worker_id * 1000 + thread_id))
+        client = make_client()
+        time.sleep(max(args.start_at - time.time(), 0))
+        fim = args.start_at + args.duration
+        while time.time() < fim:
+            nome = ctx.rng.choices(nomes, weights=pesos)[0]
+            method, path, body = CENARIOS[nome](ctx)
+            start = time.perf_counter()
+            try:
+                status, data = client.request(method, path, body)
+            except Exception as e:  # falha de conexão/timeout conta como erro
+                status, data = 0, str(e).encode()
+            elapsed = time.perf_counter() - start
+            with lock:
+                r = resultados[nome]
+                r['latencias'].append(elapsed)
+                r['status'][str(status)] = r['status'].get(str(status), 0) + 1
+                if (status == 0 or status >= 400) and r['exemplo_erro'] is None:
+                    r['exemplo_erro'] = f"{status}: {data[:200].decode('utf-8', 'replace')}"
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    print(json.dumps(resultados))
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8, help='threads por processo')
+    parser.add_argument('--duration', type=float, default=30, help='segundos de carga')
+    parser.add_argument('--endpoints', default=','.join(n for n, p in PESOS.items() if p),
+                        help='nomes de CENARIOS separados por vírgula')
+    parser.add_argument('--url', help='servidor em execução (ex.: http://localhost:5000)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--limites', default='{}', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    desconhecidos = [n for n in args.endpoints.split(',') if n not in CENARIOS]
+    if desconhecidos:
+        parser.error(f"Endpoints desconhecidos: {', '.join(desconhecidos)}")
+
+    if args.worker is not None:
+        run_worker(args.worker, args)
+        return
+
+    env = dict(os.environ)
+    if not args.url:
+        # Só as rotas de CRUD: os workers não precisam carregar o LLM
+        env.setdefault('APP_MODE', 'crud')
+        env.setdefault('OPENAI_API_KEY', 'load-test')
+        subprocess.run([sys.executable, '-c', 'import run; from app import app; from db_setup import init_db\n'
+                        'with app.app_context(): init_db()'], env=env, check=True)
+        limites = '{}'
+    else:
+        # Sem acesso ao banco: ids sorteados entre 1 e 1000
+        limites = json.dumps({'fornecedores': 1000, 'clientes': 1000, 'contas_pagar': 1000})
+
+    # Margem para todos os processos importarem a aplicação antes da largada
+    start_at = time.time() + 3
+    command = [sys.executable, __file__, '--threads', str(args.threads), '--duration', str(args.duration),
+               '--endpoints', args.endpoints, '--seed', str(args.seed), '--start-at', str(start_at),
+               '--limites', limites] + (['--url', args.url] if args.url else [])
+    procs = [subprocess.Popen(command + ['--worker', str(w)], env=env, stdout=subprocess.PIPE, text=True)
+             for w in range(args.processes)]
+    parciais = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+
+    print(f"{args.processes} processo(s) x {args.threads} threads, {args.duration:.0f}s"
+          f"{' contra ' + args.url if args.url else ' (cliente de teste do Flask)'}\n")
+    print(f"{'endpoint':46s} {'n':>7s} {'req/s':>7s} {'erros':>6s} {'p50 ms':>8s} {'p90 ms':>8s} "
+          f"{'p99 ms':>8s} {'máx ms':>8s}")
+    total_erros = 0
+    exemplos = []
+    for nome in args.endpoints.split(','):
+        latencias = sorted(l for r in parciais for l in r[nome]['latencias'])
+        status = {}
+        for r in parciais:
+            for codigo, n in r[nome]['status'].items():
+                status[codigo] = status.get(codigo, 0) + n
+        erros = sum(n for codigo, n in status.items() if codigo == '0' or int(codigo) >= 400)
+        total_erros += erros
+        exemplo = next((r[nome]['exemplo_erro'] for r in parciais if r[nome]['exemplo_erro']), None)
+        if exemplo:
+            exemplos.append(f"  {nome}: {exemplo}")
+        print(f"{nome:46s} {len(latencias):7d} {len(latencias) / args.duration:7.1f} {erros:6d} "
+              f"{_percentil(latencias, 0.50) * 1000:8.1f} {_percentil(latencias, 0.90) * 1000:8.1f} "
+              f"{_percentil(latencias, 0.99) * 1000:8.1f} {(latencias[-1] if latencias else 0) * 1000:8.1f}")
+
+    if exemplos:
+        print("\nExemplos de erro:")
+        print('\n'.join(exemplos))
+    sys.exit(1 if total_erros else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from app import db
 from datetime import datetime
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
+from documentos import normalizar_documento
 
 class BaseModel(db.Model):
     __abstract__ = True
@@ -16,29 +17,53 @@ class Fornecedor(BaseModel):
     razao_social = db.Column(db.String(255), nullable=False)
     fantasia = db.Column(db.String(255))
     cnpj = db.Column(db.String(18), unique=True, nullable=False)
+    cnpj_key = db.Column(db.String(18), unique=True, index=True)  # apenas dígitos
     
     # Relacionamentos
     contas_pagar = relationship("ContaPagar", back_populates="fornecedor")
 
+    @validates('cnpj')
+    def _normalizar_cnpj(self, key, value):
+        self.cnpj_key = normalizar_documento(value)
+        return value
+
 class Cliente(BaseModel):
     __tablename__ = 'clientes'
     
     nome_completo = db.Column(db.String(255), nullable=False)
     cpf = db.Column(db.String(14), unique=True)
     cnpj = db.Column(db.String(18), unique=True)
+    cpf_key = db.Column(db.String(14), unique=True, index=True)  # apenas dígitos
+    cnpj_key = db.Column(db.String(18), unique=True, index=True)  # apenas dígitos
     
     # Relacionamentos
     contas_receber = relationship("ContaReceber", back_populates="cliente")
 
+    @validates('cpf')
+    def _normalizar_cpf(self, key, value):
+        self.cpf_key = normalizar_documento(value)
+        return value
+
+    @validates('cnpj')
+    def _normalizar_cnpj(self, key, value):
+        self.cnpj_key = normalizar_documento(value)
+        return value
+
 class Faturado(BaseModel):
     __tablename__ = 'faturados'
     
     nome_completo = db.Column(db.String(255), nullable=False)
     cpf = db.Column(db.String(14), unique=True, nullable=False)
+    cpf_key = db.Column(db.String(14), unique=True, index=True)  # apenas dígitos
     
     # Relacionamentos
     contas_pagar = relationship("ContaPagar", back_populates="faturado")
 
+    @validates('cpf')
+    def _normalizar_cpf(self, key, value):
+        self.cpf_key = normalizar_documento(value)
+        return value
+
 class TipoReceita(BaseModel):
     __tablename__ = 'tipos_receita'
     
@@ -53,6 +78,9 @@ class TipoDespesa(BaseModel):
 
 class ContaPagar(BaseModel):
     __tablename__ = 'contas_pagar'
+    __table_args__ = (
+        db.Index('ix_contas_pagar_updated_at', 'updated_at'),
+    )
     
     numero_nota_fiscal = db.Column(db.String(50), nullable=False)
     data_emissao = db.Column(db.Date, nullable=False)
@@ -71,6 +99,9 @@ class ContaPagar(BaseModel):
 
 class ContaReceber(BaseModel):
     __tablename__ = 'contas_receber'
+    __table_args__ = (
+        db.Index('ix_contas_receber_updated_at', 'updated_at'),
+    )
     
     numero_documento = db.Column(db.String(50), nullable=False)
     data_emissao = db.Column(db.Date, nullable=False)
@@ -87,6 +118,11 @@ class ContaReceber(BaseModel):
 
 class ParcelaPagar(BaseModel):
     __tablename__ = 'parcelas_pagar'
+    __table_args__ = (
+        # Parcelas em aberto (data_pagamento nula) por vencimento
+        db.Index('ix_parcelas_pagar_abertas', 'data_pagamento', 'data_vencimento'),
+        db.Index('ix_parcelas_pagar_updated_at', 'updated_at'),
+    )
     
     numero_parcela = db.Column(db.Integer, nullable=False)
     data_vencimento = db.Column(db.Date, nullable=False)
@@ -95,13 +131,18 @@ class ParcelaPagar(BaseModel):
     valor_pago = db.Column(db.Numeric(10, 2))
     
     # Chaves estrangeiras
-    conta_pagar_id = db.Column(db.Integer, db.ForeignKey('contas_pagar.id'), nullable=False)
+    conta_pagar_id = db.Column(db.Integer, db.ForeignKey('contas_pagar.id'), nullable=False, index=True)
     
     # Relacionamentos
     conta_pagar = relationship("ContaPagar", back_populates="parcelas")
 
 class ParcelaReceber(BaseModel):
     __tablename__ = 'parcelas_receber'
+    __table_args__ = (
+        # Parcelas em aberto (data_recebimento nula) por vencimento
+        db.Index('ix_parcelas_receber_abertas', 'data_recebimento', 'data_vencimento'),
+        db.Index('ix_parcelas_receber_updated_at', 'updated_at'),
+    )
     
     numero_parcela = db.Column(db.Integer, nullable=False)
     data_vencimento = db.Column(db.Date, nullable=False)
@@ -110,7 +151,7 @@ class ParcelaReceber(BaseModel):
     valor_recebido = db.Column(db.Numeric(10, 2))
     
     # Chaves estrangeiras
-    conta_receber_id = db.Column(db.Integer, db.ForeignKey('contas_receber.id'), nullable=False)
+    conta_receber_id = db.Column(db.Integer, db.ForeignKey('contas_receber.id'), nullable=False, index=True)
     
     # Relacionamentos
     conta_receber = relationship("ContaReceber", back_populates="parcelas")
@@ -119,7 +160,7 @@ class ClassificacaoDespesa(BaseModel):
     __tablename__ = 'classificacoes_despesa'
     
     # Chaves estrangeiras
-    conta_pagar_id = db.Column(db.Integer, db.ForeignKey('contas_pagar.id'), nullable=False)
+    conta_pagar_id = db.Column(db.Integer, db.ForeignKey('contas_pagar.id'), nullable=False, index=True)
     tipo_despesa_id = db.Column(db.Integer, db.ForeignKey('tipos_despesa.id'), nullable=False)
     
     # Relacionamentos
@@ -130,9 +171,20 @@ class ClassificacaoReceita(BaseModel):
     __tablename__ = 'classificacoes_receita'
     
     # Chaves estrangeiras
-    conta_receber_id = db.Column(db.Integer, db.ForeignKey('contas_receber.id'), nullable=False)
+    conta_receber_id = db.Column(db.Integer, db.ForeignKey('contas_receber.id'), nullable=False, index=True)
     tipo_receita_id = db.Column(db.Integer, db.ForeignKey('tipos_receita.id'), nullable=False)
     
     # Relacionamentos
     conta_receber = relationship("ContaReceber", back_populates="classificacoes")
-    tipo_receita = relationship("TipoReceita")
\ No newline at end of file
+    tipo_receita = relationship("TipoReceita")
+
+class RequisicaoIdempotente(BaseModel):
+    __tablename__ = 'requisicoes_idempotentes'
+
+    # sha256 do endpoint + Idempotency-Key (ou da impressão digital da nota)
+    chave = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    endpoint = db.Column(db.String(100), nullable=False)
+    corpo_hash = db.Column(db.String(64))
+    status = db.Column(db.String(20), nullable=False, default='processando')  # processando | concluida
+    status_code = db.Column(db.Integer)
+    resposta = db.Column(db.Text)
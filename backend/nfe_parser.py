@@ -0,0 +1,143 @@
+"""
+Leitura direta do XML autorizado da NF-e, sem PDF e sem LLM.
+
+O XML é lido em streaming (iterparse): cada bloco (ide, emit, dest, det,
+total, cobr) é processado quando termina e descartado em seguida, então a
+memória não cresce com o número de itens. O resultado tem o mesmo formato
+de PDFProcessor.process_pdf, mais a lista `parcelas` (uma por duplicata) e
+a `chave_acesso`.
+"""
+import os
+import zipfile
+from decimal import Decimal
+from xml.etree.ElementTree import iterparse, ParseError
+from documentos import formatar_documento, normalizar_documento
+
+# Limites de segurança para lotes ZIP
+NFE_MAX_XML_BYTES = int(os.getenv('NFE_MAX_XML_BYTES', str(5 * 1024 * 1024)))
+NFE_MAX_FILES = int(os.getenv('NFE_MAX_FILES', '20000'))
+
+
+class NFeError(ValueError):
+    pass
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _text(elem, name):
+    child = elem.find(name)
+    return child.text.strip() if child is not None and child.text else None
+
+
+def _date(value):
+    # dhEmi (NF-e 3.10/4.00) vem com hora e fuso; dEmi (2.00) só com a data
+    return value[:10] if value else None
+
+
+def _decimal(value):
+    return Decimal(value) if value else None
+
+
+def parse_nfe(source) -> dict:
+    """
+    Lê uma NF-e (nfeProc ou NFe) de um caminho ou arquivo binário e retorna
+    os dados no formato usado pelo upload de PDF.
+    """
+    data = {
+        "fornecedor": {"razao_social": None, "fantasia": None, "cnpj": None},
+        "faturado": {"nome_completo": None, "cpf": None},
+        "numero_nota_fiscal": None,
+        "data_emissao": None,
+        "descricao_produtos": None,
+        "valor_total": None,
+        "data_vencimento": None,
+        "quantidade_parcelas": 1,
+        "parcelas": [],
+        "chave_acesso": None,
+    }
+    produtos = []
+    found = False
+
+    try:
+        for event, elem in iterparse(source, events=('end',)):
+            elem.tag = _local(elem.tag)
+            tag = elem.tag
+
+            if tag == 'ide':
+                data["numero_nota_fiscal"] = _text(elem, 'nNF')
+                data["data_emissao"] = _date(_text(elem, 'dhEmi') or _text(elem, 'dEmi'))
+            elif tag == 'emit':
+                data["fornecedor"] = {
+                    "razao_social": _text(elem, 'xNome'),
+                    "fantasia": _text(elem, 'xFant'),
+                    "cnpj": formatar_documento(_text(elem, 'CNPJ') or _text(elem, 'CPF')),
+                }
+            elif tag == 'dest':
+                # Destinatário pessoa jurídica: o CNPJ vai no mesmo campo `cpf` usado
+                # pelo save (Faturado.cpf é obrigatório), só com os dígitos para
+                # caber na coluna de 14 caracteres; a busca usa cpf_key de qualquer forma
+                cpf = _text(elem, 'CPF')
+                documento = formatar_documento(cpf) if cpf else normalizar_documento(_text(elem, 'CNPJ'))
+                if not documento:
+                    # Estrangeiro (idEstrangeiro): não há como gravar o faturado
+                    raise NFeError("Destinatário sem CPF/CNPJ (estrangeiro): a nota não pode ser importada")
+                data["faturado"] = {"nome_completo": _text(elem, 'xNome'), "cpf": documento}
+            elif tag == 'prod':
+                descricao = _text(elem, 'xProd')
+                if descricao:
+                    produtos.append(descricao)
+            elif tag == 'ICMSTot':
+                data["valor_total"] = _decimal(_text(elem, 'vNF'))
+            elif tag == 'dup':
+                data["parcelas"].append({
+                    "numero_parcela": len(data["parcelas"]) + 1,
+                    "numero_duplicata": _text(elem, 'nDup'),
+                    "data_vencimento": _date(_text(elem, 'dVenc')),
+                    "valor": _decimal(_text(elem, 'vDup')),
+                })
+            elif tag == 'infNFe':
+                found = True
+                chave = (elem.get('Id') or '')[3:]
+                data["chave_acesso"] = chave or None
+
+            # Blocos já lidos não são mais necessários
+            if tag in ('ide', 'emit', 'dest', 'det', 'total', 'cobr', 'infAdic', 'transp', 'pag'):
+                elem.clear()
+    except ParseError as e:
+        raise NFeError(f"XML inválido: {e}")
+
+    if not found:
+        raise NFeError("O XML não é uma NF-e (infNFe não encontrado)")
+    if not data["faturado"]["cpf"]:
+        raise NFeError("NF-e sem destinatário (dest): a nota não pode ser importada")
+
+    data["descricao_produtos"] = "; ".join(produtos) or None
+    if data["parcelas"]:
+        data["data_vencimento"] = data["parcelas"][0]["data_vencimento"]
+        data["quantidade_parcelas"] = len(data["parcelas"])
+    else:
+        # Nota à vista: vencimento na emissão, parcela única com o valor total
+        data["data_vencimento"] = data["data_emissao"]
+    return data
+
+
+def parse_nfe_zip(source):
+    """
+    Percorre um ZIP com XMLs de NF-e. Gera (nome do arquivo, dados, erro) para
+    cada XML; arquivos que não são .xml são ignorados.
+    """
+    with zipfile.ZipFile(source) as archive:
+        members = [m for m in archive.infolist() if not m.is_dir() and m.filename.lower().endswith('.xml')]
+        if len(members) > NFE_MAX_FILES:
+            raise NFeError(f"O ZIP tem {len(members)} XMLs; o máximo é {NFE_MAX_FILES}")
+        for member in members:
+            if member.file_size > NFE_MAX_XML_BYTES:
+                yield member.filename, None, f"Arquivo maior que {NFE_MAX_XML_BYTES} bytes"
+                continue
+            try:
+                with archive.open(member) as xml_file:
+                    yield member.filename, parse_nfe(xml_file), None
+            except (NFeError, zipfile.BadZipFile) as e:
+                yield member.filename, None, str(e)
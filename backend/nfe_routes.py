@@ -0,0 +1,99 @@
+from flask import request, jsonify
+from sqlalchemy.exc import SQLAlchemyError
+from app import app, db
+from models import *
+from documentos import normalizar_documento
+from nfe_parser import NFeError, parse_nfe, parse_nfe_zip
+from uploads import spool_request_body
+from werkzeug.exceptions import RequestEntityTooLarge
+
+XML_MIMETYPES = ('application/xml', 'text/xml')
+ZIP_MIMETYPES = ('application/zip', 'application/x-zip-compressed')
+LOOKUP_CHUNK = 500
+
+
+def _ultima_classificacao_por_fornecedor(cnpj_keys):
+    """
+    Classificação de despesa mais recente de cada fornecedor já conhecido,
+    usada no lugar do LLM (sem chamadas externas). Retorna {cnpj_key: nome}.
+    """
+    cnpj_keys = sorted({k for k in cnpj_keys if k})
+    result = {}
+    for i in range(0, len(cnpj_keys), LOOKUP_CHUNK):
+        rows = (
+            db.session.query(Fornecedor.cnpj_key, TipoDespesa.nome)
+            .join(ContaPagar, ContaPagar.fornecedor_id == Fornecedor.id)
+            .join(ClassificacaoDespesa, ClassificacaoDespesa.conta_pagar_id == ContaPagar.id)
+            .join(TipoDespesa, TipoDespesa.id == ClassificacaoDespesa.tipo_despesa_id)
+            .filter(Fornecedor.cnpj_key.in_(cnpj_keys[i:i + LOOKUP_CHUNK]),
+                    ContaPagar.is_active == True, ClassificacaoDespesa.is_active == True)
+            .order_by(ContaPagar.id.desc())
+            .all()
+        )
+        for cnpj_key, nome in rows:
+            result.setdefault(cnpj_key, nome)
+    return result
+
+
+def _classificar(notas):
+    try:
+        historico = _ultima_classificacao_por_fornecedor(
+            normalizar_documento(n['fornecedor']['cnpj']) for n in notas
+        )
+    except SQLAlchemyError:
+        historico = {}
+    for nota in notas:
+        nota['classificacao_despesa'] = historico.get(normalizar_documento(nota['fornecedor']['cnpj']))
+    return notas
+
+
+@app.route('/api/upload-nfe', methods=['POST'])
+def upload_nfe():
+    """
+    Importa o XML autorizado da NF-e (ou um ZIP com vários XMLs), sem PDF e sem LLM.
+    Aceita multipart (campo `file`, .xml ou .zip) ou o arquivo direto no corpo
+    (application/xml ou application/zip). XML único retorna os dados no mesmo
+    formato de /api/upload-pdf; ZIP retorna {total, notas, erros}.
+    A classificação de despesa vem do histórico do fornecedor (null se não houver).
+    """
+    try:
+        if request.mimetype in XML_MIMETYPES + ZIP_MIMETYPES:
+            upload = spool_request_body(request)
+            is_zip = request.mimetype in ZIP_MIMETYPES
+        else:
+            if 'file' not in request.files:
+                return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+
+            file = request.files['file']
+            nome = file.filename.lower()
+            if not nome.endswith(('.xml', '.zip')):
+                return jsonify({'error': 'Apenas arquivos XML ou ZIP são aceitos'}), 400
+
+            upload = file.stream
+            is_zip = nome.endswith('.zip')
+
+        with upload:
+            if not is_zip:
+                nota = parse_nfe(upload)
+                return jsonify(_classificar([nota])[0]), 200
+
+            notas, erros = [], []
+            for arquivo, nota, erro in parse_nfe_zip(upload):
+                if erro:
+                    erros.append({'arquivo': arquivo, 'error': erro})
+                else:
+                    nota['arquivo'] = arquivo
+                    notas.append(nota)
+
+        return jsonify({
+            'total': len(notas),
+            'notas': _classificar(notas),
+            'erros': erros
+        }), 200
+
+    except NFeError as e:
+        return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Erro ao importar NF-e: {str(e)}'}), 500
@@ -0,0 +1,171 @@
+"""
+Backfill e deduplicação das chaves normalizadas de CPF/CNPJ (apenas dígitos).
+
+Uso:
+    python normalize_documents.py            # mescla duplicados e preenche as chaves
+    python normalize_documents.py --dry-run  # apenas relata o que seria feito
+"""
+import sys
+from collections import defaultdict
+from sqlalchemy import inspect, text
+from app import app, db
+from models import Fornecedor, Cliente, Faturado, ContaPagar, ContaReceber
+from documentos import normalizar_documento
+
+# (modelo, coluna original, coluna chave, [(modelo dependente, coluna FK)])
+DOCUMENT_KEYS = [
+    (Fornecedor, 'cnpj', 'cnpj_key', [(ContaPagar, 'fornecedor_id')]),
+    (Cliente, 'cpf', 'cpf_key', [(ContaReceber, 'cliente_id')]),
+    (Cliente, 'cnpj', 'cnpj_key', [(ContaReceber, 'cliente_id')]),
+    (Faturado, 'cpf', 'cpf_key', [(ContaPagar, 'faturado_id')]),
+]
+
+BATCH_SIZE = 1000
+
+
+def ensure_key_columns() -> bool:
+    """
+    Adiciona as colunas de chave em bancos criados antes delas.
+    Retorna True se alguma coluna foi criada.
+    """
+    inspector = inspect(db.engine)
+    existing = {}
+    created = False
+    for model, _, key_col, _ in DOCUMENT_KEYS:
+        table = model.__table__
+        if table.name not in existing:
+            existing[table.name] = {c['name'] for c in inspector.get_columns(table.name)}
+        if key_col in existing[table.name]:
+            continue
+        col_type = table.c[key_col].type.compile(dialect=db.engine.dialect)
+        db.session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {key_col} {col_type}"))
+        existing[table.name].add(key_col)
+        created = True
+    db.session.commit()
+    return created
+
+
+def _key_indexes():
+    for model, _, key_col, _ in DOCUMENT_KEYS:
+        for index in model.__table__.indexes:
+            if key_col in index.columns:
+                yield index
+
+
+def key_indexes_missing() -> bool:
+    inspector = inspect(db.engine)
+    for index in _key_indexes():
+        names = {i['name'] for i in inspector.get_indexes(index.table.name)}
+        if index.name not in names:
+            return True
+    return False
+
+
+def create_key_indexes():
+    """Cria os índices únicos das chaves (idempotente)"""
+    for index in _key_indexes():
+        index.create(db.engine, checkfirst=True)
+
+
+def _groups(model, raw_col, key_col):
+    """Agrupa os registros pela chave normalizada: {chave: [(id, is_active, chave_atual), ...]}"""
+    groups = defaultdict(list)
+    rows = db.session.query(
+        model.id, getattr(model, raw_col), model.is_active, getattr(model, key_col)
+    ).order_by(model.id)
+    for id_, raw, active, current in rows.yield_per(BATCH_SIZE):
+        key = normalizar_documento(raw)
+        if key:
+            groups[key].append((id_, active, current))
+    return groups
+
+
+def _bulk_set(model, updates):
+    for start in range(0, len(updates), BATCH_SIZE):
+        db.session.bulk_update_mappings(model, updates[start:start + BATCH_SIZE])
+
+
+def assign_keys(merge: bool = False, dry_run: bool = False) -> list:
+    """
+    Preenche as chaves normalizadas.
+
+    Em cada grupo de registros com o mesmo documento, o registro ativo mais antigo
+    recebe a chave. Com merge=True os demais são mesclados nele (as contas são
+    reapontadas e os duplicados removidos); sem merge eles apenas ficam sem chave.
+    """
+    report = []
+    for model, raw_col, key_col, dependents in DOCUMENT_KEYS:
+        groups = _groups(model, raw_col, key_col)
+        clear, assign, merged = [], [], 0
+
+        for key, members in groups.items():
+            winner = min(members, key=lambda m: (not m[1], m[0]))
+            losers = [m for m in members if m[0] != winner[0]]
+
+            if merge and losers:
+                loser_ids = [m[0] for m in losers]
+                merged += len(loser_ids)
+                if not dry_run:
+                    for dependent, fk in dependents:
+                        db.session.query(dependent).filter(getattr(dependent, fk).in_(loser_ids)).update(
+                            {fk: winner[0]}, synchronize_session=False
+                        )
+                    db.session.query(model).filter(model.id.in_(loser_ids)).delete(synchronize_session=False)
+            else:
+                clear.extend({'id': m[0], key_col: None} for m in losers if m[2] is not None)
+
+            if winner[2] != key:
+                assign.append({'id': winner[0], key_col: key})
+
+        duplicates = sum(len(m) - 1 for m in groups.values())
+        report.append({
+            'tabela': model.__tablename__,
+            'coluna': raw_col,
+            'duplicados': duplicates,
+            'mesclados': merged,
+            'chaves_atualizadas': len(assign),
+        })
+
+        if dry_run:
+            continue
+        # Liberar chaves dos duplicados antes de atribuí-las ao registro principal
+        _bulk_set(model, clear)
+        db.session.flush()
+        _bulk_set(model, assign)
+        db.session.commit()
+
+    if dry_run:
+        db.session.rollback()
+    return report
+
+
+def sync_document_keys():
+    """
+    Chamado na inicialização: em bancos antigos cria as colunas de chave,
+    preenche-as (sem mesclar duplicados) e cria os índices únicos.
+    """
+    created = ensure_key_columns()
+    if created or key_indexes_missing():
+        assign_keys(merge=False)
+        create_key_indexes()
+
+
+def normalize_documents(dry_run: bool = False):
+    """Mescla duplicados de CPF/CNPJ e garante chaves e índices"""
+    with app.app_context():
+        ensure_key_columns()
+        report = assign_keys(merge=True, dry_run=dry_run)
+        if not dry_run:
+            create_key_indexes()
+
+        for item in report:
+            print(
+                f"{item['tabela']}.{item['coluna']}: {item['duplicados']} duplicados, "
+                f"{item['mesclados']} mesclados, {item['chaves_atualizadas']} chaves atualizadas"
+            )
+        if dry_run:
+            print("Dry-run: nenhuma alteração foi gravada.")
+
+
+if __name__ == '__main__':
+    normalize_documents(dry_run='--dry-run' in sys.argv)
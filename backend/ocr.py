@@ -0,0 +1,148 @@
+"""
+OCR local para páginas escaneadas (sem camada de texto).
+
+A detecção é barata: uma página cujo texto extraído tem menos de
+OCR_MIN_CHARS_PER_PAGE caracteres alfanuméricos é tratada como imagem. As
+imagens dessas páginas são preparadas com Pillow (tons de cinza, ampliação,
+contraste) e reconhecidas pelo tesseract, em um pool de processos.
+
+- OCR_ENABLED: liga/desliga o OCR (default true)
+- OCR_MIN_CHARS_PER_PAGE: densidade mínima de texto por página (default 25)
+- OCR_WORKERS: processos do pool (default: metade dos núcleos, mínimo 1)
+- OCR_LANG: idiomas do tesseract (default "por+eng"; cai para "eng" se "por" não estiver instalado)
+- OCR_TIMEOUT: timeout do tesseract por imagem, em segundos (default 60)
+- TESSERACT_CMD: executável do tesseract (default "tesseract")
+"""
+import io
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - dependência opcional
+    Image = None
+
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+OCR_MIN_CHARS_PER_PAGE = int(os.getenv('OCR_MIN_CHARS_PER_PAGE', '25'))
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '0')) or max(1, (os.cpu_count() or 2) // 2)
+OCR_LANG = os.getenv('OCR_LANG', 'por+eng')
+OCR_TIMEOUT = int(os.getenv('OCR_TIMEOUT', '60'))
+TESSERACT_CMD = os.getenv('TESSERACT_CMD', 'tesseract')
+
+# Scans abaixo desta largura são ampliados antes do reconhecimento
+MIN_OCR_WIDTH = 1600
+
+_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class OCRUnavailable(Exception):
+    pass
+
+
+def text_density(text: str) -> int:
+    """Quantidade de caracteres alfanuméricos do texto"""
+    return sum(1 for c in text or '' if c.isalnum())
+
+
+def is_image_only(text: str) -> bool:
+    return text_density(text) < OCR_MIN_CHARS_PER_PAGE
+
+
+def available() -> bool:
+    return OCR_ENABLED and Image is not None and shutil.which(TESSERACT_CMD) is not None
+
+
+def page_images(page) -> list:
+    """Bytes das imagens embutidas em uma página do PyPDF2 (scans costumam ter uma só)"""
+    try:
+        return [image.data for image in page.images]
+    except Exception:
+        return []
+
+
+def _prepare(data: bytes):
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image).convert('L')
+    if image.width < MIN_OCR_WIDTH:
+        scale = MIN_OCR_WIDTH / image.width
+        image = image.resize((MIN_OCR_WIDTH, int(image.height * scale)), Image.LANCZOS)
+    return ImageOps.autocontrast(image)
+
+
+@lru_cache(maxsize=1)
+def _languages() -> str:
+    try:
+        result = subprocess.run([TESSERACT_CMD, '--list-langs'], capture_output=True, text=True, timeout=10)
+        installed = set(result.stdout.split())
+    except (OSError, subprocess.SubprocessError):
+        return OCR_LANG
+    wanted = [lang for lang in OCR_LANG.split('+') if lang in installed]
+    return '+'.join(wanted) or 'eng'
+
+
+def _recognize(data: bytes, lang: str) -> str:
+    """Executado nos processos do pool: prepara a imagem e chama o tesseract"""
+    image = _prepare(data)
+    with tempfile.NamedTemporaryFile(suffix='.png') as tmp:
+        image.save(tmp, format='PNG')
+        tmp.flush()
+        result = subprocess.run(
+            [TESSERACT_CMD, tmp.name, 'stdout', '-l', lang, '--psm', '6'],
+            capture_output=True, text=True, timeout=OCR_TIMEOUT
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"tesseract saiu com código {result.returncode}")
+    return result.stdout.strip()
+
+
+def _get_pool():
+    # Um pool por processo (workers do gunicorn). Os filhos só executam Pillow e
+    # o tesseract; não são criados por fork do worker, que tem threads (locks
+    # copiados no meio do uso travariam o filho), e sim pelo forkserver (spawn
+    # onde não existe), que importa apenas este módulo para rodar _recognize.
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(
+                    max_workers=OCR_WORKERS,
+                    mp_context=multiprocessing.get_context(_START_METHOD),
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def recognize_pages(images_by_page: dict) -> dict:
+    """
+    Reconhece o texto das páginas informadas ({índice: [bytes da imagem]}) no
+    pool de processos e retorna {índice: texto}.
+    """
+    if not available():
+        raise OCRUnavailable("OCR indisponível: instale o tesseract e o Pillow (ou habilite OCR_ENABLED)")
+
+    global _pool
+    lang = _languages()
+    pool = _get_pool()
+    try:
+        futures = {
+            page: [pool.submit(_recognize, data, lang) for data in images]
+            for page, images in images_by_page.items()
+        }
+        return {page: "\n".join(f.result() for f in page_futures).strip() for page, page_futures in futures.items()}
+    except BrokenProcessPool:
+        # Um filho morreu (ex.: falta de memória): o próximo upload recria o pool
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
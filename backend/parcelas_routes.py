@@ -0,0 +1,255 @@
+"""
+Parcelas vencidas e a vencer, e feed incremental de lembretes.
+
+GET /api/parcelas-pagar/vencidas             (idem /api/parcelas-receber/...)
+GET /api/parcelas-pagar/a-vencer?dias=7
+    Parcelas em aberto (data_pagamento/data_recebimento nula) de contas ativas,
+    por ordem de vencimento, com a parte (fornecedor/cliente) e a classificação
+    no mesmo SELECT. Paginação por keyset (vencimento, id): `cursor` recebe o
+    `proximo_cursor` da página anterior; `limit` default 50, máximo PARCELAS_MAX_LIMIT.
+
+GET /api/parcelas-pagar/lembretes?dias=7
+    Sem cursor: as parcelas em aberto vencidas ou que vencem nos próximos `dias`.
+    Com o cursor devolvido: apenas as parcelas que mudaram de situação desde a
+    consulta anterior (criadas/alteradas, inclusive pela conta, que venceram ou
+    que entraram na janela de `dias`), com a `situacao` atual: vencida, a_vencer,
+    em_aberto, quitada ou inativa. Com `mais=true` há outra página do mesmo
+    intervalo; senão guarde `proximo_cursor` para a próxima consulta.
+
+Os índices de parcelas em aberto (baixa, data_vencimento) e de updated_at
+estão declarados nos modelos.
+"""
+import base64
+import json
+import os
+from datetime import date, datetime, timedelta
+from flask import request, jsonify
+from sqlalchemy import and_, or_, select, union
+from app import app, db
+from models import *
+from read_replica import ler_do_primario
+
+PARCELAS_MAX_LIMIT = int(os.getenv('PARCELAS_MAX_LIMIT', '500'))
+LEMBRETES_DIAS = int(os.getenv('LEMBRETES_DIAS', '7'))
+# O intervalo do feed termina alguns segundos no passado: uma transação em
+# andamento grava updated_at antes do commit e não pode ficar atrás do cursor
+LEMBRETES_ATRASO_SEGUNDOS = 5
+
+# entidade da URL -> modelos e colunas envolvidos
+PARCELAS = {
+    'parcelas-pagar': {
+        'parcela': ParcelaPagar, 'conta': ContaPagar, 'conta_fk': 'conta_pagar_id',
+        'baixa': 'data_pagamento', 'valor_baixa': 'valor_pago', 'documento': 'numero_nota_fiscal',
+        'parte': Fornecedor, 'parte_fk': 'fornecedor_id', 'parte_nome': 'fornecedor',
+        'parte_campos': ['razao_social', 'cnpj'],
+        'classificacao': ClassificacaoDespesa, 'tipo': TipoDespesa, 'tipo_fk': 'tipo_despesa_id',
+    },
+    'parcelas-receber': {
+        'parcela': ParcelaReceber, 'conta': ContaReceber, 'conta_fk': 'conta_receber_id',
+        'baixa': 'data_recebimento', 'valor_baixa': 'valor_recebido', 'documento': 'numero_documento',
+        'parte': Cliente, 'parte_fk': 'cliente_id', 'parte_nome': 'cliente',
+        'parte_campos': ['nome_completo', 'cpf', 'cnpj'],
+        'classificacao': ClassificacaoReceita, 'tipo': TipoReceita, 'tipo_fk': 'tipo_receita_id',
+    },
+}
+
+
+def _encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('cursor inválido')
+    if not isinstance(data, dict):
+        raise ValueError('cursor inválido')
+    return data
+
+
+def _limit():
+    return min(max(request.args.get('limit', 50, type=int), 1), PARCELAS_MAX_LIMIT)
+
+
+def _dias():
+    dias = request.args.get('dias', LEMBRETES_DIAS, type=int)
+    if not 0 <= dias <= 366:
+        raise ValueError('dias deve estar entre 0 e 366')
+    return dias
+
+
+def _select(cfg):
+    """Parcela + conta + parte + primeira classificação, em um único SELECT"""
+    P, C, Parte = cfg['parcela'], cfg['conta'], cfg['parte']
+    Cl, Tipo = cfg['classificacao'], cfg['tipo']
+    conta_id = getattr(P, cfg['conta_fk'])
+    classificacao = (
+        select(Tipo.nome)
+        .join(Cl, getattr(Cl, cfg['tipo_fk']) == Tipo.id)
+        .where(getattr(Cl, cfg['conta_fk']) == C.id)
+        .order_by(Cl.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            P.id, P.numero_parcela, P.data_vencimento, P.valor, P.is_active,
+            getattr(P, cfg['baixa']).label('baixa'),
+            getattr(P, cfg['valor_baixa']).label('valor_baixa'),
+            conta_id.label('conta_id'),
+            getattr(C, cfg['documento']).label('documento'),
+            C.is_active.label('conta_ativa'),
+            Parte.id.label('parte_id'),
+            *[getattr(Parte, campo).label(f'parte_{campo}') for campo in cfg['parte_campos']],
+            classificacao.label('classificacao'),
+        )
+        .join(C, conta_id == C.id)
+        .join(Parte, getattr(C, cfg['parte_fk']) == Parte.id)
+    )
+
+
+def _situacao(row, hoje, dias):
+    if not row.is_active or not row.conta_ativa:
+        return 'inativa'
+    if row.baixa is not None:
+        return 'quitada'
+    if row.data_vencimento < hoje:
+        return 'vencida'
+    if row.data_vencimento <= hoje + timedelta(days=dias):
+        return 'a_vencer'
+    return 'em_aberto'
+
+
+def _item(cfg, row, hoje, dias):
+    situacao = _situacao(row, hoje, dias)
+    return {
+        'id': row.id,
+        cfg['conta_fk']: row.conta_id,
+        cfg['documento']: row.documento,
+        'numero_parcela': row.numero_parcela,
+        'data_vencimento': row.data_vencimento,
+        'valor': row.valor,
+        cfg['baixa']: row.baixa,
+        cfg['valor_baixa']: row.valor_baixa,
+        'situacao': situacao,
+        'dias_atraso': (hoje - row.data_vencimento).days if situacao == 'vencida' else 0,
+        cfg['parte_nome']: dict(
+            {'id': row.parte_id},
+            **{campo: getattr(row, f'parte_{campo}') for campo in cfg['parte_campos']}
+        ),
+        'classificacao': row.classificacao,
+    }
+
+
+def listar_abertas(entidade, vencidas):
+    """Parcelas em aberto vencidas (ou a vencer em `dias`), paginadas por (vencimento, id)"""
+    cfg = PARCELAS[entidade]
+    P, C = cfg['parcela'], cfg['conta']
+    hoje, dias, limit = date.today(), _dias(), _limit()
+
+    stmt = _select(cfg).where(getattr(P, cfg['baixa']).is_(None), P.is_active == True, C.is_active == True)
+    if vencidas:
+        stmt = stmt.where(P.data_vencimento < hoje)
+    else:
+        stmt = stmt.where(P.data_vencimento >= hoje, P.data_vencimento <= hoje + timedelta(days=dias))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        data = _decode_cursor(cursor)
+        try:
+            vencimento, apos = date.fromisoformat(data['v']), int(data['id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('cursor inválido')
+        stmt = stmt.where(or_(
+            P.data_vencimento > vencimento,
+            and_(P.data_vencimento == vencimento, P.id > apos),
+        ))
+
+    rows = db.session.execute(stmt.order_by(P.data_vencimento, P.id).limit(limit + 1)).all()
+    proximo = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        proximo = _encode_cursor({'v': rows[-1].data_vencimento.isoformat(), 'id': rows[-1].id})
+    return {'items': [_item(cfg, row, hoje, dias) for row in rows], 'proximo_cursor': proximo}
+
+
+def lembretes(entidade):
+    """
+    Feed incremental. O cursor guarda o início do intervalo (desde/dia0; nulo na
+    carga inicial) e, durante a paginação, o fim congelado (ate/dia1) e o último id.
+    """
+    # O cursor só tolera LEMBRETES_ATRASO_SEGUNDOS de atraso; a réplica pode estar
+    # até DB_REPLICA_MAX_LAG_SEGUNDOS atrás e as linhas que chegassem depois do
+    # `ate` ficariam para sempre fora do feed
+    ler_do_primario()
+    cfg = PARCELAS[entidade]
+    P, C = cfg['parcela'], cfg['conta']
+    baixa = getattr(P, cfg['baixa'])
+    limit = _limit()
+    agora = datetime.utcnow() - timedelta(seconds=LEMBRETES_ATRASO_SEGUNDOS)
+    hoje = date.today()
+
+    cursor = request.args.get('cursor')
+    data = _decode_cursor(cursor) if cursor else {}
+    try:
+        dias = int(data['dias']) if 'dias' in data else _dias()
+        desde = datetime.fromisoformat(data['desde']) if data.get('desde') else None
+        dia0 = date.fromisoformat(data['dia0']) if data.get('dia0') else hoje
+        ate = datetime.fromisoformat(data['ate']) if data.get('ate') else max(agora, desde or agora)
+        dia1 = date.fromisoformat(data['dia1']) if data.get('dia1') else max(hoje, dia0)
+        apos = int(data.get('apos', 0))
+    except (TypeError, ValueError):
+        raise ValueError('cursor inválido')
+
+    if desde is None:
+        # Carga inicial: tudo o que está vencido ou vence na janela
+        where = and_(baixa.is_(None), P.is_active == True, C.is_active == True,
+                     P.data_vencimento <= dia1 + timedelta(days=dias))
+    else:
+        janela = timedelta(days=dias)
+        where = P.id.in_(union(
+            select(P.id).where(P.updated_at > desde, P.updated_at <= ate),
+            select(P.id).join(C, getattr(P, cfg['conta_fk']) == C.id)
+            .where(C.updated_at > desde, C.updated_at <= ate),
+            # Venceram no intervalo
+            select(P.id).where(baixa.is_(None), P.data_vencimento >= dia0, P.data_vencimento < dia1),
+            # Entraram na janela de `dias`
+            select(P.id).where(baixa.is_(None), P.data_vencimento > dia0 + janela,
+                               P.data_vencimento <= dia1 + janela),
+        ))
+
+    rows = db.session.execute(_select(cfg).where(where, P.id > apos).order_by(P.id).limit(limit + 1)).all()
+    mais = len(rows) > limit
+    rows = rows[:limit]
+    if mais:
+        proximo = {'desde': desde and desde.isoformat(), 'dia0': dia0.isoformat(), 'dias': dias,
+                   'ate': ate.isoformat(), 'dia1': dia1.isoformat(), 'apos': rows[-1].id}
+    else:
+        proximo = {'desde': ate.isoformat(), 'dia0': dia1.isoformat(), 'dias': dias}
+    return {
+        'items': [_item(cfg, row, dia1, dias) for row in rows],
+        'proximo_cursor': _encode_cursor(proximo),
+        'mais': mais,
+    }
+
+
+def _endpoint(entidade, acao, func, doc):
+    def view():
+        try:
+            return jsonify(func(entidade)), 200
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': f'Erro ao buscar parcelas: {str(e)}'}), 500
+
+    view.__name__ = f"{acao.replace('-', '_')}_{entidade.replace('-', '_')}"
+    view.__doc__ = f"{doc} ({entidade})"
+    app.add_url_rule(f'/api/{entidade}/{acao}', view.__name__, view, methods=['GET'])
+
+
+for _entidade in PARCELAS:
+    _endpoint(_entidade, 'vencidas', lambda e: listar_abertas(e, vencidas=True), 'Parcelas em aberto vencidas')
+    _endpoint(_entidade, 'a-vencer', lambda e: listar_abertas(e, vencidas=False), 'Parcelas em aberto a vencer')
+    _endpoint(_entidade, 'lembretes', lembretes, 'Feed incremental de lembretes de vencimento')
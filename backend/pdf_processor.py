@@ -1,25 +1,29 @@
-import openai
-from openai import OpenAI
-import google.generativeai as genai
-import PyPDF2
+import asyncio
 import json
 import io
+import mmap
 import os
+import time
+import ocr
 from datetime import datetime
+from danfe_splitter import split_invoices
 from expense_classifier import ExpenseClassifier
-from typing import Dict, Optional
+from llm_gateway import get_gateway
+from typing import Dict, List, Optional
 
 class PDFProcessor:
     def __init__(self):
         """
-        Inicializa o processador de PDF com cliente OpenAI e Gemini
+        Inicializa o processador de PDF. As chamadas ao OpenAI e ao Gemini
+        passam pelo gateway assíncrono de LLM (ver llm_gateway.py).
         """
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.llm = get_gateway()
         
         # Configurar Gemini como fallback (sem listar modelos para evitar chamadas remotas no startup)
         gemini_key = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
         self.gemini_model = None
         if gemini_key:
+            import google.generativeai as genai
             genai.configure(api_key=gemini_key)
             preferred = os.getenv('GEMINI_MODEL_NAME')
             candidates = [preferred] if preferred else [
@@ -29,12 +33,8 @@ class PDFProcessor:
                 "gemini-1.5-pro-latest",
                 "gemini-pro"
             ]
-            for candidate in [m for m in candidates if m]:
-                try:
-                    self.gemini_model = genai.GenerativeModel(candidate)
-                    break
-                except Exception as e:
-                    print(f"Falha ao inicializar Gemini com modelo '{candidate}': {e}")
+            # Nome do modelo preferido; a instância é criada pelo gateway no primeiro uso
+            self.gemini_model = next((m for m in candidates if m), None)
         else:
             self.gemini_model = None
             
@@ -42,24 +42,69 @@ class PDFProcessor:
     
     def extract_text_from_pdf(self, pdf_file) -> str:
         """
-        Extrai texto de um arquivo PDF
+        Extrai texto de um arquivo PDF (com OCR das páginas escaneadas)
+        """
+        return self.extract_text_with_stats(pdf_file)[0]
+
+    def extract_text_with_stats(self, pdf_file):
+        """
+        Extrai o texto e retorna (texto, estatísticas). Arquivos em disco
+        (uploads gravados por uploads.py) são lidos via mmap, sem carregar o PDF
+        na memória. Páginas sem camada de texto passam pelo OCR (ver ocr.py).
+        """
+        pages, stats = self.extract_pages_with_stats(pdf_file)
+        return "\n".join(pages).strip(), stats
+
+    def extract_pages_with_stats(self, pdf_file):
+        """
+        Como extract_text_with_stats, mas com o texto de cada página separado
         """
+        stream = getattr(pdf_file, 'stream', pdf_file)
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            return text.strip()
+            fileno = stream.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            fileno = None
+
+        try:
+            if fileno is None:
+                return self._extract_pages(stream)
+            stream.flush()
+            if os.fstat(fileno).st_size == 0:
+                raise Exception("arquivo vazio")
+            with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+                return self._extract_pages(mapped)
         except Exception as e:
             raise Exception(f"Erro ao extrair texto do PDF: {str(e)}")
+
+    def _extract_pages(self, stream):
+        import PyPDF2  # importado no primeiro uso (workers só de CRUD não carregam)
+
+        start = time.perf_counter()
+        pdf_reader = PyPDF2.PdfReader(stream)
+        pages = [page.extract_text() or "" for page in pdf_reader.pages]
+        stats = {
+            'paginas': len(pages),
+            'paginas_ocr': [],
+            'tempos_ms': {'extracao_texto': round((time.perf_counter() - start) * 1000, 1)},
+        }
+
+        image_pages = [i for i, text in enumerate(pages) if ocr.is_image_only(text)]
+        if image_pages and ocr.available():
+            start = time.perf_counter()
+            images = {i: ocr.page_images(pdf_reader.pages[i]) for i in image_pages}
+            images = {i: data for i, data in images.items() if data}
+            for i, text in ocr.recognize_pages(images).items():
+                if ocr.text_density(text) > ocr.text_density(pages[i]):
+                    pages[i] = text
+            stats['paginas_ocr'] = [i + 1 for i in sorted(images)]
+            stats['tempos_ms']['ocr'] = round((time.perf_counter() - start) * 1000, 1)
+        elif image_pages:
+            stats['ocr_indisponivel'] = True
+
+        return pages, stats
     
-    def extract_invoice_data(self, pdf_text: str) -> dict:
-        """
-        Extrai dados estruturados da nota fiscal usando OpenAI GPT
-        """
-        prompt = f"""
+    def _build_prompt(self, pdf_text: str) -> str:
+        return f"""
         Você é um especialista em extração de dados de notas fiscais brasileiras.
         
         Analise o texto da nota fiscal abaixo e extraia EXATAMENTE as seguintes informações em formato JSON:
@@ -94,31 +139,60 @@ class PDFProcessor:
         
         Responda APENAS com o JSON válido:
         """
+    
+    def _parse_response(self, json_response: str) -> dict:
+        """
+        Converte a resposta do modelo em dicionário
+        """
+        # Tentar parsear o JSON
+        try:
+            return json.loads(json_response)
+        except json.JSONDecodeError:
+            # Se falhar, tentar limpar o texto
+            json_response = json_response.replace("```json", "").replace("```", "").strip()
+            return json.loads(json_response)
+    
+    async def _classify(self, data: dict) -> dict:
+        # Classificar a despesa automaticamente
+        if data.get("descricao_produtos"):
+            classificacao = await self.classifier.aclassify_expense(data["descricao_produtos"])
+            data["classificacao_despesa"] = classificacao
+        return data
+    
+    def extract_invoice_data(self, pdf_text: str) -> dict:
+        """
+        Extrai dados estruturados da nota fiscal usando OpenAI GPT
+        """
+        self.classifier.refresh_history()
+        return self.llm.run(self.aextract_invoice_data(pdf_text))
+    
+    def extract_many(self, pdf_texts: List[str]) -> list:
+        """
+        Extrai várias notas de uma vez (lotes), com as chamadas disparadas em
+        paralelo no gateway de LLM. Falhas são retornadas como exceções na lista.
+        """
+        self.classifier.refresh_history()
+        return self.llm.map(self.aextract_invoice_data, pdf_texts)
+    
+    async def aextract_invoice_data(self, pdf_text: str) -> dict:
+        """
+        Versão assíncrona de extract_invoice_data
+        """
+        # Sem texto o LLM só inventa dados: nem chega a ser chamado
+        if ocr.is_image_only(pdf_text):
+            raise ValueError("Texto insuficiente para extrair os dados da nota fiscal")
+
+        prompt = self._build_prompt(pdf_text)
+        
+        if self.llm.hedging() and (os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')):
+            # OpenAI lento: o Gemini é disparado em paralelo e a primeira resposta válida vence
+            data = await self.llm.hedge('openai', lambda: self._extract_with_openai(prompt),
+                                        'gemini', lambda: self._gemini_data(prompt))
+            return await self._classify(data)
         
         try:
-            response = self.client.completions.create(
-                model="gpt-3.5-turbo-instruct",
-                prompt=prompt,
-                max_tokens=1000,
-                temperature=0.1
-            )
-            
-            json_response = response.choices[0].text.strip()
-            
-            # Tentar parsear o JSON
-            try:
-                data = json.loads(json_response)
-            except json.JSONDecodeError:
-                # Se falhar, tentar limpar o texto
-                json_response = json_response.replace("```json", "").replace("```", "").strip()
-                data = json.loads(json_response)
-            
-            # Classificar a despesa automaticamente
-            if data.get("descricao_produtos"):
-                classificacao = self.classifier.classify_expense(data["descricao_produtos"])
-                data["classificacao_despesa"] = classificacao
-            
-            return data
+            data = await self._extract_with_openai(prompt)
+            return await self._classify(data)
             
         except Exception as e:
             error_message = str(e)
@@ -126,22 +200,29 @@ class PDFProcessor:
             # Tratamento específico para erros de quota da OpenAI
             if "quota" in error_message.lower() or "exceeded" in error_message.lower():
                 print(f"OpenAI quota exceeded, trying Gemini fallback...")
-                return self._extract_with_gemini(prompt)
             elif "rate limit" in error_message.lower():
                 print(f"OpenAI rate limit reached, trying Gemini fallback...")
-                return self._extract_with_gemini(prompt)
             elif "authentication" in error_message.lower() or "api key" in error_message.lower():
                 print(f"OpenAI authentication error, trying Gemini fallback...")
-                return self._extract_with_gemini(prompt)
             else:
                 # Para outros erros, tentar Gemini como fallback
                 print(f"OpenAI error: {error_message}, trying Gemini fallback...")
-                return self._extract_with_gemini(prompt)
+            return await self._extract_with_gemini(prompt)
+    
+    async def _extract_with_openai(self, prompt: str) -> dict:
+        json_response = await self.llm.complete('openai', prompt, max_tokens=1000, temperature=0.1)
+        return self._parse_response(json_response)
     
-    def _extract_with_gemini(self, prompt: str) -> dict:
+    async def _extract_with_gemini(self, prompt: str) -> dict:
         """
         Extrai dados usando Google Gemini como fallback
         """
+        return await self._classify(await self._gemini_data(prompt))
+    
+    async def _gemini_data(self, prompt: str) -> dict:
+        """
+        Dados da nota (ainda sem classificação) pelo Gemini, tentando os modelos candidatos
+        """
         if not (os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')):
             raise Exception("Erro na extração de dados: OpenAI indisponível e Gemini não configurado. Verifique as chaves de API.")
         
@@ -160,18 +241,9 @@ class PDFProcessor:
         # Tenta candidatos diretos
         for name in [c for c in candidates if c]:
             try:
-                model = genai.GenerativeModel(name)
-                response = model.generate_content(prompt)
-                json_response = response.text.strip()
-                try:
-                    data = json.loads(json_response)
-                except json.JSONDecodeError:
-                    json_response = json_response.replace("```json", "").replace("```", "").strip()
-                    data = json.loads(json_response)
-                if data.get("descricao_produtos"):
-                    classificacao = self.classifier.classify_expense(data["descricao_produtos"])
-                    data["classificacao_despesa"] = classificacao
-                self.gemini_model = model
+                json_response = await self.llm.complete('gemini', prompt, model=name)
+                data = self._parse_response(json_response)
+                self.gemini_model = name
                 return data
             except Exception as e:
                 last_error = e
@@ -179,7 +251,8 @@ class PDFProcessor:
         
         # Se todos candidatos falharem, listar modelos e escolher um com generateContent
         try:
-            available = genai.list_models()
+            import google.generativeai as genai
+            available = await asyncio.to_thread(lambda: list(genai.list_models()))
             supported = []
             for m in available:
                 methods = getattr(m, 'supported_generation_methods', []) or []
@@ -190,18 +263,9 @@ class PDFProcessor:
             preferred_names = [n for n in supported if 'gemini-1.5' in n] or supported
             for full_name in preferred_names:
                 try:
-                    model = genai.GenerativeModel(full_name)
-                    response = model.generate_content(prompt)
-                    json_response = response.text.strip()
-                    try:
-                        data = json.loads(json_response)
-                    except json.JSONDecodeError:
-                        json_response = json_response.replace("```json", "").replace("```", "").strip()
-                        data = json.loads(json_response)
-                    if data.get("descricao_produtos"):
-                        classificacao = self.classifier.classify_expense(data["descricao_produtos"])
-                        data["classificacao_despesa"] = classificacao
-                    self.gemini_model = model
+                    json_response = await self.llm.complete('gemini', prompt, model=full_name)
+                    data = self._parse_response(json_response)
+                    self.gemini_model = full_name
                     return data
                 except Exception as e:
                     last_error = e
@@ -211,31 +275,67 @@ class PDFProcessor:
         
         raise Exception(f"Erro na extração de dados: Tanto OpenAI quanto Gemini falharam. Gemini error: {str(last_error)}")
     
+    async def _aextract_segments(self, texts: List[str]) -> list:
+        # Uma chamada por nota, todas em paralelo (prioridade interativa, como o upload)
+        return await asyncio.gather(*(self.aextract_invoice_data(t) for t in texts), return_exceptions=True)
+
     def process_pdf(self, pdf_file) -> dict:
         """
-        Processa um arquivo PDF completo e retorna os dados extraídos
+        Processa um arquivo PDF completo e retorna os dados extraídos. PDFs com
+        várias DANFEs são separados por nota (ver danfe_splitter.py) e as notas
+        são extraídas e classificadas em paralelo; nesse caso `data` traz
+        {total, notas, erros}, cada nota com suas `paginas`.
         """
         try:
-            # Extrair texto do PDF
-            pdf_text = self.extract_text_from_pdf(pdf_file)
+            # Extrair texto do PDF (OCR nas páginas escaneadas)
+            pages, stats = self.extract_pages_with_stats(pdf_file)
+            pdf_text = "\n".join(pages).strip()
             
-            if not pdf_text:
+            if ocr.is_image_only(pdf_text):
+                if stats.get('ocr_indisponivel'):
+                    raise Exception("Não foi possível extrair texto do PDF: o arquivo é escaneado e o OCR está indisponível")
                 raise Exception("Não foi possível extrair texto do PDF")
             
-            # Extrair dados estruturados
-            invoice_data = self.extract_invoice_data(pdf_text)
+            # Extrair dados estruturados (uma extração por nota)
+            segmentos = split_invoices(pages)
+            start = time.perf_counter()
+            if len(segmentos) == 1:
+                resultados = [self.extract_invoice_data(pdf_text)]
+            else:
+                self.classifier.refresh_history()
+                resultados = self.llm.run(self._aextract_segments([s['texto'] for s in segmentos]))
+            stats['tempos_ms']['llm'] = round((time.perf_counter() - start) * 1000, 1)
+            print(f"PDF processado: {stats['paginas']} página(s), {len(segmentos)} nota(s), "
+                  f"OCR em {stats['paginas_ocr'] or 'nenhuma'}, tempos (ms) {stats['tempos_ms']}")
+            
+            notas, erros = [], []
+            for segmento, resultado in zip(segmentos, resultados):
+                if isinstance(resultado, Exception):
+                    erros.append({'paginas': segmento['paginas'], 'chave_acesso': segmento['chave_acesso'],
+                                  'error': str(resultado)})
+                    continue
+                resultado["paginas"] = segmento['paginas']
+                resultado["chave_acesso"] = segmento['chave_acesso']
+                notas.append(resultado)
+            if not notas:
+                raise Exception(erros[0]['error'])
             
             # Adicionar metadados
-            invoice_data["processed_at"] = datetime.now().isoformat()
+            metadados = {
+                "processed_at": datetime.now().isoformat(),
+                "paginas_ocr": stats['paginas_ocr'],
+                "tempos_ms": stats['tempos_ms'],
+            }
             # Removido campo 'pdf_text' do retorno conforme solicitado
-            
+            if len(segmentos) == 1:
+                return {"success": True, "data": dict(notas[0], **metadados)}
             return {
                 "success": True,
-                "data": invoice_data
+                "data": dict({"total": len(notas), "notas": notas, "erros": erros}, **metadados)
             }
             
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
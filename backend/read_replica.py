@@ -0,0 +1,215 @@
+"""
+Réplica de leitura opcional para os GETs.
+
+Com a réplica configurada, o engine dela é registrado como o bind `replica`
+(SQLALCHEMY_BINDS) e a sessão escolhe o engine por instrução:
+
+- requisições GET/HEAD leem da réplica; INSERT/UPDATE/DELETE, flush e
+  qualquer SQL textual que não seja SELECT vão sempre para o primário;
+- depois de uma escrita (método não seguro com status < 400) o cliente recebe
+  o cookie DB_REPLICA_COOKIE e lê do primário por DB_REPLICA_STICKY_SEGUNDOS
+  (read-your-writes);
+- a saúde da réplica é verificada no máximo a cada DB_REPLICA_CHECK_SEGUNDOS
+  (consulta simples e, no MySQL, o atraso de replicação); fora do ar ou
+  atrasada, as leituras voltam para o primário.
+
+Configuração (sem nenhuma delas, tudo vai para o primário como antes):
+- DB_REPLICA_URL: URL SQLAlchemy completa da réplica
+- MySQL: DB_REPLICA_HOST / DB_REPLICA_PORT (usuário, senha e banco do primário,
+  ou DB_REPLICA_USER / DB_REPLICA_PASSWORD)
+- SQLite (teste local): SQLITE_REPLICA_PATH, outro arquivo na pasta instance/;
+  `python read_replica.py sync` copia o primário para ele
+- DB_REPLICA_MAX_LAG_SEGUNDOS: atraso máximo aceito no MySQL (default 30)
+- DB_REPLICA_STICKY_SEGUNDOS: default DB_REPLICA_MAX_LAG_SEGUNDOS + DB_REPLICA_CHECK_SEGUNDOS.
+  Os dois precisam ficar coerentes: uma janela menor que o atraso aceito deixaria
+  o cliente ler da réplica antes de ela ter a escrita dele, por isso valores
+  menores são elevados ao mínimo em init_read_replica
+
+A resposta de cada GET que consultou o banco traz `X-DB-Leitura: replica|primario`.
+GETs que precisam ler do primário chamam ler_do_primario() antes da primeira consulta.
+"""
+import math
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.sql.expression import TextClause, UpdateBase
+
+REPLICA_BIND = 'replica'
+DB_REPLICA_CHECK_SEGUNDOS = float(os.getenv('DB_REPLICA_CHECK_SEGUNDOS', '5'))
+DB_REPLICA_MAX_LAG_SEGUNDOS = int(os.getenv('DB_REPLICA_MAX_LAG_SEGUNDOS', '30'))
+# Read-your-writes só vale se o cliente ficar no primário enquanto a réplica
+# ainda pode estar atrasada: atraso máximo aceito + intervalo entre verificações
+STICKY_MINIMO_SEGUNDOS = int(math.ceil(DB_REPLICA_MAX_LAG_SEGUNDOS + DB_REPLICA_CHECK_SEGUNDOS))
+DB_REPLICA_STICKY_SEGUNDOS = int(os.getenv('DB_REPLICA_STICKY_SEGUNDOS', str(STICKY_MINIMO_SEGUNDOS)))
+DB_REPLICA_COOKIE = os.getenv('DB_REPLICA_COOKIE', 'db_primario_ate')
+
+# Também confirma que a réplica tem o schema (um arquivo SQLite vazio responderia a SELECT 1)
+HEALTH_SQL = 'SELECT 1 FROM tipos_despesa LIMIT 1'
+METODOS_LEITURA = ('GET', 'HEAD')
+
+_saude = {'ok': True, 'verificado_em': 0.0, 'erro': None}
+_saude_lock = threading.Lock()
+
+
+def replica_bind_config(db_engine: str, engine_options: dict):
+    """Entrada de SQLALCHEMY_BINDS para a réplica, ou None se não configurada"""
+    url = os.getenv('DB_REPLICA_URL')
+    options = dict(engine_options)
+    if not url and db_engine == 'mysql' and os.getenv('DB_REPLICA_HOST'):
+        url = (
+            f"mysql+pymysql://{os.getenv('DB_REPLICA_USER', os.getenv('DB_USER', 'root'))}:"
+            f"{os.getenv('DB_REPLICA_PASSWORD', os.getenv('DB_PASSWORD', '1234'))}@"
+            f"{os.getenv('DB_REPLICA_HOST')}:{os.getenv('DB_REPLICA_PORT', os.getenv('DB_PORT', '3306'))}/"
+            f"{os.getenv('DB_NAME', 'banco_paraiba')}"
+        )
+        # Réplica fora do ar deve falhar rápido para o fallback ao primário
+        connect_args = dict(options.get('connect_args', {}))
+        connect_args['connect_timeout'] = int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', '2'))
+        options['connect_args'] = connect_args
+    elif not url and db_engine != 'mysql' and os.getenv('SQLITE_REPLICA_PATH'):
+        url = f"sqlite:///{os.getenv('SQLITE_REPLICA_PATH')}"
+    if not url:
+        return None
+    options['url'] = url
+    return options
+
+
+def _replica_saudavel(engine) -> bool:
+    agora = time.monotonic()
+    if agora - _saude['verificado_em'] < DB_REPLICA_CHECK_SEGUNDOS:
+        return _saude['ok']
+    # Uma thread verifica; as demais seguem com o último resultado
+    if not _saude_lock.acquire(blocking=False):
+        return _saude['ok']
+    try:
+        erro = None
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(HEALTH_SQL))
+                if conn.dialect.name == 'mysql' and DB_REPLICA_MAX_LAG_SEGUNDOS:
+                    erro = _atraso_mysql(conn)
+        except Exception as e:
+            erro = str(e).splitlines()[0]
+        if (erro is None) != _saude['ok']:
+            print(f"Réplica de leitura {'indisponível: ' + erro if erro else 'disponível novamente'}")
+        _saude.update(ok=erro is None, verificado_em=time.monotonic(), erro=erro)
+        return _saude['ok']
+    finally:
+        _saude_lock.release()
+
+
+def _atraso_mysql(conn):
+    """Mensagem de erro se a replicação estiver parada ou atrasada; None se ok ou sem permissão"""
+    for comando, coluna in (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                            ('SHOW SLAVE STATUS', 'Seconds_Behind_Master')):
+        try:
+            row = conn.execute(text(comando)).mappings().first()
+        except Exception:
+            continue
+        if row is None:
+            return None  # não é uma réplica (ou status indisponível): aceita
+        atraso = row.get(coluna)
+        if atraso is None:
+            return 'replicação parada'
+        if atraso > DB_REPLICA_MAX_LAG_SEGUNDOS:
+            return f'replicação atrasada {atraso}s'
+        return None
+    return None
+
+
+def _somente_leitura(clause) -> bool:
+    if clause is None or isinstance(clause, UpdateBase):
+        return False
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith(('SELECT', 'WITH'))
+    return getattr(clause, 'is_select', False)
+
+
+def _sticky() -> bool:
+    try:
+        return float(request.cookies.get(DB_REPLICA_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class RoutingSession(Session):
+    """Sessão que manda as leituras dos GETs para o bind `replica`"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self._db.engines.get(REPLICA_BIND) if bind is None else None
+        if replica is not None and not self._flushing and has_request_context() and _somente_leitura(clause):
+            destino = g.get('db_leitura')
+            if destino is None:
+                usar = request.method in METODOS_LEITURA and not _sticky() and _replica_saudavel(replica)
+                destino = g.db_leitura = 'replica' if usar else 'primario'
+            if destino == 'replica':
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def ler_do_primario():
+    """
+    Faz as leituras desta requisição irem ao primário. Para GETs que não toleram
+    o atraso da réplica, como feeds incrementais cujo cursor avança com o tempo
+    (uma linha que chegasse à réplica depois do cursor nunca seria entregue).
+    """
+    if has_request_context():
+        g.db_leitura = 'primario'
+
+
+def replica_stats() -> dict:
+    return {
+        'saudavel': _saude['ok'],
+        'erro': _saude['erro'],
+        'verificado_ha_s': round(time.monotonic() - _saude['verificado_em'], 1) if _saude['verificado_em'] else None,
+    }
+
+
+def init_read_replica(app):
+    """Registra o cookie de read-your-writes e o header X-DB-Leitura"""
+    global DB_REPLICA_STICKY_SEGUNDOS
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    if DB_REPLICA_STICKY_SEGUNDOS < STICKY_MINIMO_SEGUNDOS:
+        print(f"DB_REPLICA_STICKY_SEGUNDOS={DB_REPLICA_STICKY_SEGUNDOS} é menor que o atraso aceito da réplica "
+              f"(DB_REPLICA_MAX_LAG_SEGUNDOS + DB_REPLICA_CHECK_SEGUNDOS); usando {STICKY_MINIMO_SEGUNDOS}s")
+        DB_REPLICA_STICKY_SEGUNDOS = STICKY_MINIMO_SEGUNDOS
+
+    @app.after_request
+    def _marcar_leitura(response):
+        destino = g.get('db_leitura')
+        if destino:
+            response.headers['X-DB-Leitura'] = destino
+        if request.method not in METODOS_LEITURA + ('OPTIONS',) and response.status_code < 400:
+            response.set_cookie(DB_REPLICA_COOKIE, str(int(time.time()) + DB_REPLICA_STICKY_SEGUNDOS),
+                                max_age=DB_REPLICA_STICKY_SEGUNDOS, httponly=True, samesite='Lax')
+        return response
+
+
+def sync_sqlite_replica():
+    """Copia o banco SQLite primário para a réplica (simula a replicação em testes locais)"""
+    import sqlite3
+    from app import app, db
+
+    with app.app_context():
+        replica = db.engines.get(REPLICA_BIND)
+        if replica is None or replica.dialect.name != 'sqlite' or db.engine.dialect.name != 'sqlite':
+            raise SystemExit('Configure SQLITE_REPLICA_PATH (apenas com SQLite)')
+        origem = sqlite3.connect(db.engine.url.database)
+        destino = sqlite3.connect(replica.url.database)
+        try:
+            origem.backup(destino)
+        finally:
+            origem.close()
+            destino.close()
+        print(f"Réplica atualizada: {replica.url.database}")
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] != ['sync']:
+        raise SystemExit('uso: python read_replica.py sync')
+    sync_sqlite_replica()
@@ -0,0 +1,280 @@
+"""
+Profiling sob demanda de requisições (cProfile), para investigar em produção
+onde vai o tempo de /api/upload-pdf, /api/analyze-and-save etc. (PyPDF2,
+montagem do prompt, parse do JSON, ORM).
+
+Desligado por padrão: com PROFILE_ENABLED=false nada é registrado na aplicação
+(nenhum custo por requisição). Ligado, uma requisição é perfilada quando:
+
+- traz o header X-Profile-Token com um token assinado com PROFILE_SECRET
+  (gerado por `python request_profiler.py token`, válido por PROFILE_TOKEN_MAX_AGE
+  segundos), ou
+- cai na amostragem PROFILE_SAMPLE_RATE (0 a 1, default 0), opcionalmente restrita
+  aos prefixos de PROFILE_SAMPLE_PATHS (separados por vírgula)
+
+O perfil (árvore de chamadas do pstats: quem chamou quem, com tempos) é gravado em
+PROFILE_DIR (default instance/profiles) como <id>.prof, com um <id>.json de
+metadados; só os PROFILE_KEEP mais recentes são mantidos. A resposta perfilada
+traz X-Profile-Id. Respostas em streaming são repassadas bloco a bloco (sem
+acumular o corpo) e o perfil cobre a geração de cada bloco, até o close().
+Chamadas feitas em outras threads (ex.: o event loop do llm_gateway) aparecem
+apenas como tempo de espera da thread da requisição.
+
+Endpoints (exigem o mesmo token, no header ou em ?token=):
+- GET /api/profiles: perfis recentes
+- GET /api/profiles/<id>: download do .prof (snakeviz, pstats); ?formato=texto
+  devolve o relatório do pstats ordenado por tempo acumulado
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from flask import jsonify, request, send_file
+from itsdangerous import BadSignature, SignatureExpired, TimestampSigner
+
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'false').lower() == 'true'
+PROFILE_SECRET = os.getenv('PROFILE_SECRET', '')
+PROFILE_TOKEN_MAX_AGE = int(os.getenv('PROFILE_TOKEN_MAX_AGE', '3600'))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SAMPLE_PATHS = tuple(p.strip() for p in os.getenv('PROFILE_SAMPLE_PATHS', '').split(',') if p.strip())
+PROFILE_DIR = os.getenv('PROFILE_DIR', '')
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '200'))
+# Linhas do relatório em texto
+PROFILE_REPORT_LINES = 60
+
+TOKEN_HEADER = 'X-Profile-Token'
+_TOKEN_ENVIRON = 'HTTP_' + TOKEN_HEADER.upper().replace('-', '_')
+_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9]+-[0-9a-f]{8}$')
+_SALT = 'request-profiler'
+
+
+def _signer():
+    return TimestampSigner(PROFILE_SECRET, salt=_SALT)
+
+
+def make_token() -> str:
+    """Token para o header X-Profile-Token (requer PROFILE_SECRET)"""
+    if not PROFILE_SECRET:
+        raise RuntimeError('PROFILE_SECRET não configurado')
+    return _signer().sign('profile').decode()
+
+
+def token_valid(token) -> bool:
+    if not PROFILE_SECRET or not token:
+        return False
+    try:
+        return _signer().unsign(token, max_age=PROFILE_TOKEN_MAX_AGE) == b'profile'
+    except (BadSignature, SignatureExpired):
+        return False
+
+
+class _ProfiledIterator:
+    """
+    Repassa o corpo da resposta bloco a bloco (sem acumular respostas em
+    streaming, como a exportação), perfilando só a geração de cada bloco; o
+    perfil é encerrado e gravado ao fim do corpo ou no close() do servidor WSGI.
+    """
+
+    def __init__(self, app_iter, profiler, finish):
+        self._app_iter = app_iter
+        self._iter = iter(app_iter)
+        self._profiler = profiler
+        self._finish = finish
+
+    def __iter__(self):
+        return self
+
+    def _enable(self):
+        try:
+            self._profiler.enable()
+        except ValueError:
+            # Python 3.12+: outra requisição perfilada ocupou o profiler entre
+            # dois blocos; este bloco segue sem perfil
+            pass
+
+    def __next__(self):
+        self._enable()
+        try:
+            return next(self._iter)
+        except StopIteration:
+            # Corpo consumido: grava o perfil sem depender do close() do servidor
+            self._profiler.disable()
+            self.close()
+            raise
+        finally:
+            self._profiler.disable()
+
+    def close(self):
+        if self._finish is None:
+            return
+        try:
+            if hasattr(self._app_iter, 'close'):
+                self._enable()
+                try:
+                    self._app_iter.close()
+                finally:
+                    self._profiler.disable()
+        finally:
+            finish, self._finish = self._finish, None
+            finish()
+
+
+class ProfilerMiddleware:
+    """Middleware WSGI que perfila as requisições selecionadas"""
+
+    def __init__(self, wsgi_app, profile_dir):
+        self.wsgi_app = wsgi_app
+        self.profile_dir = profile_dir
+
+    def _trigger(self, environ):
+        if _TOKEN_ENVIRON in environ and token_valid(environ[_TOKEN_ENVIRON]):
+            return 'header'
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            path = environ.get('PATH_INFO', '')
+            if not PROFILE_SAMPLE_PATHS or path.startswith(PROFILE_SAMPLE_PATHS):
+                return 'amostragem'
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        if trigger is None:
+            return self.wsgi_app(environ, start_response)
+
+        profile_id = f"{datetime.now():%Y%m%dT%H%M%S%f}-{os.getpid()}-{random.getrandbits(32):08x}"
+        status_line = []
+
+        def profiled_start_response(status, headers, exc_info=None):
+            status_line.append(status)
+            headers = list(headers) + [('X-Profile-Id', profile_id)]
+            return start_response(status, headers, exc_info)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: outro perfil ativo no processo; atende sem perfilar
+            return self.wsgi_app(environ, start_response)
+        start = time.perf_counter()
+
+        def finish():
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._save(profiler, profile_id, {
+                'id': profile_id,
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO'),
+                'query': environ.get('QUERY_STRING') or None,
+                'status': int(status_line[0].split()[0]) if status_line else None,
+                'ms': round(elapsed_ms, 1),
+                'trigger': trigger,
+                'pid': os.getpid(),
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+            })
+
+        try:
+            app_iter = self.wsgi_app(environ, profiled_start_response)
+        except BaseException:
+            finish()
+            raise
+        finally:
+            profiler.disable()
+        return _ProfiledIterator(app_iter, profiler, finish)
+
+    def _save(self, profiler, profile_id, meta):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.profile_dir, profile_id + '.prof'))
+            with open(os.path.join(self.profile_dir, profile_id + '.json'), 'w') as f:
+                json.dump(meta, f)
+            self._prune()
+        except OSError as e:
+            print(f"Erro ao gravar perfil {profile_id}: {e}", file=sys.stderr)
+
+    def _prune(self):
+        ids = list_profile_ids(self.profile_dir)
+        for old in ids[PROFILE_KEEP:]:
+            for ext in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.profile_dir, old + ext))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profile_ids(profile_dir):
+    """Ids dos perfis gravados, do mais recente para o mais antigo"""
+    try:
+        names = os.listdir(profile_dir)
+    except FileNotFoundError:
+        return []
+    ids = [n[:-5] for n in names if n.endswith('.prof') and _ID_PATTERN.match(n[:-5])]
+    return sorted(ids, reverse=True)
+
+
+def text_report(path) -> str:
+    """Relatório do pstats: funções por tempo acumulado e quem elas chamam"""
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats('cumulative')
+    stats.print_stats(PROFILE_REPORT_LINES)
+    stats.print_callees(PROFILE_REPORT_LINES)
+    return out.getvalue()
+
+
+# ==================== ROTAS ====================
+
+def _authorized():
+    return token_valid(request.headers.get(TOKEN_HEADER) or request.args.get('token'))
+
+
+def _make_routes(profile_dir):
+    def list_profiles():
+        """Listar perfis recentes"""
+        if not _authorized():
+            return jsonify({'error': 'Token de profiling inválido ou expirado'}), 403
+        limit = request.args.get('limit', 50, type=int)
+        result = []
+        for profile_id in list_profile_ids(profile_dir)[:limit]:
+            try:
+                with open(os.path.join(profile_dir, profile_id + '.json')) as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                result.append({'id': profile_id})
+        return jsonify(result), 200
+
+    def get_profile(profile_id):
+        """Baixar um perfil (.prof) ou seu relatório em texto"""
+        if not _authorized():
+            return jsonify({'error': 'Token de profiling inválido ou expirado'}), 403
+        path = os.path.join(profile_dir, profile_id + '.prof')
+        if not _ID_PATTERN.match(profile_id) or not os.path.exists(path):
+            return jsonify({'error': 'Perfil não encontrado'}), 404
+        if request.args.get('formato') == 'texto':
+            return text_report(path), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+        return send_file(path, mimetype='application/octet-stream',
+                         as_attachment=True, download_name=profile_id + '.prof')
+
+    return list_profiles, get_profile
+
+
+def init_request_profiler(app):
+    if not PROFILE_ENABLED:
+        return
+    profile_dir = PROFILE_DIR or os.path.join(app.instance_path, 'profiles')
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, profile_dir)
+    list_profiles, get_profile = _make_routes(profile_dir)
+    app.add_url_rule('/api/profiles', 'list_profiles', list_profiles, methods=['GET'])
+    app.add_url_rule('/api/profiles/<profile_id>', 'get_profile', get_profile, methods=['GET'])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['token']:
+        print(make_token())
+    else:
+        print('Uso: python request_profiler.py token')
+        sys.exit(1)
@@ -1,44 +1,37 @@
 from flask import request, jsonify
-from app import app, db
+from app import app, db, REPLICA_CONFIG
 from models import *
-from pdf_processor import PDFProcessor
-from expense_classifier import ExpenseClassifier
+from sqlalchemy.orm import joinedload
+from expense_classifier import CATEGORIAS
+from documentos import normalizar_documento
+from http_cache import conditional_cache
+from idempotency import idempotent, fingerprint_nota
+from read_replica import replica_stats
 import os
 from datetime import datetime
 from decimal import Decimal
 
-pdf_processor = PDFProcessor()
-expense_classifier = ExpenseClassifier()
-
-@app.route('/api/upload-pdf', methods=['POST'])
-def upload_pdf():
+def criar_parcelas(conta_pagar, data):
     """
-    Endpoint para upload e processamento de PDF
+    Cria as parcelas da conta a pagar. Usa a lista `parcelas` do payload
+    (ex.: duplicatas da NF-e) quando informada; senão, uma parcela única com
+    o valor total e a data de vencimento.
     """
-    try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Nenhum arquivo enviado'}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
-        
-        if not file.filename.lower().endswith('.pdf'):
-            return jsonify({'error': 'Apenas arquivos PDF são aceitos'}), 400
-        
-        # Processar o PDF
-        result = pdf_processor.process_pdf(file)
-        
-        if not result['success']:
-            return jsonify({'error': result['error']}), 500
-        
-        return jsonify(result['data']), 200
-        
-    except Exception as e:
-        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
+    parcelas = data.get('parcelas') or [{
+        'numero_parcela': 1,
+        'data_vencimento': data.get('data_vencimento'),
+        'valor': data.get('valor_total'),
+    }]
+    for i, item in enumerate(parcelas, start=1):
+        db.session.add(ParcelaPagar(
+            numero_parcela=item.get('numero_parcela') or i,
+            data_vencimento=datetime.strptime(item.get('data_vencimento'), '%Y-%m-%d').date(),
+            valor=Decimal(str(item.get('valor'))),
+            conta_pagar_id=conta_pagar.id
+        ))
 
 @app.route('/api/save-invoice', methods=['POST'])
+@idempotent(fingerprint_nota)
 def save_invoice():
     """
     Endpoint para salvar os dados da nota fiscal no banco
@@ -51,7 +44,8 @@ def save_invoice():
         
         # Criar ou buscar fornecedor
         fornecedor_data = data.get('fornecedor', {})
-        fornecedor = Fornecedor.query.filter_by(cnpj=fornecedor_data.get('cnpj')).first()
+        cnpj_key = normalizar_documento(fornecedor_data.get('cnpj'))
+        fornecedor = Fornecedor.query.filter_by(cnpj_key=cnpj_key).first() if cnpj_key else None
         
         if not fornecedor:
             fornecedor = Fornecedor(
@@ -64,7 +58,8 @@ def save_invoice():
         
         # Criar ou buscar faturado
         faturado_data = data.get('faturado', {})
-        faturado = Faturado.query.filter_by(cpf=faturado_data.get('cpf')).first()
+        cpf_key = normalizar_documento(faturado_data.get('cpf'))
+        faturado = Faturado.query.filter_by(cpf_key=cpf_key).first() if cpf_key else None
         
         if not faturado:
             faturado = Faturado(
@@ -86,14 +81,8 @@ def save_invoice():
         db.session.add(conta_pagar)
         db.session.flush()
         
-        # Criar parcela
-        parcela = ParcelaPagar(
-            numero_parcela=1,
-            data_vencimento=datetime.strptime(data.get('data_vencimento'), '%Y-%m-%d').date(),
-            valor=Decimal(str(data.get('valor_total'))),
-            conta_pagar_id=conta_pagar.id
-        )
-        db.session.add(parcela)
+        # Criar parcela(s)
+        criar_parcelas(conta_pagar, data)
         
         # Criar ou buscar tipo de despesa
         classificacao_nome = data.get('classificacao_despesa')
@@ -128,17 +117,18 @@ def save_invoice():
         return jsonify({'error': f'Erro ao salvar: {str(e)}'}), 500
 
 @app.route('/api/expense-categories', methods=['GET'])
+@conditional_cache()
 def get_expense_categories():
     """
     Endpoint para obter todas as categorias de despesas
     """
     try:
-        categories = expense_classifier.get_all_categories()
-        return jsonify(categories), 200
+        return jsonify(CATEGORIAS), 200
     except Exception as e:
         return jsonify({'error': f'Erro ao buscar categorias: {str(e)}'}), 500
 
 @app.route('/api/fornecedores', methods=['GET'])
+@conditional_cache(Fornecedor)
 def get_fornecedores():
     """
     Endpoint para listar fornecedores
@@ -153,7 +143,7 @@ def get_fornecedores():
                 'razao_social': fornecedor.razao_social,
                 'fantasia': fornecedor.fantasia,
                 'cnpj': fornecedor.cnpj,
-                'created_at': fornecedor.created_at.isoformat()
+                'created_at': fornecedor.created_at
             })
         
         return jsonify(result), 200
@@ -166,15 +156,22 @@ def get_contas_pagar():
     Endpoint para listar contas a pagar
     """
     try:
-        contas = ContaPagar.query.filter_by(is_active=True).all()
+        # Fornecedor e faturado no mesmo SELECT (sem um lazy load por conta)
+        contas = (
+            ContaPagar.query
+            .options(joinedload(ContaPagar.fornecedor), joinedload(ContaPagar.faturado))
+            .filter_by(is_active=True)
+            .all()
+        )
         result = []
         
         for conta in contas:
             result.append({
                 'id': conta.id,
                 'numero_nota_fiscal': conta.numero_nota_fiscal,
-                'data_emissao': conta.data_emissao.isoformat(),
-                'valor_total': float(conta.valor_total),
+                'data_emissao': conta.data_emissao,
+                'descricao_produtos': conta.descricao_produtos,
+                'valor_total': conta.valor_total,
                 'fornecedor': {
                     'razao_social': conta.fornecedor.razao_social,
                     'cnpj': conta.fornecedor.cnpj
@@ -190,6 +187,7 @@ def get_contas_pagar():
         return jsonify({'error': f'Erro ao buscar contas: {str(e)}'}), 500
 
 @app.route('/api/analyze-and-save', methods=['POST'])
+@idempotent(fingerprint_nota)
 def analyze_and_save():
     """
     Analisa a existência de FORNECEDOR, FATURADO e DESPESA e,
@@ -204,7 +202,8 @@ def analyze_and_save():
       "data_emissao": "YYYY-MM-DD",
       "descricao_produtos": str,
       "valor_total": number,
-      "data_vencimento": "YYYY-MM-DD"
+      "data_vencimento": "YYYY-MM-DD",
+      "parcelas": [{"numero_parcela": int, "data_vencimento": "YYYY-MM-DD", "valor": number}]  (opcional)
     }
     """
     try:
@@ -220,10 +219,12 @@ def analyze_and_save():
         faturado = None
         tipo_despesa = None
 
-        if fornecedor_data.get('cnpj'):
-            fornecedor = Fornecedor.query.filter_by(cnpj=fornecedor_data.get('cnpj')).first()
-        if faturado_data.get('cpf'):
-            faturado = Faturado.query.filter_by(cpf=faturado_data.get('cpf')).first()
+        cnpj_key = normalizar_documento(fornecedor_data.get('cnpj'))
+        cpf_key = normalizar_documento(faturado_data.get('cpf'))
+        if cnpj_key:
+            fornecedor = Fornecedor.query.filter_by(cnpj_key=cnpj_key).first()
+        if cpf_key:
+            faturado = Faturado.query.filter_by(cpf_key=cpf_key).first()
         if classificacao_nome:
             tipo_despesa = TipoDespesa.query.filter_by(nome=classificacao_nome).first()
 
@@ -289,13 +290,7 @@ def analyze_and_save():
         db.session.add(conta_pagar)
         db.session.flush()
 
-        parcela = ParcelaPagar(
-            numero_parcela=1,
-            data_vencimento=datetime.strptime(data.get('data_vencimento'), '%Y-%m-%d').date(),
-            valor=Decimal(str(data.get('valor_total'))),
-            conta_pagar_id=conta_pagar.id
-        )
-        db.session.add(parcela)
+        criar_parcelas(conta_pagar, data)
 
         if tipo_despesa:
             # Se houver lista de classificações, criar todas; caso contrário, apenas a única
@@ -343,10 +338,13 @@ def analyze_and_save():
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """
-    Endpoint para verificar se a API está funcionando
+    Endpoint para verificar se a API está funcionando (e, se configurada, a réplica de leitura)
     """
-    return jsonify({
+    payload = {
         'status': 'OK',
         'message': 'API funcionando corretamente',
         'timestamp': datetime.now().isoformat()
-    }), 200
\ No newline at end of file
+    }
+    if REPLICA_CONFIG:
+        payload['replica'] = replica_stats()
+    return jsonify(payload), 200
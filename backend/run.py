@@ -1,3 +1,4 @@
+import os
 from app import app, db
 
 # Importar modelos
@@ -6,8 +7,22 @@ from models import *
 # Importar rotas
 from routes import *
 from crud_routes import *
+from search_routes import *
+from export_routes import *
+from nfe_routes import *
+from bulk_routes import *
+from parcelas_routes import *
+from conciliacao_routes import *
+
+# APP_MODE=crud: worker sem as rotas de LLM (upload/extração de PDF), que
+# nunca carrega os SDKs do OpenAI/Gemini nem o PyPDF2
+APP_MODE = os.getenv('APP_MODE', 'full').lower()
+if APP_MODE != 'crud':
+    from llm_routes import *
+
+from db_setup import init_db
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_db()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
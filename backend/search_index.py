@@ -0,0 +1,169 @@
+"""
+Índice de busca textual (full-text) sobre contas e cadastros.
+
+- SQLite: tabela virtual FTS5 `busca_fts`, mantida em sincronia por triggers
+  nas tabelas de origem (inserção, alteração, inativação e exclusão).
+- MySQL: índices FULLTEXT nas próprias colunas, mantidos pelo InnoDB.
+"""
+import re
+from sqlalchemy import text
+from app import db, DB_ENGINE
+
+FTS_TABLE = 'busca_fts'
+
+# Entidades indexadas. O rowid da FTS5 é `id * len(ENTIDADES) + codigo`, o que
+# permite remover/atualizar uma linha do índice por chave primária.
+ENTIDADES = {
+    'conta_pagar': {'codigo': 0, 'tabela': 'contas_pagar', 'colunas': ['descricao_produtos']},
+    'conta_receber': {'codigo': 1, 'tabela': 'contas_receber', 'colunas': ['descricao']},
+    'fornecedor': {'codigo': 2, 'tabela': 'fornecedores', 'colunas': ['razao_social', 'fantasia']},
+    'cliente': {'codigo': 3, 'tabela': 'clientes', 'colunas': ['nome_completo']},
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _texto_expr(colunas, prefixo=''):
+    """Expressão SQL que concatena as colunas indexadas de uma entidade"""
+    partes = [f"coalesce({prefixo}{c}, '')" for c in colunas]
+    return " || ' ' || ".join(partes)
+
+
+def _rowid_expr(codigo, prefixo):
+    return f"{prefixo}id * {len(ENTIDADES)} + {codigo}"
+
+
+def _sqlite_triggers(entidade, cfg):
+    tabela = cfg['tabela']
+    codigo = cfg['codigo']
+    colunas = ', '.join(['is_active'] + cfg['colunas'])
+    insert_new = (
+        f"INSERT INTO {FTS_TABLE}(rowid, entidade, entidade_id, texto) "
+        f"SELECT {_rowid_expr(codigo, 'new.')}, '{entidade}', new.id, {_texto_expr(cfg['colunas'], 'new.')} "
+        f"WHERE coalesce(new.is_active, 1);"
+    )
+    delete_old = f"DELETE FROM {FTS_TABLE} WHERE rowid = {_rowid_expr(codigo, 'old.')};"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_{tabela}_ai AFTER INSERT ON {tabela} "
+        f"BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_{tabela}_au AFTER UPDATE OF {colunas} ON {tabela} "
+        f"BEGIN {delete_old} {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_{tabela}_ad AFTER DELETE ON {tabela} "
+        f"BEGIN {delete_old} END",
+    ]
+
+
+def rebuild_search_index():
+    """Reconstrói o índice FTS5 a partir das tabelas de origem (apenas SQLite)"""
+    if DB_ENGINE == 'mysql':
+        return
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    for entidade, cfg in ENTIDADES.items():
+        db.session.execute(text(
+            f"INSERT INTO {FTS_TABLE}(rowid, entidade, entidade_id, texto) "
+            f"SELECT {_rowid_expr(cfg['codigo'], '')}, '{entidade}', id, {_texto_expr(cfg['colunas'])} "
+            f"FROM {cfg['tabela']} WHERE coalesce(is_active, 1)"
+        ))
+    db.session.commit()
+
+
+def init_search_index():
+    """
+    Cria (se necessário) as estruturas de busca textual.
+    Deve ser chamado dentro de um app context, após db.create_all().
+    """
+    if DB_ENGINE == 'mysql':
+        for cfg in ENTIDADES.values():
+            nome = f"ft_{cfg['tabela']}"
+            existe = db.session.execute(text(
+                "SELECT 1 FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = :tabela AND index_name = :nome LIMIT 1"
+            ), {'tabela': cfg['tabela'], 'nome': nome}).first()
+            if not existe:
+                db.session.execute(text(
+                    f"ALTER TABLE {cfg['tabela']} ADD FULLTEXT INDEX {nome} ({', '.join(cfg['colunas'])})"
+                ))
+        db.session.commit()
+        return
+
+    existe = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"
+    ), {'nome': FTS_TABLE}).first()
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"entidade UNINDEXED, entidade_id UNINDEXED, texto, "
+        f"tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    for entidade, cfg in ENTIDADES.items():
+        for ddl in _sqlite_triggers(entidade, cfg):
+            db.session.execute(text(ddl))
+    db.session.commit()
+
+    # Banco já existente: popular o índice recém-criado com os dados atuais
+    if not existe:
+        rebuild_search_index()
+
+
+def _termos(consulta: str):
+    return _TOKEN_RE.findall(consulta or '')
+
+
+def search(consulta: str, entidade: str = None, page: int = 1, per_page: int = 20) -> dict:
+    """
+    Busca textual ranqueada e paginada.
+    Cada termo é tratado como prefixo e todos os termos precisam estar presentes.
+    """
+    termos = _termos(consulta)
+    if not termos:
+        raise ValueError('Consulta vazia')
+    if entidade and entidade not in ENTIDADES:
+        raise ValueError(f"Tipo inválido. Use um de: {', '.join(ENTIDADES)}")
+
+    offset = (page - 1) * per_page
+
+    if DB_ENGINE == 'mysql':
+        params = {'q': ' '.join(f'+{t}*' for t in termos), 'limit': per_page, 'offset': offset}
+        selects = []
+        for nome, cfg in ENTIDADES.items():
+            if entidade and nome != entidade:
+                continue
+            match = f"MATCH({', '.join(cfg['colunas'])}) AGAINST (:q IN BOOLEAN MODE)"
+            selects.append(
+                f"SELECT '{nome}' AS entidade, id AS entidade_id, "
+                f"CONCAT_WS(' ', {', '.join(cfg['colunas'])}) AS texto, {match} AS score "
+                f"FROM {cfg['tabela']} WHERE is_active = 1 AND {match}"
+            )
+        union = ' UNION ALL '.join(selects)
+        total = db.session.execute(text(f"SELECT COUNT(*) FROM ({union}) AS r"), params).scalar()
+        rows = db.session.execute(text(
+            f"SELECT * FROM ({union}) AS r ORDER BY score DESC, entidade_id DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+    else:
+        params = {'q': ' '.join(f'"{t}"*' for t in termos), 'limit': per_page, 'offset': offset}
+        filtro = ''
+        if entidade:
+            filtro = ' AND entidade = :entidade'
+            params['entidade'] = entidade
+        total = db.session.execute(text(
+            f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q{filtro}"
+        ), params).scalar()
+        rows = db.session.execute(text(
+            f"SELECT entidade, entidade_id, texto, -bm25({FTS_TABLE}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q{filtro} "
+            f"ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+
+    return {
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'results': [
+            {
+                'tipo': row.entidade,
+                'id': int(row.entidade_id),
+                'texto': row.texto,
+                'score': round(float(row.score), 4)
+            }
+            for row in rows
+        ]
+    }
@@ -0,0 +1,25 @@
+from flask import request, jsonify
+from app import app
+from search_index import search
+
+@app.route('/api/busca', methods=['GET'])
+def busca():
+    """
+    Busca textual em contas a pagar/receber, fornecedores e clientes.
+    Parâmetros: q (obrigatório), tipo (conta_pagar, conta_receber, fornecedor, cliente),
+    page (default 1) e per_page (default 20, máximo 100).
+    """
+    try:
+        consulta = request.args.get('q', '').strip()
+        tipo = request.args.get('tipo') or None
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+        if not consulta:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+
+        return jsonify(search(consulta, tipo, page, per_page)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro na busca: {str(e)}'}), 500
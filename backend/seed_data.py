@@ -1,16 +1,13 @@
 from app import app, db
 from models import TipoDespesa
-from expense_classifier import ExpenseClassifier
+from expense_classifier import CATEGORIAS
 
 def seed_expense_categories():
     """
     Popula o banco de dados com as categorias de despesas predefinidas
     """
     with app.app_context():
-        classifier = ExpenseClassifier()
-        categories = classifier.get_all_categories()
-        
-        for category_name, subcategories in categories.items():
+        for category_name, subcategories in CATEGORIAS.items():
             # Verificar se a categoria já existe
             existing = TipoDespesa.query.filter_by(nome=category_name).first()
             
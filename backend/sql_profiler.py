@@ -0,0 +1,214 @@
+"""
+Instrumentação das consultas SQL por requisição.
+
+Eventos do SQLAlchemy (before/after_cursor_execute) contam as consultas e o
+tempo de banco de cada requisição, guardam as que passam de SQL_SLOW_QUERY_MS
+(com parâmetros) e agrupam os comandos pela forma (SQL com os parâmetros já
+substituídos por ?, listas de IN colapsadas). Uma mesma forma repetida
+SQL_N_PLUS_ONE_THRESHOLD vezes ou mais é sinalizada como provável N+1
+(ex.: lazy load de um relacionamento dentro de um loop).
+
+- Headers X-DB-Queries, X-DB-Time-Ms, X-DB-N-Plus-One e Server-Timing: em modo
+  debug ou com SQL_PROFILE_HEADERS=true
+- Log estruturado (JSON, logger "sql_profiler"): WARNING quando há consulta
+  lenta ou N+1, DEBUG nos demais casos
+- Testes: `with query_budget(3): client.get(...)` falha se o bloco executar
+  mais consultas (ou tiver N+1); `assert_query_budgets` verifica vários endpoints
+
+SQL_PROFILE=false desliga tudo.
+"""
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SQL_PROFILE = os.getenv('SQL_PROFILE', 'true').lower() == 'true'
+SQL_PROFILE_HEADERS = os.getenv('SQL_PROFILE_HEADERS', 'false').lower() == 'true'
+SQL_SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', '100'))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', '5'))
+# Tamanho máximo do SQL/parâmetros nos logs
+MAX_LOG_CHARS = 500
+
+logger = logging.getLogger('sql_profiler')
+
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)')
+_SPACES = re.compile(r'\s+')
+
+# Coletores ativos no contexto atual (requisição e/ou query_budget de um teste)
+_active = ContextVar('sql_profiler_collectors', default=())
+
+
+def statement_shape(statement: str) -> str:
+    """Forma do comando: espaços normalizados e listas de IN com um único ?"""
+    return _IN_LIST.sub('(?)', _SPACES.sub(' ', statement).strip())
+
+
+def _truncate(value):
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= MAX_LOG_CHARS else text[:MAX_LOG_CHARS] + '...'
+
+
+class QueryCollector:
+    """Consultas executadas enquanto o coletor está ativo"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slow = []
+        self.shapes = {}  # forma -> [quantidade, tempo total ms]
+
+    def record(self, statement, parameters, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        shape = statement_shape(statement)
+        entry = self.shapes.setdefault(shape, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+        if elapsed_ms >= SQL_SLOW_QUERY_MS:
+            self.slow.append({
+                'ms': round(elapsed_ms, 1),
+                'sql': _truncate(statement),
+                'params': _truncate(parameters),
+            })
+
+    def n_plus_one(self, threshold=None):
+        """Formas repetidas (prováveis N+1), da mais frequente para a menos"""
+        threshold = threshold or SQL_N_PLUS_ONE_THRESHOLD
+        suspects = [
+            {'count': n, 'ms': round(ms, 1), 'sql': _truncate(shape)}
+            for shape, (n, ms) in self.shapes.items() if n >= threshold
+        ]
+        return sorted(suspects, key=lambda s: -s['count'])
+
+    def summary(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total_ms, 1),
+            'slow': self.slow,
+            'n_plus_one': self.n_plus_one(),
+        }
+
+
+def _push(collector):
+    _active.set(_active.get() + (collector,))
+
+
+def _pop(collector):
+    _active.set(tuple(c for c in _active.get() if c is not collector))
+
+
+@contextmanager
+def collect():
+    """Ativa um coletor no contexto atual e o devolve"""
+    collector = QueryCollector()
+    _push(collector)
+    try:
+        yield collector
+    finally:
+        _pop(collector)
+
+
+# ==================== EVENTOS DO SQLALCHEMY ====================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get():
+        conn.info.setdefault('sql_profiler_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _active.get()
+    starts = conn.info.get('sql_profiler_start')
+    if not collectors or not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    for collector in collectors:
+        collector.record(statement, parameters, elapsed_ms)
+
+
+# ==================== REQUISIÇÕES ====================
+
+def _add_headers(response):
+    collector = g.get('sql_queries')
+    if collector is not None and g.get('sql_profile_headers'):
+        response.headers['X-DB-Queries'] = str(collector.count)
+        response.headers['X-DB-Time-Ms'] = f"{collector.total_ms:.1f}"
+        response.headers['X-DB-N-Plus-One'] = str(len(collector.n_plus_one()))
+        response.headers.add('Server-Timing', f"db;dur={collector.total_ms:.1f};desc=\"{collector.count} queries\"")
+    return response
+
+
+def _finish_request(exc=None):
+    collector = g.pop('sql_queries', None)
+    if collector is None:
+        return
+    # No teardown (e não no after_request): respostas em streaming ainda
+    # consultam o banco depois que os headers foram enviados
+    _pop(collector)
+    summary = collector.summary()
+    level = logging.WARNING if summary['slow'] or summary['n_plus_one'] else logging.DEBUG
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps(dict(
+            {'event': 'sql_profile', 'method': request.method, 'path': request.path,
+             'endpoint': request.endpoint}, **summary
+        ), ensure_ascii=False, default=str))
+
+
+def init_sql_profiling(app):
+    if not SQL_PROFILE:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def _profile_request():
+        g.sql_queries = QueryCollector()
+        g.sql_profile_headers = app.debug or SQL_PROFILE_HEADERS
+        _push(g.sql_queries)
+
+    app.after_request(_add_headers)
+    app.teardown_request(_finish_request)
+
+
+# ==================== TESTES ====================
+
+@contextmanager
+def query_budget(max_queries, allow_n_plus_one=False):
+    """
+    Falha (AssertionError) se o bloco executar mais de `max_queries` consultas
+    ou, sem allow_n_plus_one, se alguma forma se repetir a ponto de parecer N+1.
+    """
+    with collect() as collector:
+        yield collector
+    problems = []
+    if collector.count > max_queries:
+        problems.append(f"{collector.count} consultas (orçamento: {max_queries})")
+    if not allow_n_plus_one and collector.n_plus_one():
+        problems.append("prováveis N+1: " + '; '.join(
+            f"{s['count']}x {s['sql']}" for s in collector.n_plus_one()
+        ))
+    if problems:
+        shapes = '\n'.join(f"  {n}x {shape}" for shape, (n, _) in collector.shapes.items())
+        raise AssertionError(', '.join(problems) + f"\nConsultas executadas:\n{shapes}")
+
+
+def assert_query_budgets(client, budgets):
+    """
+    Verifica o orçamento de consultas de vários endpoints, ex.:
+    assert_query_budgets(app.test_client(), {('GET', '/api/contas-pagar'): 2})
+    """
+    failures = []
+    for (method, path), max_queries in budgets.items():
+        try:
+            with query_budget(max_queries):
+                response = client.open(path, method=method)
+                response.get_data()  # consome respostas em streaming
+        except AssertionError as e:
+            failures.append(f"{method} {path}: {e}")
+    if failures:
+        raise AssertionError('\n\n'.join(failures))
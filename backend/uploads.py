@@ -0,0 +1,77 @@
+"""
+Recebimento de uploads em disco.
+
+Todo arquivo enviado é gravado em blocos em um arquivo temporário (já
+removido do diretório, some quando é fechado), com o SHA-256 calculado
+durante a escrita. O PDF é lido depois via mmap, então a memória por upload
+não cresce com o tamanho do arquivo.
+
+- MAX_UPLOAD_MB: tamanho máximo da requisição (default 200)
+- UPLOAD_SPOOL_DIR: diretório dos temporários (default: diretório temporário do sistema)
+- UPLOAD_CHUNK_SIZE: tamanho dos blocos lidos do corpo da requisição (default 64KB)
+"""
+import hashlib
+import os
+import tempfile
+from flask import Request
+
+MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', '200'))
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR') or None
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(64 * 1024)))
+
+
+class SpooledUpload:
+    """Arquivo temporário em disco que calcula o SHA-256 do que é escrito."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix='upload-', dir=UPLOAD_SPOOL_DIR)
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def __getattr__(self, name):
+        # read/seek/tell/fileno/flush/close vão direto para o arquivo
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+class SpoolingRequest(Request):
+    """Request que grava todos os arquivos do multipart em disco, com hash."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledUpload()
+
+
+def spool_request_body(req) -> SpooledUpload:
+    """Grava o corpo bruto da requisição (ex.: Content-Type application/pdf) em disco"""
+    upload = SpooledUpload()
+    try:
+        while True:
+            chunk = req.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.write(chunk)
+    except Exception:
+        upload.close()
+        raise
+    upload.flush()
+    upload.seek(0)
+    return upload
+
+
+def init_uploads(app):
+    app.request_class = SpoolingRequest
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
@@ -0,0 +1,20 @@
+"""
+Ponto de entrada WSGI para produção:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Com LLM_PRELOAD=true os SDKs de LLM são importados aqui, no master, antes do
+fork (memória compartilhada entre os workers e sem custo no primeiro upload).
+Por padrão são importados no primeiro uso. APP_MODE=crud não os carrega nunca.
+"""
+import os
+import sys
+from run import app
+from app import db
+from db_setup import init_db
+
+with app.app_context():
+    init_db()
+
+if os.getenv('LLM_PRELOAD', 'false').lower() == 'true' and 'llm_routes' in sys.modules:
+    sys.modules['llm_routes'].preload_llm_stack()
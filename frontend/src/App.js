@@ -46,7 +46,12 @@ function App() {
       });
       
       setExtractedData(response.data);
-      setSuccess('Dados extraídos com sucesso!');
+      setSuccess(response.data.notas
+        ? `${response.data.total} notas extraídas com sucesso!`
+        : 'Dados extraídos com sucesso!');
+      if (response.data.erros?.length) {
+        setError(`${response.data.erros.length} nota(s) do PDF não puderam ser extraídas`);
+      }
     } catch (err) {
       setError('Erro ao extrair dados: ' + (err.response?.data?.error || err.message));
     } finally {
@@ -63,14 +68,30 @@ function App() {
     setLoading(true);
     setError('');
 
-    try {
-      await axios.post(`${API_BASE_URL}/api/save-invoice`, extractedData);
-      setSuccess('Dados salvos no banco de dados com sucesso!');
-    } catch (err) {
-      setError('Erro ao salvar dados: ' + (err.response?.data?.error || err.message));
-    } finally {
-      setLoading(false);
+    // PDFs com várias DANFEs chegam como {total, notas, erros}: uma gravação por nota
+    const notas = Array.isArray(extractedData.notas) ? extractedData.notas : [extractedData];
+    const falhas = [];
+
+    for (const nota of notas) {
+      try {
+        await axios.post(`${API_BASE_URL}/api/save-invoice`, nota);
+      } catch (err) {
+        const paginas = nota.paginas ? ` (páginas ${nota.paginas.join('-')})` : '';
+        falhas.push(`nota ${nota.numero_nota_fiscal || '?'}${paginas}: ${err.response?.data?.error || err.message}`);
+      }
+    }
+
+    if (falhas.length === 0) {
+      setSuccess(notas.length > 1
+        ? `${notas.length} notas salvas no banco de dados com sucesso!`
+        : 'Dados salvos no banco de dados com sucesso!');
+    } else {
+      if (falhas.length < notas.length) {
+        setSuccess(`${notas.length - falhas.length} de ${notas.length} notas salvas no banco de dados.`);
+      }
+      setError('Erro ao salvar dados: ' + falhas.join('; '));
     }
+    setLoading(false);
   };
 
   const copyToClipboard = () => {